@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import os
 import subprocess
 import sys
@@ -17,6 +18,9 @@ USRP0_IP_BASE = 101
 
 NW_INTERFACE_CONFIG_DEST_PATH = "/etc/network/interfaces.d"
 
+# every interface of a container is configured in this one file in NW_INTERFACE_CONFIG_DEST_PATH
+NW_INTERFACE_CONFIG_FILE_NAME = "hurdle_interfaces.cfg"
+
 PRACTICE_BOT_NAME_PATTERN = "darpa-practice-srn"
 HURDLE_BOT_NAME_PATTERN = "darpa-scoring-srn"
 DUMMY_BOT_NAME_PATTERN = "dummy-tx-srn"
@@ -42,55 +46,105 @@ def update_inet_device_config_dict(dev_config_dict, name, address, parent, **kwa
 
     return dev_config_dict
 
-def write_inet_device_config_file(file_name, dev_name, address, netmask):
+def write_inet_devices_config_file(file_name, devices):
     '''
-    Write out a device config file expected in /etc/network/interfaces.d
+    Write out a single config file for /etc/network/interfaces.d covering every device
     '''
     with open(file_name, "w") as f:
-        print("auto {}".format(dev_name), file=f)
-        print("iface {} inet static".format(dev_name), file=f)
-        print("    address {}".format(address), file=f)
-        print("    netmask {}".format(netmask), file=f)
+        for device in devices:
+            print("auto {}".format(device["name"]), file=f)
+            print("iface {} inet static".format(device["name"]), file=f)
+            print("    address {}".format(device["address"]), file=f)
+            print("    netmask {}".format(device["netmask"]), file=f)
+            print("", file=f)
 
     return
 
-def configure_container_inet_device(client, cont_name, dev_name, address, parent, netmask, **kwargs):
+def configure_container_inet_devices(container, devices):
     '''
-    Update the container device dictionary with a new ethernet device, save the new configuration
-    to the container, create a temporary network interface file, and store that file in the
-    container in /etc/network/interfaces.d/
+    Add every ethernet device in devices to the container's device dictionary and save it in one
+    update, then install a single network interface file for all of them in
+    /etc/network/interfaces.d/. devices is a list of dictionaries with the name, address, parent
+    and netmask of each device. Any other keys are added to the LXD device config.
     '''
-
-    # get current device config
-    container = client.containers.get(cont_name)
     dev_config_dict = container.devices
 
-    # add device to devices dict
-    print("adding device {} to container {}".format(dev_name, cont_name))
-    dev_config_dict = update_inet_device_config_dict(dev_config_dict=dev_config_dict,
-                                                     name=dev_name,
-                                                     address=address,
-                                                     parent=parent)
+    # add devices to devices dict
+    for device in devices:
+        print("adding device {} to container {}".format(device["name"], container.name))
+        extra_config = {key:val for key, val in device.items()
+                        if key not in ("name", "address", "parent", "netmask")}
+        dev_config_dict = update_inet_device_config_dict(dev_config_dict=dev_config_dict,
+                                                         name=device["name"],
+                                                         address=device["address"],
+                                                         parent=device["parent"],
+                                                         **extra_config)
     # update container
     container.devices=dev_config_dict
     container.save()
 
     # write network interface temporary config file
-    file_name = "{}_{}.cfg".format(cont_name, dev_name)
-    write_inet_device_config_file(file_name=file_name,
-                                    dev_name=dev_name,
-                                    address=address,
-                                    netmask=netmask,
-                                    )
-
-    # save temp config files to containers
-    dest_file_name = "{}.cfg".format(dev_name)
-
-    # push temporary file into container
-    push_cmd = ["lxc", "file", "push", file_name, cont_name+os.path.join(NW_INTERFACE_CONFIG_DEST_PATH, dest_file_name)]
-    print("installing {} interface config file".format(dev_name))
-    print("running {}".format(" ".join(push_cmd)))
-    subprocess.run(push_cmd)
+    file_name = "{}_{}".format(container.name, NW_INTERFACE_CONFIG_FILE_NAME)
+    write_inet_devices_config_file(file_name, devices)
+
+    # push temporary file into container through the LXD API
+    print("installing interface config file for {}".format(container.name))
+    with open(file_name, "rb") as f:
+        container.files.put(os.path.join(NW_INTERFACE_CONFIG_DEST_PATH, NW_INTERFACE_CONFIG_FILE_NAME), f.read())
+
+def bot_network_devices(i):
+    '''
+    Get the network devices of bot number i, counting from 0
+    '''
+    # Setting up networking for bots
+    # tr0 interfaces first
+    tr0 = {"name":"tr0",
+           "address":"192.168.{}.1".format(TR0_IP_BASE+i),
+           "netmask":"255.255.255.0",
+           "parent":"trbr{}".format(i+1)}
+
+    # Next CAN interface. Note, only accessible to bots.
+    can0 = {"name":"can0",
+            "address":"172.16.{}.2".format(CAN0_IP_BASE+i),
+            "netmask":"255.255.0.0",
+            "parent":"canbr0"}
+
+    # Next COL interface. Note that this schema expects that the collaboration server will be
+    # listening on subnet 172.30.COL0_IP_BASE.0
+    col0 = {"name":"col0",
+            "address":"172.30.{}.{}".format(COL0_IP_BASE, COL0_IP_BASE+i),
+            "netmask":"255.255.255.0",
+            "parent":"colbr0"}
+
+    # Next USRP interface.
+    usrp0 = {"name":"usrp0",
+             "address":"192.168.40.{}".format(USRP0_IP_BASE+i),
+             "netmask":"255.255.255.0",
+             "parent":"usrpbr0"}
+
+    return [tr0, can0, col0, usrp0]
+
+def create_bot_container(client, cont_name, source, devices):
+    '''
+    Create a bot container from source and set up its network devices. Containers created from an
+    image start with no devices. Copies keep the devices of the container they were copied from,
+    and only need the per node addresses and bridges changed.
+    '''
+    print("Creating {} from {}".format(cont_name, source))
+    config = {"name":cont_name,
+            "source":source}
+
+    container = client.containers.create(config, wait=True)
+
+    if source["type"] == "image":
+        container.config["security.nesting"] = "true"
+
+        # clear out existing devices. Saved along with the new devices
+        container.devices = {}
+
+    configure_container_inet_devices(container, devices)
+
+    return container
 
 def run_subproc_and_print_output(cmd):
     '''
@@ -125,6 +179,8 @@ def main():
                         default="practice", help="What type of bot is this?")
     parser.add_argument('--num-containers', default=3, type=int,
                         help="How many containers we are standing up")
+    parser.add_argument('--clone-from-template', action="store_true",
+                        help="Only create the first container from the image, then copy it for the rest and patch their addresses. Much faster on copy-on-write storage")
 
     # parse args and store to dictionary
     args = vars(parser.parse_args())
@@ -184,83 +240,34 @@ def main():
 
     print("generating container list: {}".format(bot_container_names))
 
-    # stand up bots
-    for i, cont_name in enumerate(bot_container_names):
+    image_source = {"type":"image", "alias":image_alias}
+    devices = {cont_name:bot_network_devices(i) for i, cont_name in enumerate(bot_container_names)}
 
-        print("Creating {}".format(cont_name))
-        config = {"name":cont_name,
-                "source":{"type":"image", "alias":image_alias}}
+    if args["clone_from_template"] and len(bot_container_names) > 0:
+        # the first bot is fully configured and then used as the template for the rest
+        template_name = bot_container_names[0]
+        create_bot_container(lxd_client, template_name, image_source, devices[template_name])
 
-        container = lxd_client.containers.create(config, wait=True)
-        container.config["security.nesting"] = "true"
-
-        # clear out existing devices and save
-        dev_config_dict = {}
-        container.devices = dev_config_dict
-        container.save()
-
-        # Setting up networking for bots
-        # tr0 interfaces first
-
-        tr0_name = "tr0"
-        tr0_ip = "192.168.{}.1".format(TR0_IP_BASE+i)
-        tr0_netmask = "255.255.255.0"
-        tr0_parent = "trbr{}".format(i+1)
-
-        # set up the tr0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=tr0_name,
-                                        address=tr0_ip,
-                                        parent=tr0_parent,
-                                        netmask=tr0_netmask)
-
-        # Next CAN interface. Note, only accessible to bots.
-        can0_name = "can0"
-        can0_ip = "172.16.{}.2".format(CAN0_IP_BASE+i)
-        can0_netmask = "255.255.0.0"
-        can0_parent = "canbr0"
-
-        # set up the can0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=can0_name,
-                                        address=can0_ip,
-                                        parent=can0_parent,
-                                        netmask=can0_netmask,
-                                        mtu=CAN0_MTU)
-
-
-        # Next COL interface. Note that this schema expects that the collaboration server will be
-        # listening on subnet 172.30.COL0_IP_BASE.0
-        col0_name = "col0"
-        col0_ip = "172.30.{}.{}".format(COL0_IP_BASE, COL0_IP_BASE+i)
-        col0_netmask = "255.255.255.0"
-        col0_parent = "colbr0"
-
-        # set up the col0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=col0_name,
-                                        address=col0_ip,
-                                        parent=col0_parent,
-                                        netmask=col0_netmask)
-
-
-        # Next USRP interface.
-        usrp0_name = "usrp0"
-        usrp0_ip = "192.168.40.{}".format(USRP0_IP_BASE+i)
-        usrp0_netmask = "255.255.255.0"
-        usrp0_parent = "usrpbr0"
-
-
-        # set up the usrp0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=usrp0_name,
-                                        address=usrp0_ip,
-                                        parent=usrp0_parent,
-                                        netmask=usrp0_netmask)
+        remaining_names = bot_container_names[1:]
+        source = {"type":"copy", "source":template_name}
+    else:
+        remaining_names = bot_container_names
+        source = image_source
+
+    # stand up the remaining bots all at once
+    with ThreadPoolExecutor(max_workers=max(1, len(remaining_names))) as executor:
+        futures = [(cont_name, executor.submit(create_bot_container, lxd_client, cont_name, source, devices[cont_name]))
+                   for cont_name in remaining_names]
+
+    failed_names = []
+    for cont_name, future in futures:
+        if future.exception() is not None:
+            print("Failed to create container {}: {}".format(cont_name, future.exception()))
+            failed_names.append(cont_name)
+
+    if len(failed_names) > 0:
+        print("{} of {} bot containers could not be created, exiting".format(len(failed_names), len(bot_container_names)))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -2,4 +2,4 @@
 CWD=${PWD}
 
 cd traffic_containers
-python3 build_traffic_generators.py
\ No newline at end of file
+python3 build_traffic_generators.py "$@"
\ No newline at end of file
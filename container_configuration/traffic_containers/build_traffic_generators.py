@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 import pylxd
-import subprocess
 import sys
 import os
 # making a traffic generator for each node of the bot and each node of the competior network
@@ -19,6 +20,14 @@ DEV_CONFIG_DEST_PATH = "/etc/network/interfaces.d/tr0.cfg"
 TGEN_NW_INTERFACES_FILE = "tgen_network_interfaces"
 TGEN_NW_INTERFACES_DEST_PATH = "/etc/network/interfaces"
 
+BASE_IMAGE_ALIAS = "ubuntu/xenial"
+
+# everything the traffic generators have in common is built once into this image, and each
+# traffic generator is created from it. The template container doesn't start with "tgen" so
+# container_control never mistakes it for a traffic generator
+TGEN_TEMPLATE_ALIAS = "traffic-generator-template"
+TGEN_TEMPLATE_CONTAINER_NAME = "traffic-generator-template"
+
 def write_inet_device_config_dict(name, address, parent):
     '''
     Write out a device config dict in the format expected by pylxd
@@ -52,12 +61,119 @@ def write_inet_device_config_file(file_name, dev_name, address, netmask, gateway
 
 
 
+def push_file(container, source_file, destination_path, mode=None):
+    '''
+    Copy a local file into a container through the LXD API, with the given permission bits, or
+    LXD's default if mode is None
+    '''
+    print("installing {} into {}:{}".format(source_file, container.name, destination_path))
+    with open(source_file, "rb") as f:
+        container.files.put(destination_path, f.read(), mode=mode)
+
+
+def build_tgen_template(lxd_client):
+    '''
+    Build a container with MGEN installed and configured, and publish it as the traffic generator
+    template image
+    '''
+    # clear out anything left over from a failed build
+    if lxd_client.containers.exists(TGEN_TEMPLATE_CONTAINER_NAME):
+        print("removing leftover container {}".format(TGEN_TEMPLATE_CONTAINER_NAME))
+        lxd_client.containers.get(TGEN_TEMPLATE_CONTAINER_NAME).delete(wait=True)
+
+    print("Creating {}".format(TGEN_TEMPLATE_CONTAINER_NAME))
+    config = {"name":TGEN_TEMPLATE_CONTAINER_NAME,
+            "source":{"type":"image", "alias":BASE_IMAGE_ALIAS}}
+
+    container = lxd_client.containers.create(config, wait=True)
+    container.config["security.nesting"] = "true"
+    container.save()
+
+    # have /etc/network/interfaces source /etc/network/interfaces.d/*
+    push_file(container, TGEN_NW_INTERFACES_FILE, TGEN_NW_INTERFACES_DEST_PATH)
+
+    # install MGEN binary, keeping it executable the way lxc file push would
+    push_file(container, MGEN_BIN_PATH, MGEN_DEST_PATH, mode=os.stat(MGEN_BIN_PATH).st_mode & 0o777)
+
+    # Install MGEN service file
+    push_file(container, MGEN_SERVICE_FILE, os.path.join(MGEN_SERVICE_PATH, MGEN_SERVICE_FILE))
+
+    # add mgen user
+    print("adding MGEN user")
+    container.start(wait=True)
+    container.execute(["adduser", "mgen", "--shell=/bin/false"])
+    container.stop(wait=True)
+
+    # switching to starting MGEN service manually instead of at boot
+    # # enable mgen service
+    # print("Enabling MGEN service")
+    # container.start(wait=True)
+    # container.execute(["systemctl", "enable", "mgen"])
+    # container.stop(wait=True)
+
+    print("publishing {} as image {}".format(TGEN_TEMPLATE_CONTAINER_NAME, TGEN_TEMPLATE_ALIAS))
+    image = container.publish(wait=True)
+    image.add_alias(TGEN_TEMPLATE_ALIAS, "hurdle traffic generator with MGEN installed")
+
+    container.delete(wait=True)
+
+
+def build_tgen(lxd_client, cont_name, i):
+    '''
+    Create traffic generator number i, counting from 0, from the template image and connect it to
+    its bridge
+    '''
+    print("Creating {}".format(cont_name))
+    config = {"name":cont_name,
+            "source":{"type":"image", "alias":TGEN_TEMPLATE_ALIAS}}
+
+    container = lxd_client.containers.create(config, wait=True)
+    container.config["security.nesting"] = "true"
+
+
+    # Setting up networking for tr0 interface
+    dev_name = "tr0"
+    dev_ip = "192.168.{}.2".format(DEV_IP_BASE+i)
+    dev_gw = "192.168.{}.1".format(DEV_IP_BASE+i)
+
+    dev_config = write_inet_device_config_dict(name=dev_name,
+                                               address=dev_ip,
+                                               parent="trbr{}".format(i+1))
+
+    print("adding device:{}".format(dev_config))
+    container.devices=dev_config
+
+    container.save()
+
+    # writing network interface temporary config files
+    file_name = "{}_{}.cfg".format(cont_name, dev_name)
+    write_inet_device_config_file(file_name=file_name,
+                                  dev_name=dev_name,
+                                  address=dev_ip,
+                                  netmask=DEV_NETMASK,
+                                  gateway=dev_gw)
+
+    # save temp config files to containers
+    push_file(container, file_name, DEV_CONFIG_DEST_PATH)
+
+
 def main():
 
+    # set up command line args
+    parser = argparse.ArgumentParser(prog="build_traffic_generators",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--num-traffic-gens', type=int, default=NUM_TRAFFIC_GENS,
+                        help="Number of traffic generators to build, one per bot and per competitor node. Bridges trbr1 through trbrN must already exist")
+
+    parser.add_argument('--rebuild-template', action="store_true",
+                        help="Rebuild the traffic generator template image, for example after MGEN changes")
 
+    # parse args and store to dictionary
+    args = vars(parser.parse_args())
 
-    # working with 6 traffic generator containers
-    tgen_container_names = ["tgen{}".format(i) for i in range(1,NUM_TRAFFIC_GENS+1)]
+    # one traffic generator container per node
+    tgen_container_names = ["tgen{}".format(i) for i in range(1,args["num_traffic_gens"]+1)]
 
     lxd_client = pylxd.Client()
 
@@ -78,74 +194,31 @@ def main():
         print("No name conflicts found, generating container list: {}".format(tgen_container_names))
 
 
-    for i, cont_name in enumerate(tgen_container_names):
-
-        print("Creating {}".format(cont_name))
-        config = {"name":cont_name,
-                "source":{"type":"image", "alias":"ubuntu/xenial"}}
-
-        container = lxd_client.containers.create(config, wait=True)
-        container.config["security.nesting"] = "true"
-
-
-        # Setting up networking for tr0 interface
-        dev_name = "tr0"
-        dev_ip = "192.168.{}.2".format(DEV_IP_BASE+i)
-        dev_gw = "192.168.{}.1".format(DEV_IP_BASE+i)
-
-        dev_config = write_inet_device_config_dict(name=dev_name,
-                                                   address=dev_ip,
-                                                   parent="trbr{}".format(i+1))
-
-        print("adding device:{}".format(dev_config))
-        container.devices=dev_config
-
-        container.save()
-
-        # writing network interface temporary config files
-        file_name = "{}_{}.cfg".format(cont_name, dev_name)
-        write_inet_device_config_file(file_name=file_name,
-                                      dev_name=dev_name,
-                                      address=dev_ip,
-                                      netmask=DEV_NETMASK,
-                                      gateway=dev_gw)
-
-        # save temp config files to containers
-        push_cmd = ["lxc", "file", "push", file_name, cont_name+DEV_CONFIG_DEST_PATH]
-        print("installing {} interface config file".format(dev_name))
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
-
-        # have /etc/network/interfaces source /etc/network/interfaces.d/*
-        push_cmd = ["lxc", "file", "push", TGEN_NW_INTERFACES_FILE, cont_name+TGEN_NW_INTERFACES_DEST_PATH]
-        print("installing interface config file")
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
-
-        # install MGEN binary
-        push_cmd = ["lxc", "file", "push", MGEN_BIN_PATH, cont_name+MGEN_DEST_PATH]
-        print("installing MGEN binary")
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
-
-        # Install MGEN service file
-        push_cmd = ["lxc", "file", "push", MGEN_SERVICE_FILE, cont_name+MGEN_SERVICE_PATH]
-        print("Configuring MGEN service")
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
-
-        # add mgen user
-        print("adding MGEN user")
-        container.start(wait=True)
-        container.execute(["adduser", "mgen", "--shell=/bin/false"])
-        container.stop(wait=True)
-
-        # switching to starting MGEN service manually instead of at boot
-        # # enable mgen service
-        # print("Enabling MGEN service")
-        # container.start(wait=True)
-        # container.execute(["systemctl", "enable", "mgen"])
-        # container.stop(wait=True)
+    # build the template image once, then reuse it for every later rebuild
+    my_image_names = [alias["name"] for image in lxd_client.images.all() for alias in image.aliases]
+    if TGEN_TEMPLATE_ALIAS in my_image_names and args["rebuild_template"]:
+        print("removing old template image {}".format(TGEN_TEMPLATE_ALIAS))
+        lxd_client.images.get_by_alias(TGEN_TEMPLATE_ALIAS).delete(wait=True)
+
+    if TGEN_TEMPLATE_ALIAS not in my_image_names or args["rebuild_template"]:
+        build_tgen_template(lxd_client)
+    else:
+        print("using existing template image {}".format(TGEN_TEMPLATE_ALIAS))
+
+    # create all traffic generators at once
+    with ThreadPoolExecutor(max_workers=max(1, len(tgen_container_names))) as executor:
+        futures = [(cont_name, executor.submit(build_tgen, lxd_client, cont_name, i))
+                   for i, cont_name in enumerate(tgen_container_names)]
+
+    failed_names = []
+    for cont_name, future in futures:
+        if future.exception() is not None:
+            print("Failed to build traffic generator {}: {}".format(cont_name, future.exception()))
+            failed_names.append(cont_name)
+
+    if len(failed_names) > 0:
+        print("{} of {} traffic generators could not be built, exiting".format(len(failed_names), len(tgen_container_names)))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
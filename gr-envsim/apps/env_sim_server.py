@@ -3,7 +3,9 @@
 ##################################################
 # GNU Radio Python Flow Graph
 # Title: Env Sim Server
-# Generated: Fri Oct 27 13:57:14 2017
+# Originally generated from env_sim_server.grc, now maintained by hand so the
+# per node blocks can be built in loops for any number of nodes. Do not
+# regenerate it from the .grc, which still lays out a fixed 3 + 3 nodes.
 ##################################################
 
 from gnuradio import analog
@@ -43,7 +45,17 @@ class env_sim_server(gr.top_block):
         try: usrp_ip_base = self._usrp_ip_base_config.getint('main', 'usrp_ip_base')
         except: usrp_ip_base = 101
         self.usrp_ip_base = usrp_ip_base
-        self.num_nodes = num_nodes = 6
+        self._num_bot_nodes_config = ConfigParser.ConfigParser()
+        self._num_bot_nodes_config.read(config_file)
+        try: num_bot_nodes = self._num_bot_nodes_config.getint('main', 'num_bot_nodes')
+        except: num_bot_nodes = 3
+        self.num_bot_nodes = num_bot_nodes
+        self._num_competitor_nodes_config = ConfigParser.ConfigParser()
+        self._num_competitor_nodes_config.read(config_file)
+        try: num_competitor_nodes = self._num_competitor_nodes_config.getint('main', 'num_competitor_nodes')
+        except: num_competitor_nodes = 3
+        self.num_competitor_nodes = num_competitor_nodes
+        self.num_nodes = num_nodes = num_bot_nodes + num_competitor_nodes
         self.now = now = time.time()
         self._increment_usrp_address_bool_config = ConfigParser.ConfigParser()
         self._increment_usrp_address_bool_config.read(config_file)
@@ -83,72 +95,29 @@ class env_sim_server(gr.top_block):
         ##################################################
         # Blocks
         ##################################################
-        self.envsim_zmq_envsim_source_0_2_0_0 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[2] + ":" +  str(port_num_base+2),
+        # The per node blocks are built in loops rather than laid out one by one in the flow graph
+        # so the number of nodes can come from the config file. Nodes 0 to num_bot_nodes-1 are
+        # bots, followed by the competitor nodes.
+        self.envsim_zmq_envsim_sources = [envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[i] + ":" +  str(port_num_base+i),
                                          10,
                                          100,
                                          samp_rate,
                                          env_time_int_s,
-                                         env_time_frac_s)
+                                         env_time_frac_s) for i in range(num_nodes)]
 
-        self.envsim_zmq_envsim_source_0_2_0 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[1] + ":" +  str(port_num_base+1),
-                                         10,
-                                         100,
-                                         samp_rate,
-                                         env_time_int_s,
-                                         env_time_frac_s)
-
-        self.envsim_zmq_envsim_source_0_2 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[0] + ":" +  str(port_num_base+0),
-                                         10,
-                                         100,
-                                         samp_rate,
-                                         env_time_int_s,
-                                         env_time_frac_s)
-
-        self.envsim_zmq_envsim_source_0_1 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[3] + ":" +  str(port_num_base+3),
-                                         10,
-                                         100,
-                                         samp_rate,
-                                         env_time_int_s,
-                                         env_time_frac_s)
-
-        self.envsim_zmq_envsim_source_0_0 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[4] + ":" +  str(port_num_base+4),
-                                         10,
-                                         100,
-                                         samp_rate,
-                                         env_time_int_s,
-                                         env_time_frac_s)
+        self.envsim_socket_meta_pdus = [envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[i], str(port_num_base+i), 40000, False)
+                                        for i in range(num_nodes)]
 
-        self.envsim_zmq_envsim_source_0 = envsim.zmq_envsim_source("tcp://"+ usrp_ip_list[5] + ":" +  str(port_num_base+5),
-                                         10,
-                                         100,
-                                         samp_rate,
-                                         env_time_int_s,
-                                         env_time_frac_s)
-
-        self.envsim_socket_meta_pdu_0_2 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[0], str(port_num_base+0), 40000, False)
-        self.envsim_socket_meta_pdu_0_1_3 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[2], str(port_num_base+2), 40000, False)
-        self.envsim_socket_meta_pdu_0_1_2_0 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[5], str(port_num_base+5), 40000, False)
-        self.envsim_socket_meta_pdu_0_1_1_0 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[4], str(port_num_base+4), 40000, False)
-        self.envsim_socket_meta_pdu_0_1_0_0 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[3], str(port_num_base+3), 40000, False)
-        self.envsim_socket_meta_pdu_0_0_0 = envsim.socket_meta_pdu("UDP_CLIENT", usrp_ip_list[1], str(port_num_base+1), 40000, False)
-        self.channels_sro_model_0_1 = channels.sro_model(
+        # competitor signals are clipped and given a sample rate offset before being combined
+        self.blocks_complex_to_floats = [blocks.complex_to_float(1) for j in range(num_competitor_nodes)]
+        self.analog_rail_ffs = [(analog.rail_ff(-1.0, 1.0), analog.rail_ff(-1.0, 1.0)) for j in range(num_competitor_nodes)]
+        self.blocks_float_to_complexs = [blocks.float_to_complex(1) for j in range(num_competitor_nodes)]
+        self.channels_sro_models = [channels.sro_model(
                 samp_rate,
                 0.01,
                 1e3,
-                2
-        )
-        self.channels_sro_model_0_0 = channels.sro_model(
-                samp_rate,
-                0.01,
-                1e3,
-                1
-        )
-        self.channels_sro_model_0 = channels.sro_model(
-                samp_rate,
-                0.01,
-                1e3,
-                0
-        )
+                j
+        ) for j in range(num_competitor_nodes)]
         self.blocks_throttle_0 = blocks.throttle(gr.sizeof_gr_complex*1, samp_rate,True)
         self.blocks_tagged_stream_to_pdu_0_0 = blocks.tagged_stream_to_pdu(blocks.complex_t, 'packet_len')
         self.blocks_tagged_stream_to_pdu_0 = blocks.tagged_stream_to_pdu(blocks.complex_t, 'packet_len')
@@ -158,71 +127,46 @@ class env_sim_server(gr.top_block):
         self.blocks_multiply_const_xx_0_0 = blocks.multiply_const_cc(channel_gain_linear)
         self.blocks_multiply_const_xx_0 = blocks.multiply_const_cc(channel_gain_linear)
         self.blocks_message_debug_0 = blocks.message_debug()
-        self.blocks_float_to_complex_0_1 = blocks.float_to_complex(1)
-        self.blocks_float_to_complex_0_0 = blocks.float_to_complex(1)
-        self.blocks_float_to_complex_0 = blocks.float_to_complex(1)
-        self.blocks_complex_to_float_0_1 = blocks.complex_to_float(1)
-        self.blocks_complex_to_float_0_0 = blocks.complex_to_float(1)
-        self.blocks_complex_to_float_0 = blocks.complex_to_float(1)
         self.blocks_add_xx_0_1 = blocks.add_vcc(1)
         self.blocks_add_xx_0_0_0 = blocks.add_vcc(1)
         self.blocks_add_xx_0_0 = blocks.add_vcc(1)
         self.blocks_add_xx_0 = blocks.add_vcc(1)
-        self.analog_rail_ff_0_2 = analog.rail_ff(-1.0, 1.0)
-        self.analog_rail_ff_0_1 = analog.rail_ff(-1.0, 1.0)
-        self.analog_rail_ff_0_0_1 = analog.rail_ff(-1.0, 1.0)
-        self.analog_rail_ff_0_0_0 = analog.rail_ff(-1.0, 1.0)
-        self.analog_rail_ff_0_0 = analog.rail_ff(-1.0, 1.0)
-        self.analog_rail_ff_0 = analog.rail_ff(-1.0, 1.0)
         self.analog_noise_source_x_0 = analog.noise_source_c(analog.GR_GAUSSIAN, noise_amp, 0)
 
         ##################################################
         # Connections
         ##################################################
         self.msg_connect((self.blocks_probe_rate_0, 'rate'), (self.blocks_message_debug_0, 'print'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0, 'pdus'), (self.envsim_socket_meta_pdu_0_1_0_0, 'pdus'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0, 'pdus'), (self.envsim_socket_meta_pdu_0_1_1_0, 'pdus'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0, 'pdus'), (self.envsim_socket_meta_pdu_0_1_2_0, 'pdus'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0_0, 'pdus'), (self.envsim_socket_meta_pdu_0_0_0, 'pdus'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0_0, 'pdus'), (self.envsim_socket_meta_pdu_0_1_3, 'pdus'))
-        self.msg_connect((self.blocks_tagged_stream_to_pdu_0_0, 'pdus'), (self.envsim_socket_meta_pdu_0_2, 'pdus'))
         self.connect((self.analog_noise_source_x_0, 0), (self.blocks_add_xx_0_0, 0))
         self.connect((self.analog_noise_source_x_0, 0), (self.blocks_add_xx_0_0_0, 1))
-        self.connect((self.analog_rail_ff_0, 0), (self.blocks_float_to_complex_0, 1))
-        self.connect((self.analog_rail_ff_0_0, 0), (self.blocks_float_to_complex_0, 0))
-        self.connect((self.analog_rail_ff_0_0_0, 0), (self.blocks_float_to_complex_0_0, 0))
-        self.connect((self.analog_rail_ff_0_0_1, 0), (self.blocks_float_to_complex_0_1, 0))
-        self.connect((self.analog_rail_ff_0_1, 0), (self.blocks_float_to_complex_0_0, 1))
-        self.connect((self.analog_rail_ff_0_2, 0), (self.blocks_float_to_complex_0_1, 1))
         self.connect((self.blocks_add_xx_0, 0), (self.blocks_multiply_const_xx_0, 0))
         self.connect((self.blocks_add_xx_0_0, 0), (self.blocks_throttle_0, 0))
         self.connect((self.blocks_add_xx_0_0_0, 0), (self.blocks_stream_to_tagged_stream_0_0, 0))
         self.connect((self.blocks_add_xx_0_1, 0), (self.blocks_add_xx_0, 0))
         self.connect((self.blocks_add_xx_0_1, 0), (self.blocks_multiply_const_xx_0_0, 0))
-        self.connect((self.blocks_complex_to_float_0, 1), (self.analog_rail_ff_0, 0))
-        self.connect((self.blocks_complex_to_float_0, 0), (self.analog_rail_ff_0_0, 0))
-        self.connect((self.blocks_complex_to_float_0_0, 0), (self.analog_rail_ff_0_0_0, 0))
-        self.connect((self.blocks_complex_to_float_0_0, 1), (self.analog_rail_ff_0_1, 0))
-        self.connect((self.blocks_complex_to_float_0_1, 0), (self.analog_rail_ff_0_0_1, 0))
-        self.connect((self.blocks_complex_to_float_0_1, 1), (self.analog_rail_ff_0_2, 0))
-        self.connect((self.blocks_float_to_complex_0, 0), (self.channels_sro_model_0_1, 0))
-        self.connect((self.blocks_float_to_complex_0_0, 0), (self.channels_sro_model_0_0, 0))
-        self.connect((self.blocks_float_to_complex_0_1, 0), (self.channels_sro_model_0, 0))
         self.connect((self.blocks_multiply_const_xx_0, 0), (self.blocks_add_xx_0_0, 1))
         self.connect((self.blocks_multiply_const_xx_0_0, 0), (self.blocks_add_xx_0_0_0, 0))
         self.connect((self.blocks_stream_to_tagged_stream_0, 0), (self.blocks_tagged_stream_to_pdu_0, 0))
         self.connect((self.blocks_stream_to_tagged_stream_0_0, 0), (self.blocks_tagged_stream_to_pdu_0_0, 0))
         self.connect((self.blocks_throttle_0, 0), (self.blocks_probe_rate_0, 0))
         self.connect((self.blocks_throttle_0, 0), (self.blocks_stream_to_tagged_stream_0, 0))
-        self.connect((self.channels_sro_model_0, 0), (self.blocks_add_xx_0, 1))
-        self.connect((self.channels_sro_model_0_0, 0), (self.blocks_add_xx_0, 2))
-        self.connect((self.channels_sro_model_0_1, 0), (self.blocks_add_xx_0, 3))
-        self.connect((self.envsim_zmq_envsim_source_0, 0), (self.blocks_complex_to_float_0, 0))
-        self.connect((self.envsim_zmq_envsim_source_0_0, 0), (self.blocks_complex_to_float_0_0, 0))
-        self.connect((self.envsim_zmq_envsim_source_0_1, 0), (self.blocks_complex_to_float_0_1, 0))
-        self.connect((self.envsim_zmq_envsim_source_0_2, 0), (self.blocks_add_xx_0_1, 0))
-        self.connect((self.envsim_zmq_envsim_source_0_2_0, 0), (self.blocks_add_xx_0_1, 1))
-        self.connect((self.envsim_zmq_envsim_source_0_2_0_0, 0), (self.blocks_add_xx_0_1, 2))
+
+        # bots only hear the other bots
+        for i in range(num_bot_nodes):
+            self.connect((self.envsim_zmq_envsim_sources[i], 0), (self.blocks_add_xx_0_1, i))
+            self.msg_connect((self.blocks_tagged_stream_to_pdu_0_0, 'pdus'), (self.envsim_socket_meta_pdus[i], 'pdus'))
+
+        # competitors hear the bots and every competitor
+        for j in range(num_competitor_nodes):
+            i = num_bot_nodes + j
+            self.connect((self.envsim_zmq_envsim_sources[i], 0), (self.blocks_complex_to_floats[j], 0))
+            self.connect((self.blocks_complex_to_floats[j], 0), (self.analog_rail_ffs[j][0], 0))
+            self.connect((self.blocks_complex_to_floats[j], 1), (self.analog_rail_ffs[j][1], 0))
+            self.connect((self.analog_rail_ffs[j][0], 0), (self.blocks_float_to_complexs[j], 0))
+            self.connect((self.analog_rail_ffs[j][1], 0), (self.blocks_float_to_complexs[j], 1))
+            self.connect((self.blocks_float_to_complexs[j], 0), (self.channels_sro_models[j], 0))
+            self.connect((self.channels_sro_models[j], 0), (self.blocks_add_xx_0, j+1))
+            self.msg_connect((self.blocks_tagged_stream_to_pdu_0, 'pdus'), (self.envsim_socket_meta_pdus[i], 'pdus'))
 
     def get_config_file(self):
         return self.config_file
@@ -331,9 +275,8 @@ class env_sim_server(gr.top_block):
 
     def set_samp_rate(self, samp_rate):
         self.samp_rate = samp_rate
-        self.channels_sro_model_0_1.set_samp_rate(self.samp_rate)
-        self.channels_sro_model_0_0.set_samp_rate(self.samp_rate)
-        self.channels_sro_model_0.set_samp_rate(self.samp_rate)
+        for sro_model in self.channels_sro_models:
+            sro_model.set_samp_rate(self.samp_rate)
         self.blocks_throttle_0.set_sample_rate(self.samp_rate)
 
     def get_port_num_base(self):
@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 
 import argparse
-import hashlib
 import os
-import subprocess
 import sys
 
 import pylxd
 
+from container_files import push_file
+from image_fingerprint import cached_fingerprint
+from image_fingerprint import image_fingerprint
+from image_fingerprint import record_fingerprint
+from parallel_exec import fan_out
+from run_trace import enable_tracing_from_env
+from run_trace import span
+
 NUM_BOT_CONTAINERS = 3
 NUM_COMPETITOR_CONTAINERS = 3
 CONTAINER_NAME_PATTERN="competitor-hurdle-srn"
 IMAGE_PATH = "/share/nas/competitor/images/"
 IMAGE_ALIAS = "competitor-image"
-BUF_SIZE=65536*16
 
 TR0_IP_BASE = 101
 COL0_IP_BASE = 101
@@ -21,20 +26,33 @@ USRP0_IP_BASE = 101
 
 NW_INTERFACE_CONFIG_DEST_PATH = "/etc/network/interfaces.d"
 
+# every interface of a container is configured in this one file in NW_INTERFACE_CONFIG_DEST_PATH
+NW_INTERFACE_CONFIG_FILE_NAME = "hurdle_interfaces.cfg"
+
 def get_image_export_fingerprint(image_file):
     '''
-    Get the fingerprint of our image export
+    Get the fingerprint of our image export, hashing it only if it isn't in the fingerprint cache
     '''
-    sha256 = hashlib.sha256()
-    with open(os.path.join(IMAGE_PATH, image_file), 'rb') as f:
-        while True:
-            data = f.read(BUF_SIZE)
-            if not data:
-                break
+    return image_fingerprint(os.path.join(IMAGE_PATH, image_file))
 
-            sha256.update(data)
 
-    return sha256.hexdigest()
+def get_loaded_image_alias(lxd_client, fingerprint):
+    '''
+    Get the first alias of the already loaded image with the given fingerprint, or exit if it has
+    none
+    '''
+    loaded_image = lxd_client.images.get(fingerprint)
+
+    # if there's an alias defined, use the first one
+    if len(loaded_image.aliases) > 0:
+        image_alias = loaded_image.aliases[0]["name"]
+        print("now using alias {}".format(image_alias))
+        return image_alias
+    else:
+        print("existing image has no alias. Can't recover")
+        print("Please ensure the image you specified is not required for the hurdle")
+        print("if it is not required internally by this hurdle, remove the image with fingerprint {}".format(fingerprint))
+        sys.exit(1)
 
 
 def update_inet_device_config_dict(dev_config_dict, name, address, parent, **kwargs):
@@ -56,55 +74,104 @@ def update_inet_device_config_dict(dev_config_dict, name, address, parent, **kwa
 
     return dev_config_dict
 
-def write_inet_device_config_file(file_name, dev_name, address, netmask):
+def write_inet_devices_config_file(file_name, devices):
     '''
-    Write out a device config file expected in /etc/network/interfaces.d
+    Write out a single config file for /etc/network/interfaces.d covering every device
     '''
     with open(file_name, "w") as f:
-        print("auto {}".format(dev_name), file=f)
-        print("iface {} inet static".format(dev_name), file=f)
-        print("    address {}".format(address), file=f)
-        print("    netmask {}".format(netmask), file=f)
+        for device in devices:
+            print("auto {}".format(device["name"]), file=f)
+            print("iface {} inet static".format(device["name"]), file=f)
+            print("    address {}".format(device["address"]), file=f)
+            print("    netmask {}".format(device["netmask"]), file=f)
+            print("", file=f)
 
     return
 
-def configure_container_inet_device(client, cont_name, dev_name, address, parent, netmask, **kwargs):
+def configure_container_inet_devices(container, devices):
     '''
-    Update the container device dictionary with a new ethernet device, save the new configuration
-    to the container, create a temporary network interface file, and store that file in the
-    container in /etc/network/interfaces.d/
+    Add every ethernet device in devices to the container's device dictionary and save it in one
+    update, then install a single network interface file for all of them in
+    /etc/network/interfaces.d/. devices is a list of dictionaries with the name, address, parent
+    and netmask of each device. Any other keys are added to the LXD device config.
     '''
-
-    # get current device config
-    container = client.containers.get(cont_name)
     dev_config_dict = container.devices
 
-    # add device to devices dict
-    print("adding device {} to container {}".format(dev_name, cont_name))
-    dev_config_dict = update_inet_device_config_dict(dev_config_dict=dev_config_dict,
-                                                     name=dev_name,
-                                                     address=address,
-                                                     parent=parent)
+    # add devices to devices dict
+    for device in devices:
+        print("adding device {} to container {}".format(device["name"], container.name))
+        extra_config = {key:val for key, val in device.items()
+                        if key not in ("name", "address", "parent", "netmask")}
+        dev_config_dict = update_inet_device_config_dict(dev_config_dict=dev_config_dict,
+                                                         name=device["name"],
+                                                         address=device["address"],
+                                                         parent=device["parent"],
+                                                         **extra_config)
     # update container
     container.devices=dev_config_dict
-    container.save()
+    with span("save devices", category="lxd", container=container.name):
+        container.save()
 
     # write network interface temporary config file
-    file_name = "{}_{}.cfg".format(cont_name, dev_name)
-    write_inet_device_config_file(file_name=file_name,
-                                    dev_name=dev_name,
-                                    address=address,
-                                    netmask=netmask,
-                                    )
-
-    # save temp config files to containers
-    dest_file_name = "{}.cfg".format(dev_name)
+    file_name = "{}_{}".format(container.name, NW_INTERFACE_CONFIG_FILE_NAME)
+    write_inet_devices_config_file(file_name, devices)
 
     # push temporary file into container
-    push_cmd = ["lxc", "file", "push", file_name, cont_name+os.path.join(NW_INTERFACE_CONFIG_DEST_PATH, dest_file_name)]
-    print("installing {} interface config file".format(dev_name))
-    print("running {}".format(" ".join(push_cmd)))
-    subprocess.run(push_cmd)
+    print("installing interface config file for {}".format(container.name))
+    push_file(container, file_name, os.path.join(NW_INTERFACE_CONFIG_DEST_PATH, NW_INTERFACE_CONFIG_FILE_NAME))
+
+
+def competitor_network_devices(node_num):
+    '''
+    Get the network devices of a competitor container, where node_num counts every node from 0,
+    bots first
+    '''
+    # Setting up networking for competitors
+    # tr0 interfaces first
+    tr0 = {"name":"tr0",
+           "address":"192.168.{}.1".format(TR0_IP_BASE+node_num),
+           "netmask":"255.255.255.0",
+           "parent":"trbr{}".format(node_num+1)}
+
+    # Next COL interface. Note that this schema expects that the collaboration server will be
+    # listening on subnet 172.30.COL0_IP_BASE.0
+    col0 = {"name":"col0",
+            "address":"172.30.{}.{}".format(COL0_IP_BASE, COL0_IP_BASE+node_num),
+            "netmask":"255.255.255.0",
+            "parent":"colbr0"}
+
+    # Next USRP interface.
+    usrp0 = {"name":"usrp0",
+             "address":"192.168.40.{}".format(USRP0_IP_BASE+node_num),
+             "netmask":"255.255.255.0",
+             "parent":"usrpbr0"}
+
+    return [tr0, col0, usrp0]
+
+
+def create_competitor_container(client, cont_name, source, devices):
+    '''
+    Create a competitor container from source and set up its network devices. Containers created
+    from an image start with no devices. Copies keep the devices of the container they were copied
+    from, and only need the per node addresses and bridges changed.
+    '''
+    config = {"name":cont_name,
+              "source":source}
+
+    print("Creating {} with config {}".format(cont_name, config))
+
+    with span("create {}".format(cont_name), category="lxd"):
+        container = client.containers.create(config, wait=True)
+
+    if source["type"] == "image":
+        container.config["security.nesting"] = "true"
+
+        # clear out existing devices. Saved along with the new devices
+        container.devices = {}
+
+    configure_container_inet_devices(container, devices)
+
+    return container
 
 
 def main():
@@ -116,15 +183,26 @@ def main():
     parser.add_argument('--image-file', default="competitor-image.tar.gz",
                         help="The lxc image file in /share/nas/competitor/images/ we'll generate containers from")
 
+    parser.add_argument('--num-bot-nodes', type=int, default=NUM_BOT_CONTAINERS,
+                        help="Number of bot nodes. Competitor SRN numbers start after the bots")
+
+    parser.add_argument('--num-competitor-nodes', type=int, default=NUM_COMPETITOR_CONTAINERS,
+                        help="Number of competitor containers to create")
+
+    parser.add_argument('--clone-from-template', action="store_true",
+                        help="Only create the first container from the image, then copy it for the rest and patch their addresses. Much faster on copy-on-write storage")
+
     # parse args and store to dictionary
     args = vars(parser.parse_args())
 
+    enable_tracing_from_env("configure_competitor_containers")
 
     # set up range of SRN numbers to work with
-    start_srn_num = NUM_BOT_CONTAINERS+1
-    end_srn_num = NUM_BOT_CONTAINERS+NUM_COMPETITOR_CONTAINERS+1
+    num_bots = args["num_bot_nodes"]
+    start_srn_num = num_bots+1
+    end_srn_num = num_bots+args["num_competitor_nodes"]+1
 
-    # working with 3 competitor containers. Build up list of container names
+    # Build up list of competitor container names
     comp_container_names = [CONTAINER_NAME_PATTERN+"{}".format(i) for i in range(start_srn_num, end_srn_num)]
 
     lxd_client = pylxd.Client()
@@ -148,116 +226,79 @@ def main():
     # just in case there's a weird conflict later, use a temp variable for the image alias name
     current_image_alias = IMAGE_ALIAS
 
-    # check if the image file we specified exists
-    try:
-
-        image_filepath = os.path.join(IMAGE_PATH, args["image_file"])
-        print("attempting to load image from {}".format(image_filepath))
-        with open(image_filepath, 'rb') as f:
-            image = lxd_client.images.create(f, wait=True)
-            image.add_alias(current_image_alias, description="potential competitor hurdle solution")
-    except FileNotFoundError as err:
+    image_filepath = os.path.join(IMAGE_PATH, args["image_file"])
+    if not os.path.isfile(image_filepath):
         print("File: {} not found in {}, exiting".format(args["image_file"],IMAGE_PATH))
         sys.exit(1)
-    except pylxd.exceptions.LXDAPIException as err:
 
-        # warn if this fingerprint exists, but continue anyhow
-        if str(err) == "Image with same fingerprint already exists":
-            print("warning, image with same fingerprint has been loaded previously. Make sure this is the image you intended")
+    # if we've seen this exact file before, ask LXD whether it already has the image instead of
+    # uploading gigabytes just to be told it's a duplicate. Files we haven't seen aren't hashed
+    # up front, since the upload itself tells us the fingerprint
+    fingerprint = cached_fingerprint(image_filepath)
+    if fingerprint is not None and lxd_client.images.exists(fingerprint):
+        print("image {} with fingerprint {} is already loaded, skipping upload".format(image_filepath, fingerprint))
+        print("warning, image with same fingerprint has been loaded previously. Make sure this is the image you intended")
+        current_image_alias = get_loaded_image_alias(lxd_client, fingerprint)
+    else:
+        try:
+            print("attempting to load image from {}".format(image_filepath))
+            with open(image_filepath, 'rb') as f, span("load image", category="lxd", image_file=args["image_file"]):
+                image = lxd_client.images.create(f, wait=True)
+                image.add_alias(current_image_alias, description="potential competitor hurdle solution")
+
+            # LXD hashed the image on import, so remember its fingerprint for next time
+            record_fingerprint(image_filepath, image.fingerprint)
+        except pylxd.exceptions.LXDAPIException as err:
 
-            # get an alias that works so we can go forward
-            # first get our fingerprint
-            fingerprint = get_image_export_fingerprint(args["image_file"])
+            # warn if this fingerprint exists, but continue anyhow
+            if str(err) == "Image with same fingerprint already exists":
+                print("warning, image with same fingerprint has been loaded previously. Make sure this is the image you intended")
 
+                # get an alias that works so we can go forward
+                # first get our fingerprint
+                with span("fingerprint image", image_file=args["image_file"]):
+                    fingerprint = get_image_export_fingerprint(args["image_file"])
 
-            # now get image associated with that fingerprint
-            loaded_image = lxd_client.images.get(fingerprint)
+                current_image_alias = get_loaded_image_alias(lxd_client, fingerprint)
 
-            # if there's an alias defined, load the first one into current_image_alias.
-            if len(loaded_image.aliases) > 0:
-                current_image_alias = loaded_image.aliases[0]["name"]
-                print("now using alias {}".format(current_image_alias))
             else:
-                print("existing image has no alias. Can't recover")
-                print("Please ensure the image you specified is not required for the hurdle")
-                print("if it is not required internally by this hurdle, remove the image with fingerprint {}".format(fingerprint))
+                print("Error loading image: Check if it has already been loaded by running 'lxc image list'")
+                print("Error was: {}".format(err))
                 sys.exit(1)
 
-
-        else:
-            print("Error loading image: Check if it has already been loaded by running 'lxc image list'")
-            print("Error was: {}".format(err))
-            sys.exit(1)
-
     my_images = lxd_client.images.all()
     my_image_names = [alias["name"] for image in my_images for alias in image.aliases ]
 
     print("image load was successful. Current image list now {}".format(my_image_names))
 
 
-    # stand up competitor containers
-    for i, cont_name in enumerate(comp_container_names):
+    image_source = {"type":"image", "alias":current_image_alias}
+    devices = {cont_name:competitor_network_devices(num_bots+i) for i, cont_name in enumerate(comp_container_names)}
 
-        config = {"name":cont_name,
-                  "source":{"type":"image", "alias":current_image_alias}}
+    if args["clone_from_template"] and len(comp_container_names) > 0:
+        # the first container is fully configured and then used as the template for the rest
+        template_name = comp_container_names[0]
+        create_competitor_container(lxd_client, template_name, image_source, devices[template_name])
 
-        print("Creating {} with config {}".format(cont_name, config))
+        remaining_names = comp_container_names[1:]
+        source = {"type":"copy", "source":template_name}
+    else:
+        remaining_names = comp_container_names
+        source = image_source
 
-        container = lxd_client.containers.create(config, wait=True)
-        container.config["security.nesting"] = "true"
+    # stand up the remaining competitor containers all at once
+    results = fan_out(lambda cont_name: create_competitor_container(lxd_client, cont_name, source, devices[cont_name]),
+                      remaining_names)
 
-        # clear out existing devices and save
-        dev_config_dict = {}
-        container.devices = dev_config_dict
-        container.save()
+    failed_names = []
+    for result in results:
+        if result.error is not None:
+            print("Failed to create container {}: {}".format(result.item, result.error))
+            failed_names.append(result.item)
 
-        # Setting up networking for bots
-        # tr0 interfaces first
-
-        tr0_name = "tr0"
-        tr0_ip = "192.168.{}.1".format(TR0_IP_BASE+NUM_BOT_CONTAINERS+i)
-        tr0_netmask = "255.255.255.0"
-        tr0_parent = "trbr{}".format(NUM_BOT_CONTAINERS+i+1)
-
-        # set up the tr0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=tr0_name,
-                                        address=tr0_ip,
-                                        parent=tr0_parent,
-                                        netmask=tr0_netmask)
-
-
-        # Next COL interface. Note that this schema expects that the collaboration server will be
-        # listening on subnet 172.30.COL0_IP_BASE.0
-        col0_name = "col0"
-        col0_ip = "172.30.{}.{}".format(COL0_IP_BASE, NUM_BOT_CONTAINERS+COL0_IP_BASE+i)
-        col0_netmask = "255.255.255.0"
-        col0_parent = "colbr0"
-
-        # set up the col0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=col0_name,
-                                        address=col0_ip,
-                                        parent=col0_parent,
-                                        netmask=col0_netmask)
-
-
-        # Next USRP interface.
-        usrp0_name = "usrp0"
-        usrp0_ip = "192.168.40.{}".format(NUM_BOT_CONTAINERS+USRP0_IP_BASE+i)
-        usrp0_netmask = "255.255.255.0"
-        usrp0_parent = "usrpbr0"
-
-
-        # set up the usrp0 interface for the current container
-        configure_container_inet_device(client=lxd_client,
-                                        cont_name=cont_name,
-                                        dev_name=usrp0_name,
-                                        address=usrp0_ip,
-                                        parent=usrp0_parent,
-                                        netmask=usrp0_netmask)
+    if len(failed_names) > 0:
+        print("{} of {} competitor containers could not be created, exiting".format(len(failed_names), len(comp_container_names)))
+        sys.exit(1)
 
 
 if __name__ == "__main__":
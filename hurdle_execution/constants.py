@@ -1,3 +1,16 @@
 RESULT_FILENAME="hurdle_packet_counts.json"
+LIVE_RESULT_FILENAME="hurdle_live_packet_counts.json"
+METRICS_FILENAME="hurdle_traffic_metrics.json"
+BUCKETED_RESULT_FILENAME="hurdle_bucketed_packet_counts.json"
+STEP_TIMING_FILENAME="hurdle_step_timings.json"
+STATUS_TIMELINE_FILENAME="hurdle_status_timeline.json"
+RUN_JOURNAL_FILENAME="hurdle_run_journal.json"
+TRACE_FILENAME="hurdle_trace.json"
 
-PACKET_SUCCESS_THRESHOLD = 0.8
\ No newline at end of file
+# note this is used in a couple of files
+COMPETITOR_NAME_BASE='competitor-hurdle-srn'
+
+PACKET_SUCCESS_THRESHOLD = 0.8
+
+# time at the start of the run that isn't counted towards the expected number of packets
+BOOTUP_SLOP_TIME = 8.0
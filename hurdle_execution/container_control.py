@@ -1,30 +1,85 @@
 #!/usr/bin/env python3
 
 import argparse
+import sys
 
 import pylxd
 
+from parallel_exec import fan_out
+from run_trace import enable_tracing_from_env
+from run_trace import span
 
-def control_container(client, cont_name, action):
+# how many containers to start or stop at once. LXD slows down when asked to boot too many
+# containers at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# seconds LXD is given to start or stop each container, the same as the pylxd default
+DEFAULT_CONTAINER_TIMEOUT = 30
+
+# extra seconds to wait on top of the container timeouts before giving up on a call to LXD
+LXD_TIMEOUT_SLOP = 30
+
+
+def control_container(client, cont_name, action, timeout=DEFAULT_CONTAINER_TIMEOUT):
     '''
     given an instance of the lxd client and the container name, perform the specified action
-    (start or stop)
+    (start or stop), giving LXD up to timeout seconds to do it
     '''
     try:
         container = client.containers.get(cont_name)
+
+        # LXD refuses to start a running container or stop a stopped one, which happens when
+        # resuming a run that failed part way through
+        if ((action == "start" and container.status == "Running") or
+                (action == "stop" and container.status == "Stopped")):
+            print("container {} is already {}, skipping".format(cont_name, container.status.lower()))
+            return
+
         print("{}ing container {}".format(action, cont_name))
-        if action == "start":
-            container.start(wait=True)
-        elif action == "stop":
-            container.stop(wait=True)
-        else:
-            raise NameError("Uknown action specified: {}".format(action))
+        with span("{} {}".format(action, cont_name), category="lxd"):
+            if action == "start":
+                container.start(timeout=timeout, wait=True)
+            elif action == "stop":
+                container.stop(timeout=timeout, wait=True)
+            else:
+                raise NameError("Uknown action specified: {}".format(action))
 
     except pylxd.exceptions.LXDAPIException as err:
         print("error when trying to {} container {}".format(action, cont_name))
         raise(err)
 
 
+def control_containers(client, container_names, action, max_workers=DEFAULT_MAX_WORKERS,
+                       timeout=DEFAULT_CONTAINER_TIMEOUT):
+    '''
+    perform the specified action on every container, up to max_workers containers at a time.
+    Returns a list of CallResults in the same order as container_names
+    '''
+    # every container gets its full timeout, however long it waited for a free worker
+    num_rounds = -(-len(container_names)//max_workers)
+    overall_timeout = num_rounds*timeout + LXD_TIMEOUT_SLOP
+
+    return fan_out(lambda cont_name: control_container(client, cont_name, action, timeout),
+                   container_names, timeout=overall_timeout, max_workers=max_workers)
+
+
+def print_results(results, action):
+    '''
+    print a table of how the action went for each container
+    '''
+    name_width = max([len("container")] + [len(result.item) for result in results])
+
+    print("{:<{}}  {:<6}  {:>8}  {}".format("container", name_width, "result", "time (s)", "error"))
+    for result in results:
+        print("{:<{}}  {:<6}  {:>8.2f}  {}".format(result.item, name_width,
+                                                  "ok" if result.error is None else "FAILED",
+                                                  result.elapsed,
+                                                  "" if result.error is None else result.error))
+
+    num_failed = sum(1 for result in results if result.error is not None)
+    print("{} of {} containers failed to {}".format(num_failed, len(results), action))
+
+
 def main():
 
     # set up command line args
@@ -38,12 +93,18 @@ def main():
     parser.add_argument('--tgen-container-name-base', default="tgen", dest="tgen_base",
                         help="Traffic generator container name prefix, no container number")
 
+    parser.add_argument('--max-workers', type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Maximum number of containers to start or stop at the same time")
+    parser.add_argument('--timeout', type=int, default=DEFAULT_CONTAINER_TIMEOUT,
+                        help="Seconds to allow each container to start or stop")
+
     parser.add_argument('action', choices=["start", "stop"],
                         help="start or stop the containers")
 
     # parse args and store to dictionary
     args = vars(parser.parse_args())
 
+    enable_tracing_from_env("container_control")
 
     # get list of all known container names
     lxd_client = pylxd.Client()
@@ -66,8 +127,13 @@ def main():
     # combine container names into single list for simple iteration
     container_names = tgen_container_names + bot_container_names + comp_container_names
 
-    for cont_name in container_names:
-        control_container(lxd_client, cont_name, args["action"])
+    results = control_containers(lxd_client, container_names, args["action"],
+                                 max_workers=args["max_workers"], timeout=args["timeout"])
+
+    print_results(results, args["action"])
+
+    if any(result.error is not None for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+import os
+import subprocess
+
+from parallel_exec import fan_out
+from run_trace import span
+from run_trace import traced_run
+
+
+# gzip level used when pulling files compressed. Logs are mostly repeated text, so the fastest
+# level already shrinks them several times over
+PULL_COMPRESSION_LEVEL = 1
+
+# bytes read at a time when streaming a file out of a container, so big logs are never held in
+# memory all at once
+PULL_CHUNK_BYTES = 1 << 20
+
+
+def push_file(container, source_file, destination_path):
+    '''
+    Copy a local file into a container through the LXD API
+    '''
+    with open(source_file, "rb") as f:
+        data = f.read()
+
+    with span("push {}".format(os.path.basename(destination_path)), category="lxd",
+              container=container.name, size=len(data)):
+        container.files.put(destination_path, data)
+
+
+def pull_file(container, source_path, destination_file):
+    '''
+    Copy a file out of a container through the LXD API, streaming it to destination_file
+    PULL_CHUNK_BYTES at a time
+    '''
+    size = 0
+    with span("pull {}".format(os.path.basename(source_path)), category="lxd",
+              container=container.name):
+        # files.get reads the whole response into memory, so go to the raw files endpoint
+        response = container.api.files.get(params={"path":source_path}, stream=True)
+        try:
+            if response.status_code != 200:
+                raise RuntimeError("could not pull {}: {} {}".format(source_path, response.status_code,
+                                                                      response.text.strip()))
+
+            with open(destination_file, "wb") as f:
+                for chunk in response.iter_content(chunk_size=PULL_CHUNK_BYTES):
+                    f.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            # don't leave a partial copy behind to be mistaken for the whole file
+            if os.path.exists(destination_file):
+                os.remove(destination_file)
+            raise
+        finally:
+            response.close()
+
+    return size
+
+
+def pull_file_compressed(container, source_path, destination_file):
+    '''
+    Stream a file out of a container through gzip into destination_file, so the file crosses
+    the LXD connection compressed and is never held in memory
+    '''
+    cmd = ["lxc", "exec", container.name, "--", "gzip", "-c", "-{}".format(PULL_COMPRESSION_LEVEL), source_path]
+    with open(destination_file, "wb") as f:
+        subproc = traced_run(cmd, stdout=f, stderr=subprocess.PIPE)
+
+    if subproc.returncode != 0:
+        os.remove(destination_file)
+        raise RuntimeError(subproc.stderr.decode("utf-8", "replace").strip())
+
+    return os.path.getsize(destination_file)
+
+
+def transfer_files(transfer_func, transfers, verb):
+    '''
+    Run transfer_func(container, source, destination) for every tuple in transfers, one thread
+    per transfer, printing each transfer and any that failed. Returns a list of CallResults in the
+    same order as transfers.
+    '''
+    for container, source, destination in transfers:
+        print("{} {}: {} -> {}".format(verb, container.name, source, destination))
+
+    results = fan_out(lambda transfer: transfer_func(*transfer), transfers)
+
+    for result in results:
+        if result.error is not None:
+            container, source, destination = result.item
+            print("Failed {} {} on {}: {}".format(verb.lower(), source, container.name, result.error))
+
+    return results
+
+
+def push_files(transfers):
+    '''
+    Push files into containers at the same time. transfers is a list of
+    (container, local source file, destination path in the container)
+    '''
+    return transfer_files(push_file, transfers, "Pushing")
+
+
+def pull_files(transfers):
+    '''
+    Pull files out of containers at the same time. transfers is a list of
+    (container, source path in the container, local destination file)
+    '''
+    return transfer_files(pull_file, transfers, "Pulling")
+
+
+def pull_files_compressed(transfers):
+    '''
+    Pull files out of containers gzip compressed, at the same time. transfers is a list of
+    (container, source path in the container, local destination file)
+    '''
+    return transfer_files(pull_file_compressed, transfers, "Pulling compressed")
@@ -2,9 +2,16 @@
 
 import argparse
 import configparser
-import subprocess
 import sys
 
+from run_trace import enable_tracing_from_env
+from run_trace import traced_run
+
+# the envsim-debug-output and envsim-bot-debug flow graphs are laid out for a fixed number of
+# nodes. Only the main envsim flow graph takes its node counts from the config file
+FIXED_NUM_BOT_NODES = 3
+FIXED_NUM_COMPETITOR_NODES = 3
+
 def main():
 
     # set up command line args
@@ -51,6 +58,12 @@ def main():
     parser_start.add_argument("--usrp-ip-base", default=101, type=int,
                             help="starting point for last octect of IPs to send samples to")
 
+    parser_start.add_argument("--num-bot-nodes", type=int, default=FIXED_NUM_BOT_NODES,
+                              help="Number of bot nodes to simulate channels for")
+
+    parser_start.add_argument("--num-competitor-nodes", type=int, default=FIXED_NUM_COMPETITOR_NODES,
+                              help="Number of competitor nodes to simulate channels for")
+
     parser_start.add_argument("--channel-gain-linear", type=float, default=0.01,
                               help="scalar applied to channels, linear (not log) scaled")
 
@@ -58,6 +71,8 @@ def main():
     # parse args and store to dictionary
     args = vars(parser.parse_args())
 
+    enable_tracing_from_env("envsim_control")
+
     # stop the envsim server if commanded to do so
     if args["action"] == "stop":
 
@@ -74,12 +89,22 @@ def main():
 
         print("Stopping envsim")
         print("running {}".format(" ".join(stop_cmd)))
-        subprocess.run(stop_cmd)
+        traced_run(stop_cmd)
 
         sys.exit(0)
     # otherwise we must be starting
     else:
 
+        # the debug flow graphs have a fixed number of nodes. The bot-debug one has no competitors
+        if args["mode"] == "bot-debug" or args["enable_debug_output"]:
+            comps_fixed = args["mode"] == "hurdle"
+            if (args["num_bot_nodes"] != FIXED_NUM_BOT_NODES or
+                    (comps_fixed and args["num_competitor_nodes"] != FIXED_NUM_COMPETITOR_NODES)):
+                print("The {} envsim only supports {} bot and {} competitor nodes".format(
+                    args["mode"] if not comps_fixed else "debug output", FIXED_NUM_BOT_NODES,
+                    FIXED_NUM_COMPETITOR_NODES if comps_fixed else 0))
+                sys.exit(1)
+
         # first build up ini file contents
         config = configparser.ConfigParser()
         config['main'] = {"samp_rate":args["samp_rate"],
@@ -89,7 +114,9 @@ def main():
                           "channel_gain_linear":args["channel_gain_linear"],
                           "usrp_ip_base":args["usrp_ip_base"],
                           "usrp_ip_prefix":args["usrp_ip_prefix"],
-                          "increment_usrp_address":True
+                          "increment_usrp_address":True,
+                          "num_bot_nodes":args["num_bot_nodes"],
+                          "num_competitor_nodes":args["num_competitor_nodes"],
                          }
 
         # now write out contents
@@ -109,7 +136,7 @@ def main():
 
         print("Starting envsim")
         print("running {}".format(" ".join(start_cmd)))
-        subprocess.run(start_cmd)
+        traced_run(start_cmd)
 
         sys.exit(0)
 if __name__ == "__main__":
@@ -0,0 +1,21 @@
+import hashlib
+
+
+# bytes read at a time while hashing, so big files are never held in memory all at once
+BUF_SIZE = 65536*16
+
+
+def file_sha256(file_name):
+    '''
+    Hash the contents of file_name, returning the hex digest
+    '''
+    sha256 = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        while True:
+            data = f.read(BUF_SIZE)
+            if not data:
+                break
+
+            sha256.update(data)
+
+    return sha256.hexdigest()
@@ -0,0 +1,88 @@
+import json
+import os
+import tempfile
+
+from file_hash import file_sha256
+
+
+# fingerprints of image files hashed before, keyed by absolute path. Kept out of the image
+# directory since that is usually a read only share
+FINGERPRINT_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "phase2-hurdle", "image_fingerprints.json")
+
+
+def load_fingerprint_cache(cache_file=FINGERPRINT_CACHE_FILE):
+    '''
+    Read the fingerprint cache, or start a new one if it is missing or unreadable
+    '''
+    try:
+        with open(cache_file, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_fingerprint_cache(cache, cache_file=FINGERPRINT_CACHE_FILE):
+    '''
+    Write the fingerprint cache out, replacing the old file in one step so a concurrent reader
+    never sees a partial file
+    '''
+    cache_dir = os.path.dirname(os.path.abspath(cache_file))
+    os.makedirs(cache_dir, exist_ok=True)
+
+    fd, temp_name = tempfile.mkstemp(dir=cache_dir, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(temp_name, cache_file)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def cached_fingerprint(image_file, cache_file=FINGERPRINT_CACHE_FILE):
+    '''
+    Get the fingerprint of image_file from the cache without hashing it. Returns None if it isn't
+    cached or the file's size or modification time changed since it was
+    '''
+    entry = load_fingerprint_cache(cache_file).get(os.path.abspath(image_file))
+    if entry is None:
+        return None
+
+    stat = os.stat(image_file)
+    if stat.st_size != entry.get("size") or stat.st_mtime_ns != entry.get("mtime_ns"):
+        return None
+
+    return entry.get("fingerprint")
+
+
+def record_fingerprint(image_file, fingerprint, cache_file=FINGERPRINT_CACHE_FILE):
+    '''
+    Remember the fingerprint of image_file, for example the one LXD reported after importing it.
+    Failing to write the cache only costs a rehash later, so errors are printed and ignored.
+    '''
+    stat = os.stat(image_file)
+
+    cache = load_fingerprint_cache(cache_file)
+    cache[os.path.abspath(image_file)] = {"size":stat.st_size,
+                                          "mtime_ns":stat.st_mtime_ns,
+                                          "fingerprint":fingerprint}
+    try:
+        save_fingerprint_cache(cache, cache_file)
+    except OSError as err:
+        print("Could not save image fingerprint cache {}: {}".format(cache_file, err))
+
+
+def image_fingerprint(image_file, cache_file=FINGERPRINT_CACHE_FILE):
+    '''
+    Get the fingerprint of image_file, only hashing it if the cache has no fingerprint for the
+    file as it is now
+    '''
+    fingerprint = cached_fingerprint(image_file, cache_file)
+    if fingerprint is None:
+        # the hash of a unified image tarball is its LXD fingerprint
+        fingerprint = file_sha256(image_file)
+        record_fingerprint(image_file, fingerprint, cache_file)
+
+    return fingerprint
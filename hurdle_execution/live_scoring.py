@@ -0,0 +1,189 @@
+import json
+import logging
+
+from mgen_parser import new_parse_stats
+from mgen_parser import parse_mgen_line
+from mgen_parser import record_malformed_line
+from parallel_exec import fan_out
+from run_trace import span
+from traffic_scoring import SeqNumSet
+from traffic_scoring import compute_score
+
+
+logger = logging.getLogger(__name__)
+
+# number of header lines at the top of every MGEN log
+MGEN_HEADER_LINES = 2
+
+# seconds to wait for every traffic generator to return what was appended to its log. Tails
+# that take longer are read again on the next update
+LIVE_SCORING_TIMEOUT = 5.0
+
+
+class MgenLogTail(object):
+    '''
+    Follow an MGEN log inside a running traffic generator container, given as a pylxd container,
+    keeping track of how much of the log has been read so far and which packets have been
+    received from each source
+    '''
+    def __init__(self, tgen_container, log_path):
+        self.tgen_container = tgen_container
+        self.tgen_name = tgen_container.name
+        self.log_path = log_path
+
+        # byte offset of the data we haven't read yet, and any incomplete trailing line
+        self.offset = 0
+        self.partial_line = b""
+        self.line_count = 0
+        self.parse_stats = new_parse_stats()
+
+        # keep track of destination IPs. There should be only one.
+        self.all_ip_dsts = set()
+
+        # sequence numbers received so far, indexed by source IP
+        self.received = {}
+
+    def read_new_data(self):
+        '''
+        Fetch everything appended to the log since the last read. This doesn't change any state,
+        so a read that is abandoned partway through is simply repeated on the next update.
+        '''
+        tail_cmd = ["tail", "-c", "+{}".format(self.offset+1), self.log_path]
+
+        with span("tail", category="lxd", container=self.tgen_name):
+            (retcode, stdout, stderr) = self.tgen_container.execute(tail_cmd)
+
+        # the log won't exist until MGEN has started up
+        if retcode != 0:
+            logger.debug("could not read %s from %s: %s", self.log_path, self.tgen_name, stderr)
+            return b""
+
+        # pylxd hands back text. MGEN logs are plain ASCII, so encoding it again gives back the
+        # bytes tail read and keeps the offset in step with the file
+        return stdout.encode("utf-8")
+
+    def update(self):
+        '''
+        Read and process any new complete lines in the log
+        '''
+        self.process_data(self.read_new_data())
+
+    def process_data(self, data):
+        '''
+        Process data read from the end of the log, as returned by read_new_data
+        '''
+        self.offset += len(data)
+
+        # hang on to the last line until MGEN finishes writing it
+        lines = (self.partial_line + data).split(b"\n")
+        self.partial_line = lines.pop()
+
+        for line in lines:
+            self.process_line(line.decode("ascii", errors="replace"))
+
+    def process_line(self, line):
+        '''
+        Record the packet described by a single line of the log
+        '''
+        self.line_count += 1
+
+        # first two lines are a header
+        if self.line_count <= MGEN_HEADER_LINES:
+            return
+
+        self.parse_stats["num_lines"] += 1
+
+        try:
+            record = parse_mgen_line(line)
+        except ValueError:
+            record_malformed_line(self.parse_stats, self.line_count-1, line)
+            logger.debug("skipping malformed line in %s: %s", self.tgen_name, line)
+            return
+
+        if record is None:
+            return
+
+        self.parse_stats["num_recv_lines"] += 1
+
+        self.all_ip_dsts.add(record.ip_dst.split("/")[0])
+
+        ip_src = record.ip_src.split("/")[0]
+        if ip_src not in self.received:
+            self.received[ip_src] = SeqNumSet()
+
+        # store off sequence numbers to prevent double counting
+        self.received[ip_src].add(record.seq_num, record.size)
+
+    def summary(self):
+        '''
+        Reduce the log to the same (destination IP, packets by source) form as
+        traffic_scoring.summarize_log
+        '''
+        if len(self.all_ip_dsts) > 1:
+            logger.warn("Found more than one destination IP: %s. MGEN logs may be corrupt",
+                        self.all_ip_dsts)
+
+        if len(self.all_ip_dsts) == 0:
+            return None, {}
+
+        ip_dst = sorted(self.all_ip_dsts)[-1]
+        return ip_dst, {ip_src:len(seq_nums) for ip_src, seq_nums in self.received.items()}
+
+
+class LiveScorer(object):
+    '''
+    Score bot and competitor traffic while it is still running by tailing the MGEN log in each
+    traffic generator, given as pylxd containers
+    '''
+    def __init__(self, bot_tgen_containers, comp_tgen_containers, log_path, timeout=LIVE_SCORING_TIMEOUT):
+        self.bot_tails = [MgenLogTail(container, log_path) for container in bot_tgen_containers]
+        self.comp_tails = [MgenLogTail(container, log_path) for container in comp_tgen_containers]
+        self.timeout = timeout
+
+    def update(self):
+        '''
+        Pull in anything new from every log, reading all the logs at the same time. Logs that
+        can't be read within the timeout are left where they were until the next update.
+        '''
+        results = fan_out(lambda tail: tail.read_new_data(), self.bot_tails + self.comp_tails,
+                          timeout=self.timeout)
+
+        for result in results:
+            if result.error is not None:
+                logger.warning("could not read %s from %s: %s", result.item.log_path,
+                               result.item.tgen_name, result.error)
+                continue
+
+            result.item.process_data(result.value)
+
+    def score(self, num_packets, json_log_name=None):
+        '''
+        Compute the score so far, in the same format as traffic_scoring.score_traffic, against
+        num_packets expected packets per network. Optionally save the results to json_log_name.
+        '''
+        total_score = compute_score([tail.summary() for tail in self.bot_tails],
+                                    [tail.summary() for tail in self.comp_tails],
+                                    num_packets,
+                                    log_results=False,
+                                    parse_stats={tail.tgen_name:tail.parse_stats
+                                                 for tail in self.bot_tails + self.comp_tails})
+
+        if json_log_name is not None:
+            with open(json_log_name, "w") as f:
+                json.dump(total_score, f)
+
+        return total_score
+
+    def packet_success_rates(self, total_score):
+        '''
+        Get the packet success rate of each network being tailed, indexed by "bots" or
+        "competitors"
+        '''
+        num_packets = float(total_score["input_packets_per_network"])
+
+        rates = {}
+        for network, tails in (("bots", self.bot_tails), ("competitors", self.comp_tails)):
+            if len(tails) > 0:
+                rates[network] = total_score[network]["total"]/num_packets
+
+        return rates
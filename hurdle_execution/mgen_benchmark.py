@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+
+import argparse
+import copy
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from mgen_cache import cached_mgen_columns
+from mgen_parser import MgenRecord
+from mgen_parser import iter_mgen_records
+from mgen_parser import mgen_columns
+from mgen_parser import mgen_parser
+from traffic_scoring import process_log
+
+# synthetic traffic starts shortly before midnight so the wrap correction gets exercised
+SYNTHETIC_START_SECS = 86000.0
+SYNTHETIC_LATENCY_SECS = 0.015
+SYNTHETIC_DST_IP = "192.168.101.2"
+SYNTHETIC_SRC_IP_PATTERN = "192.168.{}.2"
+
+
+def format_mgen_time(secs):
+    '''
+    Convert seconds since midnight into an MGEN HH:MM:SS.ffffff timestamp
+    '''
+    secs = secs % 86400
+    return "{:02d}:{:02d}:{:09.6f}".format(int(secs // 3600), int((secs % 3600) // 60), secs % 60)
+
+
+def write_synthetic_mgen_log(file_name, num_lines, num_sources=2, msg_rate=15.0, msg_size=200):
+    '''
+    Write out an MGEN log with num_lines RECV lines from num_sources periodic flows
+    '''
+    with open(file_name, "w") as f:
+        f.write("MGEN log version 5.02\n")
+        f.write("{} START Mgen Version 5.02c\n".format(format_mgen_time(SYNTHETIC_START_SECS)))
+
+        for i in range(num_lines):
+            source = i % num_sources
+            time_sent = SYNTHETIC_START_SECS + float(i)/(msg_rate*num_sources)
+
+            line_args = {"time_recv":format_mgen_time(time_sent + SYNTHETIC_LATENCY_SECS),
+                         "flow_num":source+1,
+                         "seq_num":i // num_sources,
+                         "src_ip":SYNTHETIC_SRC_IP_PATTERN.format(102+source),
+                         "src_port":5002+source,
+                         "dst_ip":SYNTHETIC_DST_IP,
+                         "time_sent":format_mgen_time(time_sent),
+                         "msg_size":msg_size}
+
+            f.write("{time_recv} RECV proto>UDP flow>{flow_num} seq>{seq_num} src>{src_ip}/{src_port} "
+                    "dst>{dst_ip}/5001 sent>{time_sent} size>{msg_size} "
+                    "gps>INVALID,999.000000,999.000000,-999\n".format(**line_args))
+
+
+def synthetic_records(num_packets, num_sources=2, duplicate_every=50):
+    '''
+    Generate MgenRecords for num_packets packets from num_sources flows without touching disk,
+    repeating every duplicate_every'th packet
+    '''
+    src_ips = [SYNTHETIC_SRC_IP_PATTERN.format(102+source) + "/5001" for source in range(num_sources)]
+    dst_ip = SYNTHETIC_DST_IP + "/5001"
+
+    for i in range(num_packets):
+        source = i % num_sources
+        record = MgenRecord(0.0, 0.0, source+1, i // num_sources, src_ips[source], dst_ip, 200)
+        yield record
+
+        if i % duplicate_every == 0:
+            yield record
+
+
+def process_log_dict(traffic_log):
+    '''
+    The original nested dict[src_ip][seq_num] = size scoring structure, followed by the deep
+    copy score_traffic used to make of it, kept here as a baseline
+    '''
+    scoring_log = {}
+    for mgen_entry in traffic_log:
+        ip_src = mgen_entry.ip_src.split("/")[0]
+        if ip_src not in scoring_log:
+            scoring_log[ip_src] = {}
+        scoring_log[ip_src][mgen_entry.seq_num] = mgen_entry.size
+
+    return None, copy.deepcopy(scoring_log)
+
+
+def time_call(func, *args):
+    '''
+    Call func with args and return the result along with the elapsed wall time in seconds
+    '''
+    start_time = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start_time
+
+
+def benchmark_parsers(file_name, num_lines, skip_legacy):
+    '''
+    Time each parse mode over the same log and print lines per second
+    '''
+    parsers = [("iter_mgen_records", lambda name: sum(1 for _ in iter_mgen_records(name))),
+               ("mgen_columns", lambda name: len(mgen_columns(name))),
+               ("cached (cold)", lambda name: len(cached_mgen_columns(name))),
+               ("cached (warm)", lambda name: len(cached_mgen_columns(name)))]
+
+    if not skip_legacy:
+        parsers.insert(0, ("mgen_parser", lambda name: len(mgen_parser(name))))
+
+    for parser_name, parse in parsers:
+        num_records, elapsed = time_call(parse, file_name)
+        print("{:<20} {:>10} records {:>8.2f} s {:>12.0f} lines/s".format(parser_name,
+                                                                        num_records,
+                                                                        elapsed,
+                                                                        num_lines/elapsed))
+
+
+def benchmark_scoring(num_packets, num_sources):
+    '''
+    Compare time and peak memory of the original dict based deduplication against process_log
+    '''
+    for method_name, process in [("dict + deepcopy", process_log_dict),
+                                 ("SeqNumSet", process_log)]:
+        (ip_dst, scoring_log), elapsed = time_call(process, synthetic_records(num_packets, num_sources))
+
+        # tracing allocations slows things down a lot, so measure memory in a separate pass
+        tracemalloc.start()
+        process(synthetic_records(num_packets, num_sources))
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        num_unique = sum(len(seq_nums) for seq_nums in scoring_log.values())
+        print("{:<16} {:>10} unique packets {:>8.2f} s {:>10.1f} MiB peak".format(method_name,
+                                                                              num_unique,
+                                                                              elapsed,
+                                                                              peak_bytes/2.0**20))
+
+
+def main():
+
+    # set up command line args
+    parser = argparse.ArgumentParser(prog="mgen_benchmark",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('--num-lines', type=int, default=2000000,
+                        help="Number of RECV lines in the synthetic MGEN log")
+
+    parser.add_argument('--num-sources', type=int, default=2,
+                        help="Number of flows feeding the synthetic destination")
+
+    parser.add_argument('--log-file', default=None,
+                        help="Benchmark against this MGEN log instead of generating a synthetic one")
+
+    subparsers = parser.add_subparsers(dest='action')
+
+    # subparser for "parse" action.
+    parser_parse = subparsers.add_parser('parse',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser_parse.add_argument('--skip-legacy', action="store_true", default=False,
+                              help="Don't time the original list-of-dicts mgen_parser")
+
+    # subparser for "score" action. Runs on generated records, so only the scoring data
+    # structures are measured
+    parser_score = subparsers.add_parser('score',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    # parse args and store to dictionary
+    args = vars(parser.parse_args())
+
+    if args["action"] == "score":
+        benchmark_scoring(args["num_lines"], args["num_sources"])
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        if args["log_file"] is None:
+            file_name = os.path.join(temp_dir, "synthetic_mgen_traffic_log.drc")
+            print("Writing synthetic MGEN log with {} lines to {}".format(args["num_lines"], file_name))
+            write_synthetic_mgen_log(file_name, args["num_lines"], args["num_sources"])
+            num_lines = args["num_lines"]
+        else:
+            # benchmark a copy so the parse cache is written to the temporary directory, not next
+            # to the log, and the cold pass never finds a cache left by an earlier run
+            file_name = os.path.join(temp_dir, os.path.basename(args["log_file"]))
+            shutil.copy(args["log_file"], file_name)
+            with open(file_name, "r") as f:
+                num_lines = sum(1 for _ in f)
+
+        if args["action"] == "parse":
+            benchmark_parsers(file_name, num_lines, args["skip_legacy"])
+        else:
+            parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from file_hash import file_sha256
+from mgen_parser import MGEN_RECORD_DTYPE
+from mgen_parser import parse_mgen_columns
+
+
+logger = logging.getLogger(__name__)
+
+# parsed columns are saved next to the log as <log>.columns.npy, keyed by <log>.columns.json
+CACHE_DATA_SUFFIX = ".columns.npy"
+CACHE_KEY_SUFFIX = ".columns.json"
+
+# bump this when the meaning of the cached columns changes without the dtype changing
+CACHE_FORMAT_VERSION = 3
+
+
+def cache_format():
+    '''
+    Describe the cached data layout so caches written by other versions are ignored
+    '''
+    return {"version":CACHE_FORMAT_VERSION, "dtype":str(MGEN_RECORD_DTYPE.descr)}
+
+
+def _write_atomically(file_name, write):
+    '''
+    Call write with a temporary file object in the same directory as file_name, then move it
+    into place so readers never see a partially written file
+    '''
+    fd, temp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)),
+                                     prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+
+def read_cache_key(filename):
+    '''
+    Load the key stored alongside the cached columns of filename, or None if there isn't one
+    '''
+    try:
+        with open(filename + CACHE_KEY_SUFFIX, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_is_valid(filename, cache_key):
+    '''
+    Check whether cache_key still describes filename. Size and modification time are checked
+    first. If only the modification time changed, for example because the log was copied, fall
+    back to comparing content hashes and refresh the stored modification time on a match.
+    '''
+    if cache_key is None or cache_key.get("format") != cache_format():
+        return False
+
+    stat = os.stat(filename)
+    if stat.st_size != cache_key["size"]:
+        return False
+
+    if stat.st_mtime_ns == cache_key["mtime_ns"]:
+        return True
+
+    if file_sha256(filename) != cache_key["sha256"]:
+        return False
+
+    cache_key["mtime_ns"] = stat.st_mtime_ns
+    try:
+        _write_atomically(filename + CACHE_KEY_SUFFIX,
+                          lambda f: f.write(json.dumps(cache_key).encode()))
+    except OSError as err:
+        logger.debug("could not refresh cache key for %s: %s", filename, err)
+
+    return True
+
+
+def write_cache(filename, stat, sha256, records, stats):
+    '''
+    Save parsed columns for filename next to it, along with the key used to validate them and
+    the parse statistics. stat and sha256 describe the file as it was when it was parsed.
+    '''
+    cache_key = {"format":cache_format(),
+                 "size":stat.st_size,
+                 "mtime_ns":stat.st_mtime_ns,
+                 "sha256":sha256,
+                 "parse_stats":stats}
+
+    # write data before the key so a key never points at missing or stale data
+    _write_atomically(filename + CACHE_DATA_SUFFIX, lambda f: np.save(f, records))
+    _write_atomically(filename + CACHE_KEY_SUFFIX,
+                      lambda f: f.write(json.dumps(cache_key).encode()))
+
+
+def cached_parse_mgen_columns(filename, use_cache=True):
+    '''
+    Same as mgen_parser.parse_mgen_columns, but reuses the parsed columns and statistics from a
+    previous call when the log at filename hasn't changed. Cached columns are memory mapped rather
+    than read, so loading them is close to free. The returned array is read-only when it comes
+    from the cache.
+    '''
+    cache_key = read_cache_key(filename) if use_cache else None
+    if use_cache and cache_is_valid(filename, cache_key):
+        try:
+            records = np.load(filename + CACHE_DATA_SUFFIX, mmap_mode="r")
+            if records.dtype == MGEN_RECORD_DTYPE:
+                logger.debug("loaded cached columns for %s", filename)
+                return records, cache_key["parse_stats"]
+        except (OSError, ValueError) as err:
+            logger.warning("could not load cached columns for %s: %s", filename, err)
+
+    if not use_cache:
+        return parse_mgen_columns(filename)
+
+    # hash the log as it is parsed rather than reading it again afterwards
+    stat = os.stat(filename)
+    file_hash = hashlib.sha256()
+    records, stats = parse_mgen_columns(filename, file_hash)
+
+    try:
+        write_cache(filename, stat, file_hash.hexdigest(), records, stats)
+    except OSError as err:
+        logger.warning("could not write cached columns for %s: %s", filename, err)
+
+    return records, stats
+
+
+def cached_mgen_columns(filename, use_cache=True):
+    '''
+    Same as cached_parse_mgen_columns, without the parse statistics
+    '''
+    return cached_parse_mgen_columns(filename, use_cache)[0]
@@ -1,4 +1,8 @@
+from collections import namedtuple
 from datetime import datetime, timedelta
+import gzip
+
+import numpy as np
 
 SECS_PER_DAY = 86400
 MIDNIGHT_WRAP_THRESHOLD_SECS = -600
@@ -6,14 +10,548 @@ MIDNIGHT_WRAP_THRESHOLD_SECS = -600
 import logging
 logger = logging.getLogger(__name__)
 
+# compact per-packet record yielded by iter_mgen_records. Times are seconds since midnight,
+# corrected for wrapping around midnight relative to the first packet in the file
+MgenRecord = namedtuple("MgenRecord", ["time_recv", "time_sent", "flowid", "seq_num",
+                                       "ip_src", "ip_dst", "size"])
+
+
+# number of malformed lines kept as examples in parse statistics
+MAX_MALFORMED_SAMPLES = 5
+
+# logs ending in this suffix were retrieved gzip compressed and are decompressed as they're read
+COMPRESSED_LOG_SUFFIX = ".gz"
+
+
+def open_mgen_log(filename, mode="r"):
+    '''
+    Open an mgen log for reading, decompressing it on the fly if it is gzip compressed
+    '''
+    if filename.endswith(COMPRESSED_LOG_SUFFIX):
+        return gzip.open(filename, "rt" if mode == "r" else mode)
+
+    return open(filename, mode)
+
+
+class _HashingReader(object):
+    '''
+    Binary file wrapper that feeds every byte read through it to file_hash
+    '''
+    def __init__(self, f, file_hash):
+        self._f = f
+        self._file_hash = file_hash
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self._file_hash.update(data)
+        return data
+
+
+def new_parse_stats():
+    '''
+    Create an empty parse statistics dictionary, filled in by the parsers below:
+
+    {"num_lines":1234,             # lines after the header
+     "num_recv_lines":1200,        # well formed RECV lines
+     "num_malformed_lines":2,      # RECV lines that couldn't be parsed and were skipped
+     "truncated_last_line":False,  # whether the log ends partway through a line
+     "malformed_samples":[[line number, line], ...]}
+    '''
+    return {"num_lines":0,
+            "num_recv_lines":0,
+            "num_malformed_lines":0,
+            "truncated_last_line":False,
+            "malformed_samples":[]}
+
+
+def record_malformed_line(stats, linecount, line):
+    '''
+    Count a malformed line in stats, keeping the first few as examples
+    '''
+    stats["num_malformed_lines"] += 1
+    if len(stats["malformed_samples"]) < MAX_MALFORMED_SAMPLES:
+        stats["malformed_samples"].append([linecount, line.rstrip("\n")])
+
+
+def log_parse_stats(filename, stats):
+    '''
+    Warn about any lines that had to be skipped while parsing filename
+    '''
+    if stats["num_malformed_lines"] > 0:
+        logger.warning("Skipped %i malformed RECV lines out of %i lines while parsing %s. First few: %s",
+                       stats["num_malformed_lines"], stats["num_lines"], filename,
+                       stats["malformed_samples"])
+
+    if stats["truncated_last_line"]:
+        logger.info("%s ends partway through a line, MGEN was probably stopped mid write", filename)
+
+
+def parse_mgen_time(word):
+    '''
+    Convert an MGEN HH:MM:SS.ffffff timestamp into seconds since midnight
+    '''
+    hours, minutes, seconds = word.split(":")
+    return int(hours)*3600 + int(minutes)*60 + float(seconds)
+
+
+def parse_mgen_line(line):
+    '''
+    Parse a single line of an MGEN log. Returns an MgenRecord for RECV lines, with times that
+    have not been corrected for wrapping around midnight, or None for any other line. Raises
+    ValueError if a RECV line is malformed.
+    '''
+
+    # If this line isn't a "RECV" line don't bother processing
+    if(line.find("RECV") == -1): return None
+
+    try:
+        # 0: Receive Time, 3: Flow ID, 4: Packet Seq Num, 5: Source IP,
+        # 6: Destination IP, 7: Time the packet was sent, 8: Size of the packet
+        words = line.split()
+        time_recv = parse_mgen_time(words[0])
+        flow_id = int(words[3].split(">")[1])
+        seq_num = int(words[4].split(">")[1])
+        ip_src = words[5].split(">")[1]
+        ip_dst = words[6].split(">")[1]
+        time_sent = parse_mgen_time(words[7].split(">")[1])
+        size = int(words[8].split(">")[1])
+
+    except IndexError as err:
+        raise ValueError("RECV line is missing fields: {}".format(err))
+
+    # reject the same values mgen_columns can't store
+    for name, value in (("flowid", flow_id), ("seq_num", seq_num), ("size", size)):
+        if value < 0 or value > MAX_FIELD_VALUES[name]:
+            raise ValueError("RECV line {} out of range: {}".format(name, value))
+
+    return MgenRecord(time_recv, time_sent, flow_id, seq_num, ip_src, ip_dst, size)
+
+
+def iter_mgen_records(filename, stats=None):
+    '''
+    Lazily parse the mgen file found at filename, yielding one MgenRecord per RECV line.
+
+    Only the current line is held in memory, so this can be used to process arbitrarily large
+    logs in constant memory. Malformed RECV lines are skipped. Pass a dictionary from
+    new_parse_stats as stats to have it filled in as the log is read.
+    '''
+    t0 = None
+
+    if stats is None:
+        stats = new_parse_stats()
+
+    with open_mgen_log(filename, "r") as f:
+
+        logger.debug("streaming mgen file: %s", filename)
+        for (linecount,line) in enumerate(f):
+
+            # first two lines are a header
+            if(linecount < 2): continue
+
+            stats["num_lines"] += 1
+            stats["truncated_last_line"] = not line.endswith("\n")
+
+            try:
+                record = parse_mgen_line(line)
+            except ValueError:
+                logger.debug("skipping malformed line number %i: %s", linecount, line)
+                record_malformed_line(stats, linecount, line)
+                continue
+
+            if record is None: continue
+
+            stats["num_recv_lines"] += 1
+
+            # Correct for time wrapping around midnight
+            if t0 is None: t0 = record.time_sent
+            if record.time_recv-t0 < MIDNIGHT_WRAP_THRESHOLD_SECS:
+                record = record._replace(time_recv=record.time_recv+SECS_PER_DAY)
+            if record.time_sent-t0 < MIDNIGHT_WRAP_THRESHOLD_SECS:
+                record = record._replace(time_sent=record.time_sent+SECS_PER_DAY)
+
+            yield record
+
+    log_parse_stats(filename, stats)
+
+
+# columnar layout returned by mgen_columns. Times are integer nanoseconds since midnight and
+# IPv4 addresses are packed into a single big endian uint32 with the port stripped off
+MGEN_RECORD_DTYPE = np.dtype([("time_recv", np.int64),
+                              ("time_sent", np.int64),
+                              ("flowid", np.int32),
+                              ("seq_num", np.uint32),
+                              ("ip_src", np.uint32),
+                              ("ip_dst", np.uint32),
+                              ("size", np.int32)])
+
+# largest value each integer field of MGEN_RECORD_DTYPE can hold. RECV lines with bigger values
+# are treated as malformed rather than wrapping around
+MAX_FIELD_VALUES = {name:int(np.iinfo(MGEN_RECORD_DTYPE[name]).max) for name in ("flowid", "seq_num", "size")}
+
+NS_PER_SEC = 1000000000
+
+# MGEN writes timestamps as fixed width HH:MM:SS.ffffff
+MGEN_TIME_WIDTH = 15
+
+# RECV lines start with "<timestamp> RECV " and then have space separated tokens in this order
+RECV_MARKER = b"RECV"
+RECV_FIELD_PREFIXES = [b"proto>", b"flow>", b"seq>", b"src>", b"dst>", b"sent>", b"size>"]
+RECV_TOKEN_COUNT = len(RECV_FIELD_PREFIXES) + 2
+
+# longest field values we expect, used to bound the vectorized digit loops
+MAX_INT_DIGITS = 10
+MAX_ADDRESS_CHARS = len("255.255.255.255/65535")
+
+# number of bytes of the log mgen_columns reads and tokenizes at a time, rounded down to whole
+# lines. Keeps memory use bounded no matter how big the log is
+PARSE_CHUNK_BYTES = 4*1024*1024
+
+ASCII_ZERO = ord("0")
+ASCII_DOT = ord(".")
+ASCII_SLASH = ord("/")
+ASCII_COLON = ord(":")
+ASCII_SPACE = ord(" ")
+ASCII_NEWLINE = ord("\n")
+ASCII_CARRIAGE_RETURN = ord("\r")
+
+
+def format_packed_ip(packed_ip):
+    '''
+    Convert an IPv4 address packed into an integer by mgen_columns back to dotted quad form
+    '''
+    packed_ip = int(packed_ip)
+    return "{}.{}.{}.{}".format((packed_ip >> 24) & 0xFF, (packed_ip >> 16) & 0xFF,
+                                (packed_ip >> 8) & 0xFF, packed_ip & 0xFF)
+
+
+def _token_windows(buf, starts, width):
+    '''
+    Copy the width bytes starting at each position in starts out of buf into an (N, width) array.
+    Each row is a contiguous copy, which is far cheaper than gathering bytes one at a time.
+    buf must be padded with at least width trailing bytes. Starts past the end of the buffer, which
+    only come from truncated lines, are clamped and should be masked off by the caller.
+    '''
+    windows = np.lib.stride_tricks.sliding_window_view(buf, width)
+    return windows[np.minimum(starts, len(windows)-1)]
+
+
+def _match_prefix(buf, starts, lengths, prefix):
+    '''
+    Check which tokens of the given lengths starting at starts begin with the byte string prefix
+    '''
+    window = _token_windows(buf, starts, len(prefix))
+    expected = np.frombuffer(prefix, dtype=np.uint8)
+    return (lengths > len(prefix)) & (window == expected).all(axis=1)
+
+
+def _parse_uint_window(window, lengths):
+    '''
+    Parse the decimal integers at the start of each row of window, one digit position at a time
+    across every row. Returns the values and a mask of which rows were well formed.
+    '''
+    values = np.zeros(len(window), dtype=np.int64)
+    valid = (lengths > 0) & (lengths <= window.shape[1])
+
+    for offset in range(window.shape[1]):
+        active = offset < lengths
+        digits = window[:, offset].astype(np.int64) - ASCII_ZERO
+        valid &= ~active | ((digits >= 0) & (digits <= 9))
+        values = np.where(active, values*10 + digits, values)
+
+    return values, valid
+
+
+def _parse_uint_tokens(buf, starts, lengths, max_value):
+    '''
+    Parse the decimal integer tokens of the given lengths starting at starts in buf. Tokens with
+    values above max_value are marked as malformed.
+    '''
+    values, valid = _parse_uint_window(_token_windows(buf, starts, MAX_INT_DIGITS), lengths)
+    return values, valid & (values <= max_value)
+
+
+def _parse_time_tokens(buf, starts, lengths):
+    '''
+    Parse the fixed width HH:MM:SS.ffffff timestamp tokens starting at starts in buf into
+    nanoseconds since midnight. Returns the values and a mask of which tokens were well formed.
+    '''
+    window = _token_windows(buf, starts, MGEN_TIME_WIDTH)
+    num_tokens = len(starts)
+
+    valid = lengths == MGEN_TIME_WIDTH
+    valid &= window[:, 2] == ASCII_COLON
+    valid &= window[:, 5] == ASCII_COLON
+    valid &= window[:, 8] == ASCII_DOT
+
+    hours, hours_valid = _parse_uint_window(window[:, 0:2], np.full(num_tokens, 2))
+    minutes, minutes_valid = _parse_uint_window(window[:, 3:5], np.full(num_tokens, 2))
+    seconds, seconds_valid = _parse_uint_window(window[:, 6:8], np.full(num_tokens, 2))
+    micros, micros_valid = _parse_uint_window(window[:, 9:], np.full(num_tokens, 6))
+    valid &= hours_valid & minutes_valid & seconds_valid & micros_valid
+
+    return (hours*3600 + minutes*60 + seconds)*NS_PER_SEC + micros*1000, valid
+
+
+def _parse_address_tokens(buf, starts, lengths):
+    '''
+    Parse the a.b.c.d/port address tokens starting at starts in buf into packed uint32 IPv4
+    addresses, ignoring the port. Returns the values and a mask of which tokens were well formed.
+    '''
+    window = _token_windows(buf, starts, MAX_ADDRESS_CHARS)
+    num_tokens = len(starts)
+
+    packed = np.zeros(num_tokens, dtype=np.int64)
+    octet = np.zeros(num_tokens, dtype=np.int64)
+    num_dots = np.zeros(num_tokens, dtype=np.int64)
+    done = np.zeros(num_tokens, dtype=bool)
+    valid = (lengths > 0) & (lengths <= MAX_ADDRESS_CHARS)
+
+    for offset in range(MAX_ADDRESS_CHARS):
+        active = (offset < lengths) & ~done
+        chars = window[:, offset].astype(np.int64)
+        is_digit = (chars >= ASCII_ZERO) & (chars <= ASCII_ZERO+9)
+        is_dot = chars == ASCII_DOT
+        is_slash = chars == ASCII_SLASH
+        valid &= ~active | is_digit | is_dot | is_slash
+
+        # shift each completed octet into the packed address
+        octet = np.where(active & is_digit, octet*10 + chars - ASCII_ZERO, octet)
+        packed = np.where(active & (is_dot | is_slash), (packed << 8) | octet, packed)
+        octet = np.where(active & is_dot, 0, octet)
+        num_dots += active & is_dot
+        done |= active & is_slash
+
+    # addresses without a port end at the end of the token
+    packed = np.where(done, packed, (packed << 8) | octet)
+    valid &= (num_dots == 3) & (packed <= 0xFFFFFFFF)
+
+    return packed, valid
+
+
+def _parse_recv_lines(buf, spaces, line_starts, line_ends):
+    '''
+    Tokenize and parse the RECV lines spanning [line_starts, line_ends) in buf. spaces holds the
+    position of every space within those lines, followed by a sentinel past the last line.
+    Returns a structured array with MGEN_RECORD_DTYPE holding only the well formed lines, along
+    with a boolean array marking which of the lines were well formed.
+    '''
+    # every token up to and including size is terminated by a space, except size itself which
+    # may be the last thing on the line
+    first_space = np.searchsorted(spaces, line_starts)
+    space_index = first_space[:, None] + np.arange(RECV_TOKEN_COUNT)
+    token_ends = spaces[np.minimum(space_index, len(spaces)-1)]
+    token_ends = np.minimum(token_ends, line_ends[:, None])
+    token_starts = np.concatenate((line_starts[:, None], token_ends[:, :-1]+1), axis=1)
+
+    # truncated lines run out of tokens before the end of the line
+    valid = token_starts[:, -1] < line_ends
+    for i, prefix in enumerate(RECV_FIELD_PREFIXES):
+        valid &= _match_prefix(buf, token_starts[:, i+2], token_ends[:, i+2]-token_starts[:, i+2],
+                               prefix)
+
+    def field(i):
+        # start and length of the value of the i'th token, after its key> prefix
+        prefix_len = len(RECV_FIELD_PREFIXES[i-2]) if i >= 2 else 0
+        return buf, token_starts[:, i]+prefix_len, token_ends[:, i]-token_starts[:, i]-prefix_len
+
+    time_recv, time_recv_valid = _parse_time_tokens(*field(0))
+    flowid, flowid_valid = _parse_uint_tokens(*field(3), max_value=MAX_FIELD_VALUES["flowid"])
+    seq_num, seq_num_valid = _parse_uint_tokens(*field(4), max_value=MAX_FIELD_VALUES["seq_num"])
+    ip_src, ip_src_valid = _parse_address_tokens(*field(5))
+    ip_dst, ip_dst_valid = _parse_address_tokens(*field(6))
+    time_sent, time_sent_valid = _parse_time_tokens(*field(7))
+    size, size_valid = _parse_uint_tokens(*field(8), max_value=MAX_FIELD_VALUES["size"])
+
+    valid &= (time_recv_valid & flowid_valid & seq_num_valid & ip_src_valid & ip_dst_valid &
+              time_sent_valid & size_valid)
+
+    records = np.zeros(np.count_nonzero(valid), dtype=MGEN_RECORD_DTYPE)
+    records["time_recv"] = time_recv[valid]
+    records["time_sent"] = time_sent[valid]
+    records["flowid"] = flowid[valid]
+    records["seq_num"] = seq_num[valid]
+    records["ip_src"] = ip_src[valid]
+    records["ip_dst"] = ip_dst[valid]
+    records["size"] = size[valid]
+
+    return records, valid
+
+
+def _find_marker_lines(buf, line_starts, line_ends, marker):
+    '''
+    Find which of the lines spanning [line_starts, line_ends) in buf contain marker anywhere
+    '''
+    if len(line_starts) == 0:
+        return np.zeros(0, dtype=bool)
+
+    # compare each byte of the marker against the buffer shifted by its offset
+    found = buf[:len(buf)-len(marker)+1] == marker[0]
+    for i in range(1, len(marker)):
+        found &= buf[i:len(buf)-len(marker)+1+i] == marker[i]
+
+    # line containing each occurrence
+    positions = np.flatnonzero(found)
+    line_index = np.searchsorted(line_starts, positions, side="right") - 1
+    in_line = (line_index >= 0) & (positions + len(marker) <= line_ends[np.maximum(line_index, 0)])
+
+    has_marker = np.zeros(len(line_starts), dtype=bool)
+    has_marker[line_index[in_line]] = True
+    return has_marker
+
+
+def _parse_mgen_block(contents, first_line_number, stats):
+    '''
+    Parse the lines in the bytes block contents, whose first line is line number
+    first_line_number of the log. Every line but the last must end with a newline. Adds to the
+    line counts and malformed line samples in stats, and returns a structured array with
+    MGEN_RECORD_DTYPE holding the well formed RECV lines, along with the number of lines in the
+    block.
+    '''
+    # pad the end of the buffer so fixed width token windows never run off the end
+    buf = np.frombuffer(contents + b"\n"*MAX_ADDRESS_CHARS, dtype=np.uint8)
+
+    # find the first and one-past-last byte of every line
+    newlines = np.flatnonzero(buf[:len(contents)] == ASCII_NEWLINE)
+    block_line_starts = line_starts = np.concatenate(([0], newlines+1))
+    block_line_ends = line_ends = np.concatenate((newlines, [len(contents)]))
+
+    # leave the \r of CRLF line endings out of the line, as reading the log in text mode does
+    line_ends -= (line_ends > line_starts) & (buf[np.maximum(line_ends-1, 0)] == ASCII_CARRIAGE_RETURN)
+
+    # a trailing newline leaves an empty last "line"
+    if contents.endswith(b"\n"):
+        line_starts = line_starts[:-1]
+        line_ends = line_ends[:-1]
+    num_block_lines = len(line_starts)
+
+    # first two lines of the log are a header
+    num_header_lines = max(0, min(2 - first_line_number, num_block_lines))
+    line_starts = line_starts[num_header_lines:]
+    line_ends = line_ends[num_header_lines:]
+    line_numbers = np.arange(first_line_number+num_header_lines, first_line_number+num_block_lines)
+    stats["num_lines"] += len(line_starts)
+
+    # RECV lines have the RECV marker right after the receive timestamp. Lines that mention RECV
+    # anywhere else are RECV lines with a mangled timestamp.
+    marker_starts = line_starts+MGEN_TIME_WIDTH+1
+    is_recv = _match_prefix(buf, marker_starts, line_ends-marker_starts, RECV_MARKER+b" ")
+    malformed_lines = [line_numbers[~is_recv & _find_marker_lines(buf, line_starts, line_ends, RECV_MARKER)]]
+
+    line_starts = line_starts[is_recv]
+    line_ends = line_ends[is_recv]
+    line_numbers = line_numbers[is_recv]
+
+    if len(line_starts) > 0:
+        spaces = np.flatnonzero(buf[line_starts[0]:line_ends[-1]] == ASCII_SPACE) + line_starts[0]
+        spaces = np.append(spaces, len(contents))
+
+        records, valid = _parse_recv_lines(buf, spaces, line_starts, line_ends)
+        malformed_lines.append(line_numbers[~valid])
+    else:
+        records = np.zeros(0, dtype=MGEN_RECORD_DTYPE)
+
+    # only decode the handful of malformed lines kept as examples
+    malformed_lines = np.sort(np.concatenate(malformed_lines))
+    stats["num_malformed_lines"] += len(malformed_lines)
+    num_samples = max(0, MAX_MALFORMED_SAMPLES - len(stats["malformed_samples"]))
+    for linecount in malformed_lines[:num_samples]:
+        i = linecount - first_line_number
+        line = contents[block_line_starts[i]:block_line_ends[i]]
+        stats["malformed_samples"].append([int(linecount), line.decode("ascii", errors="replace")])
+
+    return records, num_block_lines
+
+
+def parse_mgen_columns(filename, file_hash=None):
+    '''
+    Parse the mgen file found at filename in bulk, returning a NumPy structured array with
+    MGEN_RECORD_DTYPE and one row per well formed RECV line, along with parse statistics in the
+    form returned by new_parse_stats.
+
+    The file is read PARSE_CHUNK_BYTES of whole lines at a time, and each block is tokenized with
+    array operations over the raw bytes, so no per-line Python code runs and memory use beyond the
+    returned records stays bounded. Malformed and truncated RECV lines are skipped rather than
+    failing the whole parse. Timestamps are corrected for wrapping around midnight the same way
+    iter_mgen_records does.
+
+    If file_hash is given, for example a hashlib.sha256 object, it is updated with the raw bytes
+    of the file as they are read, before any decompression, so the log can be hashed without
+    reading it a second time.
+    '''
+    logger.debug("bulk parsing mgen file: %s", filename)
+
+    stats = new_parse_stats()
+    chunks = []
+
+    # number of lines parsed so far, which is the line number of the next block's first line
+    num_lines = 0
+
+    # carry the partial line at the end of each read over to the next block
+    remainder = b""
+    with open(filename, "rb") as raw_file:
+        f = raw_file if file_hash is None else _HashingReader(raw_file, file_hash)
+        if filename.endswith(COMPRESSED_LOG_SUFFIX):
+            f = gzip.GzipFile(fileobj=f, mode="rb")
+
+        while True:
+            data = f.read(PARSE_CHUNK_BYTES)
+            if not data:
+                break
+
+            data = remainder + data
+            block_end = data.rfind(b"\n") + 1
+            remainder = data[block_end:]
+            if block_end == 0:
+                continue
+
+            chunk, num_block_lines = _parse_mgen_block(data[:block_end], num_lines, stats)
+            chunks.append(chunk)
+            num_lines += num_block_lines
+
+    # a log that doesn't end with a newline was cut short partway through its last line
+    if len(remainder) > 0:
+        stats["truncated_last_line"] = num_lines >= 2
+        chunk, num_block_lines = _parse_mgen_block(remainder, num_lines, stats)
+        chunks.append(chunk)
+
+    records = np.concatenate(chunks) if chunks else np.zeros(0, dtype=MGEN_RECORD_DTYPE)
+    stats["num_recv_lines"] = len(records)
+
+    log_parse_stats(filename, stats)
+
+    if len(records) == 0:
+        return records, stats
+
+    # Correct for time wrapping around midnight
+    t0 = records["time_sent"][0]
+    wrap_threshold_ns = MIDNIGHT_WRAP_THRESHOLD_SECS*NS_PER_SEC
+    for field_name in ("time_recv", "time_sent"):
+        wrapped = (records[field_name] - t0) < wrap_threshold_ns
+        records[field_name][wrapped] += SECS_PER_DAY*NS_PER_SEC
+
+    return records, stats
+
+
+def mgen_columns(filename):
+    '''
+    Same as parse_mgen_columns, without the parse statistics
+    '''
+    return parse_mgen_columns(filename)[0]
+
 
 # Parse the mgen file found at filename
-def mgen_parser(filename):
+def mgen_parser(filename, stats=None):
 
     mgenfile = []
 
+    # send time of the first packet, used to detect wrapping around midnight
+    t0 = None
+
+    if stats is None:
+        stats = new_parse_stats()
+
     # Open the MGEN File and read and parse each line
-    with open(filename, "r") as f:
+    with open_mgen_log(filename, "r") as f:
 
         logger.debug("parsing mgen file: %s", filename)
         for (linecount,line) in enumerate(f):
@@ -21,6 +559,9 @@ def mgen_parser(filename):
                 # first two lines are a header
                 if(linecount < 2): continue
 
+                stats["num_lines"] += 1
+                stats["truncated_last_line"] = not line.endswith("\n")
+
                 # If this line isn't a "RECV" line don't bother processing
                 if(line.find("RECV") == -1): continue
 
@@ -60,29 +601,33 @@ def mgen_parser(filename):
                     elif (i==8):
                         size =  word.split(">")[1]
 
+                # a RECV line cut short won't have made it to every field
+                if len(words) < RECV_TOKEN_COUNT:
+                    raise ValueError("RECV line is missing fields")
+
                 # Correct for time wrapping around midnight
-                if 't0' not in locals(): t0 = time_sent
+                if t0 is None: t0 = time_sent
                 if (time_recv-t0).total_seconds() < MIDNIGHT_WRAP_THRESHOLD_SECS:
                     time_recv += timedelta(0,SECS_PER_DAY)
                 if (time_sent-t0).total_seconds() < MIDNIGHT_WRAP_THRESHOLD_SECS:
                     time_sent += timedelta(0,SECS_PER_DAY)
 
                 # Add this entry to the file
-                #  the time_sent check is basically a check for an empty file, then this variable won't exist
-                if "time_sent" in locals() or "time_sent" in globals():
-                    mgen_entry = {"time_recv":time_recv,
-                                  "time_sent":time_sent,
-                                  "flowid":flow_id,
-                                  "seq_num":seq_num,
-                                  "ip_src":ip_src,
-                                  "ip_dst":ip_dst,
-                                  "size":size}
-
-                    mgenfile.append(mgen_entry)
-
-            except ValueError as err:
-                logger.error("Error parsing line number %i: %s", linecount, line)
-                raise err
+                mgen_entry = {"time_recv":time_recv,
+                              "time_sent":time_sent,
+                              "flowid":flow_id,
+                              "seq_num":seq_num,
+                              "ip_src":ip_src,
+                              "ip_dst":ip_dst,
+                              "size":size}
+
+                mgenfile.append(mgen_entry)
+                stats["num_recv_lines"] += 1
+
+            except (ValueError, IndexError):
+                logger.debug("skipping malformed line number %i: %s", linecount, line)
+                record_malformed_line(stats, linecount, line)
 
+    log_parse_stats(filename, stats)
 
     return mgenfile
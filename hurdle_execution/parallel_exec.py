@@ -0,0 +1,104 @@
+from collections import namedtuple
+import logging
+import math
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# outcome of calling a function on one item. value is None if the call raised, in which case
+# error holds the exception. start_time is when the call was made and elapsed is its wall time
+# in seconds.
+CallResult = namedtuple("CallResult", ["item", "value", "error", "start_time", "elapsed"])
+
+
+def fan_out(func, items, timeout=None, max_workers=None):
+    '''
+    Call func on every item in items at the same time, one thread per item, and return a list
+    of CallResults in the same order as items. If max_workers is set, at most that many calls
+    run at once and the rest wait their turn.
+
+    Calls still running after timeout seconds are reported with a TimeoutError and abandoned.
+    They run in daemon threads, so one hung container can't hold up the rest of the run or
+    stop the script from exiting.
+    '''
+    items = list(items)
+    results = [None]*len(items)
+    slots = threading.BoundedSemaphore(max_workers) if max_workers is not None else None
+
+    def timed_call(i, item):
+        if slots is not None:
+            slots.acquire()
+        start_time = time.time()
+        try:
+            results[i] = CallResult(item, func(item), None, start_time, time.time() - start_time)
+        except Exception as err:
+            results[i] = CallResult(item, None, err, start_time, time.time() - start_time)
+        finally:
+            if slots is not None:
+                slots.release()
+
+    threads = [threading.Thread(target=timed_call, args=(i, item), daemon=True)
+               for i, item in enumerate(items)]
+    for thread in threads:
+        thread.start()
+
+    # wait for every call, sharing one deadline across all of them
+    start_time = time.time()
+    for thread in threads:
+        if timeout is None:
+            thread.join()
+        else:
+            thread.join(max(0.0, timeout - (time.time() - start_time)))
+
+    # copy the results so abandoned calls finishing late can't change what was returned
+    results = list(results)
+    for i, item in enumerate(items):
+        if results[i] is None:
+            err = TimeoutError("call did not finish within {:.1f} seconds".format(timeout))
+            results[i] = CallResult(item, None, err, start_time, time.time() - start_time)
+            logger.debug("abandoning call on %s: %s", item, err)
+
+    return results
+
+
+def start_skew(results):
+    '''
+    Seconds between the first and last call in a list of CallResults being made
+    '''
+    start_times = [result.start_time for result in results]
+    return max(start_times) - min(start_times) if len(start_times) > 0 else 0.0
+
+
+class PeriodicThread(threading.Thread):
+    '''
+    Daemon thread calling func every interval seconds until stop is called. Calls are scheduled
+    against the time the thread started, so time spent in func doesn't make later calls drift.
+    A call that overruns its slot skips the slots it missed instead of queueing up extra calls.
+    '''
+    def __init__(self, func, interval, name=None):
+        super(PeriodicThread, self).__init__(name=name, daemon=True)
+        self.func = func
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def run(self):
+        next_time = time.time()
+        while not self.stop_event.is_set():
+            try:
+                self.func()
+            except Exception:
+                logger.exception("periodic call to %s failed", self.name)
+
+            # move on to the next slot that hasn't passed yet
+            now = time.time()
+            next_time += self.interval*max(1, math.ceil((now - next_time)/self.interval))
+            self.stop_event.wait(next_time - now)
+
+    def stop(self, timeout=None):
+        '''
+        Stop calling func, waiting up to timeout seconds for a call in progress to finish
+        '''
+        self.stop_event.set()
+        self.join(timeout)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+import csv
+import json
+import logging
+import os
+
+from constants import BOOTUP_SLOP_TIME
+from constants import COMPETITOR_NAME_BASE
+from constants import PACKET_SUCCESS_THRESHOLD
+from constants import RESULT_FILENAME
+from mgen_parser import COMPRESSED_LOG_SUFFIX
+from traffic_scoring import compute_score
+from traffic_scoring import expected_packets_per_network
+from traffic_scoring import packet_success_rate
+from traffic_scoring import summarize_log
+
+
+FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+logging.basicConfig(format=FORMAT, level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# run_hurdle.retrieve_traffic_logs saves logs as <container name>_mgen_traffic_log.drc, with
+# COMPRESSED_LOG_SUFFIX added when run with --compress-logs
+TRAFFIC_LOG_SUFFIX = "_mgen_traffic_log.drc"
+TRAFFIC_LOG_SUFFIXES = (TRAFFIC_LOG_SUFFIX, TRAFFIC_LOG_SUFFIX + COMPRESSED_LOG_SUFFIX)
+
+CSV_FIELDS = ["run", "num_packets",
+              "bot_packets", "bot_success_rate", "bot_pass",
+              "competitor_packets", "competitor_success_rate", "competitor_pass",
+              "num_malformed_lines", "error"]
+
+
+def find_runs(archive_dirs):
+    '''
+    Walk archive_dirs looking for traffic logs. Every directory holding at least one log is
+    treated as one run. If a node's log was saved both compressed and uncompressed, only the
+    uncompressed one is used. Returns a dict of {run directory: (bot logs, competitor logs)}
+    '''
+    runs = {}
+    for archive_dir in archive_dirs:
+        for dir_path, dir_names, file_names in os.walk(archive_dir):
+            dir_names.sort()
+
+            # one log per node, keyed by its uncompressed name
+            logs_by_node = {}
+            for name in file_names:
+                if not name.endswith(TRAFFIC_LOG_SUFFIXES):
+                    continue
+
+                compressed = name.endswith(COMPRESSED_LOG_SUFFIX)
+                node_log = name[:-len(COMPRESSED_LOG_SUFFIX)] if compressed else name
+                if node_log not in logs_by_node or not compressed:
+                    logs_by_node[node_log] = name
+
+            log_names = sorted(logs_by_node.values())
+            if len(log_names) == 0:
+                continue
+
+            bot_logfiles = [os.path.join(dir_path, name) for name in log_names
+                            if not name.startswith(COMPETITOR_NAME_BASE)]
+            comp_logfiles = [os.path.join(dir_path, name) for name in log_names
+                             if name.startswith(COMPETITOR_NAME_BASE)]
+
+            runs[dir_path] = (bot_logfiles, comp_logfiles)
+
+    return runs
+
+
+def archived_num_packets(run_dir):
+    '''
+    Get the expected number of packets per network from the results saved by the original run,
+    or None if there aren't any
+    '''
+    try:
+        with open(os.path.join(run_dir, RESULT_FILENAME), "r") as f:
+            return json.load(f)["input_packets_per_network"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def score_runs(runs, default_num_packets, use_cache=True, num_workers=None):
+    '''
+    Summarize every log of every run in one pool of worker processes, then score each run.
+    Returns a dict of {run directory: total score}, in the format written by
+    traffic_scoring.score_traffic. Runs with a log that couldn't be summarized, for example a
+    truncated .gz file, get {"failed_logs":{log file:error message}} instead of a score, and
+    the rest of the runs are still scored.
+    '''
+    logfiles = []
+    for bot_logfiles, comp_logfiles in runs.values():
+        logfiles.extend(bot_logfiles + comp_logfiles)
+
+    summaries = {}
+    errors = {}
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(summarize_log, logfile, use_cache):logfile for logfile in logfiles}
+        for future in as_completed(futures):
+            logfile = futures[future]
+            try:
+                summaries[logfile] = future.result()
+            except Exception as err:
+                logger.error("Could not summarize %s: %s", logfile, err)
+                errors[logfile] = "{}: {}".format(type(err).__name__, err)
+
+    parse_stats = {logfile:stats for logfile, (_, _, stats) in summaries.items()}
+    summaries = {logfile:(dst_ip, packets_by_source)
+                 for logfile, (dst_ip, packets_by_source, _) in summaries.items()}
+
+    scores = {}
+    for run_dir, (bot_logfiles, comp_logfiles) in runs.items():
+        failed_logs = {name:errors[name] for name in bot_logfiles + comp_logfiles if name in errors}
+        if len(failed_logs) > 0:
+            scores[run_dir] = {"failed_logs":failed_logs}
+            continue
+
+        num_packets = archived_num_packets(run_dir)
+        if num_packets is None:
+            num_packets = default_num_packets
+
+        if num_packets is None:
+            logger.warning("No %s in %s and no packet rate given, skipping run",
+                           RESULT_FILENAME, run_dir)
+            continue
+
+        scores[run_dir] = compute_score([summaries[name] for name in bot_logfiles],
+                                        [summaries[name] for name in comp_logfiles],
+                                        num_packets,
+                                        log_results=False,
+                                        parse_stats={name:parse_stats[name]
+                                                     for name in bot_logfiles + comp_logfiles})
+
+    return scores
+
+
+def score_table_row(run_dir, total_score):
+    '''
+    Flatten the total score of a run into a single row of the CSV table. Success rates and
+    pass/fail are left empty for runs that weren't expected to send any packets. Runs that
+    couldn't be scored only fill in the error column.
+    '''
+    if "failed_logs" in total_score:
+        return {"run":run_dir,
+                "error":"; ".join("{}: {}".format(os.path.basename(name), err)
+                                  for name, err in sorted(total_score["failed_logs"].items()))}
+
+    num_packets = total_score["input_packets_per_network"]
+    row = {"run":run_dir, "num_packets":num_packets}
+
+    for network, label in (("bots", "bot"), ("competitors", "competitor")):
+        row[label + "_packets"] = total_score[network]["total"]
+
+        success_rate = packet_success_rate(total_score[network]["total"], num_packets)
+        row[label + "_success_rate"] = success_rate
+        row[label + "_pass"] = success_rate >= PACKET_SUCCESS_THRESHOLD if success_rate is not None else None
+
+    row["num_malformed_lines"] = sum(stats["num_malformed_lines"]
+                                     for stats in total_score.get("parse_stats", {}).values())
+
+    return row
+
+
+def main():
+
+    # set up command line args
+    parser = argparse.ArgumentParser(prog="rescore",
+                                     description="Score archived hurdle runs. Every directory under the given paths containing *{} or *{} files is scored as one run".format(*TRAFFIC_LOG_SUFFIXES),
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    parser.add_argument('archive_dirs', nargs='+',
+                        help="Directories to search for archived runs")
+
+    parser.add_argument('--packet-rate', type=float, default=None,
+                        help="Packet rate of the archived runs, used to compute the expected number of packets for runs without a saved {}".format(RESULT_FILENAME))
+
+    parser.add_argument('--duration', type=float, default=None,
+                        help="Duration in seconds of the archived runs, used along with --packet-rate")
+
+    parser.add_argument('--nodes-per-network', type=int, default=3,
+                        help="Number of nodes in each network of the archived runs, used along with --packet-rate")
+
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes used to parse logs. Defaults to the number of CPUs")
+
+    parser.add_argument('--no-cache', action="store_false", default=True, dest="use_cache",
+                        help="Don't read or write cached parse results next to each log")
+
+    parser.add_argument('--output-json', default="rescore_results.json",
+                        help="File to save the scores of every run to")
+
+    parser.add_argument('--output-csv', default="rescore_results.csv",
+                        help="File to save a one row per run summary table to")
+
+    # parse args and store to dictionary
+    args = vars(parser.parse_args())
+
+    default_num_packets = None
+    if args["packet_rate"] is not None and args["duration"] is not None:
+        default_num_packets = expected_packets_per_network(args["packet_rate"],
+                                                           args["duration"]-BOOTUP_SLOP_TIME,
+                                                           args["nodes_per_network"])
+
+    runs = find_runs(args["archive_dirs"])
+    print("Found {} runs with {} traffic logs".format(len(runs),
+                                                      sum(len(bots) + len(comps) for bots, comps in runs.values())))
+
+    scores = score_runs(runs, default_num_packets, args["use_cache"], args["workers"])
+
+    with open(args["output_json"], "w") as f:
+        json.dump(scores, f, indent=2)
+
+    with open(args["output_csv"], "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for run_dir, total_score in sorted(scores.items()):
+            writer.writerow(score_table_row(run_dir, total_score))
+
+    num_failed = sum(1 for total_score in scores.values() if "failed_logs" in total_score)
+    print("Scored {} runs, {} of which failed. Results saved to {} and {}".format(len(scores), num_failed,
+                                                                                  args["output_json"],
+                                                                                  args["output_csv"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,25 +4,62 @@ import argparse
 import configparser
 import json
 import logging
-import math
 import os
 import pylxd
 import subprocess
 import sys
+import threading
 import time
 
+from constants import BOOTUP_SLOP_TIME
+from constants import BUCKETED_RESULT_FILENAME
+from constants import COMPETITOR_NAME_BASE
+from constants import LIVE_RESULT_FILENAME
+from constants import METRICS_FILENAME
 from constants import RESULT_FILENAME
+from constants import RUN_JOURNAL_FILENAME
+from constants import STATUS_TIMELINE_FILENAME
+from constants import STEP_TIMING_FILENAME
+from constants import TRACE_FILENAME
+
+from container_files import pull_files
+from container_files import pull_files_compressed
+from container_files import push_files
+from live_scoring import LiveScorer
+from mgen_parser import COMPRESSED_LOG_SUFFIX
+from parallel_exec import PeriodicThread
+from parallel_exec import fan_out
+from parallel_exec import start_skew
+from run_journal import RunJournal
+from run_trace import enable_tracing
+from run_trace import merge_traces
+from run_trace import span
+from run_trace import traced_run
+from run_trace import write_trace
+from step_scheduler import StepFailed
+from step_scheduler import StepScheduler
+from traffic_metrics import compute_bucketed_score
+from traffic_metrics import compute_traffic_metrics
+from traffic_scoring import expected_packets_per_network
+from traffic_scoring import score_traffic_parallel
+
+
+# number of bot and of competitor nodes, unless --nodes-per-network says otherwise
+DEFAULT_NODES_PER_NETWORK = 3
 
-from mgen_parser import mgen_parser
-from traffic_scoring import score_traffic
+CONTAINER_BOOT_TIMEOUT=300.0
 
+# seconds between readiness polls while containers boot. Starts short and backs off by
+# BOOT_POLL_BACKOFF each poll up to BOOT_POLL_INTERVAL_MAX
+BOOT_POLL_INTERVAL_MIN = 0.5
+BOOT_POLL_INTERVAL_MAX = 10.0
+BOOT_POLL_BACKOFF = 1.5
 
-# note this is used in a couple of files. pull out to config file
-COMPETITOR_NAME_BASE='competitor-hurdle-srn'
-NUM_COMPETITOR_CONTAINERS = 3
-NUM_BOT_CONTAINERS = 3
+# seconds to wait for a radio_api script to return before giving up on that node. Status
+# calls during the run get less time so a slow node can't stretch out the status loop
+RADIO_API_TIMEOUT = 30.0
+RADIO_API_STATUS_TIMEOUT = 5.0
 
-CONTAINER_BOOT_TIMEOUT=300.0
 COMMAND_PATH_BASE="./"
 
 ENVSIM_PORT_NUM_BASE=52001
@@ -49,6 +86,11 @@ RADIO_API_PATH = "/root/radio_api"
 BOT_STATE_FILE_PATH = "/var/log/bot_state"
 
 TGEN_NAME_BASE = "tgen"
+
+# run parameters the checkpointed setup steps depend on. A journal written with different values
+# of any of these is not resumed from
+JOURNAL_PARAMS = ["bot_mode", "image_file", "disable_competitor_containers", "sample_rate",
+                  "nodes_per_network"]
 MGEN_LOG_PATH = "/home/mgen/mgen_traffic_log.drc"
 
 FORMAT = '%(asctime)s %(name)s %(levelname)s: %(message)s'
@@ -59,40 +101,27 @@ logger = logging.getLogger(__name__)
 ws4pylogger = logging.getLogger("ws4py")
 ws4pylogger.setLevel(logging.WARN)
 
-def retrieve_traffic_logs(bot_names, comp_names, tgen_name_base):
+def retrieve_traffic_logs(lxd_client, bot_names, comp_names, tgen_name_base, destination_dir=".",
+                          compress=False):
     '''
-    pull traffic logs out of tgen containers
+    pull traffic logs out of tgen containers into destination_dir, all at once. When compress
+    is set, logs are streamed out through gzip and saved with COMPRESSED_LOG_SUFFIX added
     '''
+    log_suffix = "_mgen_traffic_log.drc" + (COMPRESSED_LOG_SUFFIX if compress else "")
 
-    name_list = bot_names + comp_names
-    bot_logfiles = []
-    comp_logfiles = []
-
-    for i, name in enumerate(bot_names):
-        tgen_name = tgen_name_base + "{}".format(i+1)
-
-        source = tgen_name+MGEN_LOG_PATH
-        destination = "./{}_mgen_traffic_log.drc".format(name)
-
-        bot_logfiles.append(destination)
-
-        push_cmd = ["lxc", "file", "pull", source, destination]
-        print("Pulling traffic log file from {} to {}".format(source, destination))
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
-
-    for i, name in enumerate(comp_names):
-        tgen_name = tgen_name_base + "{}".format(i+1+len(bot_names))
+    bot_logfiles = [os.path.join(destination_dir, name + log_suffix) for name in bot_names]
+    comp_logfiles = [os.path.join(destination_dir, name + log_suffix) for name in comp_names]
 
-        source = tgen_name+MGEN_LOG_PATH
-        destination = "./{}_mgen_traffic_log.drc".format(name)
+    # bot traffic generators are numbered first, followed by the competitor traffic generators
+    tgen_names = [tgen_name_base + "{}".format(i+1) for i in range(len(bot_names) + len(comp_names))]
+    tgen_containers = [lxd_client.containers.get(tgen_name) for tgen_name in tgen_names]
 
-        comp_logfiles.append(destination)
-
-        push_cmd = ["lxc", "file", "pull", source, destination]
-        print("Pulling traffic log file from {} to {}".format(source, destination))
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
+    transfers = [(tgen, MGEN_LOG_PATH, destination)
+                 for tgen, destination in zip(tgen_containers, bot_logfiles + comp_logfiles)]
+    if compress:
+        pull_files_compressed(transfers)
+    else:
+        pull_files(transfers)
 
     return bot_logfiles, comp_logfiles
 
@@ -107,7 +136,7 @@ def handle_collab_server(action):
     # start mgen instance on MGEN service and start new log file
     exec_cmd = ["systemctl", action, "collab_server"]
     print("running {}".format(" ".join(exec_cmd)))
-    subprocess.run(exec_cmd)
+    traced_run(exec_cmd)
 
 
 
@@ -146,23 +175,49 @@ def write_colosseum_config_ini_files(num_nodes, envsim_port_base, collab_server_
 
 def install_colosseum_config_files(bot_containers, comp_containers, config_filenames):
     '''
-    push a colosseum config file into /root/radio_api for each node
+    push a colosseum config file into /root/radio_api for each node, all at once. Raises
+    StepFailed if any push failed, so the step isn't recorded as done
     '''
     container_list = bot_containers + comp_containers
 
-    for container, config_file in zip(container_list, config_filenames):
+    destination = os.path.join(RADIO_API_PATH, "colosseum_config.ini")
+    results = push_files([(container, config_file, destination)
+                          for container, config_file in zip(container_list, config_filenames)])
+
+    failed_names = [result.item[0].name for result in results if result.error is not None]
+    if len(failed_names) > 0:
+        raise StepFailed("Could not install config files in {}".format(failed_names))
+
+def get_radio_api_status(c, status_cmd):
+    '''
+    call status_cmd in container c and return the STATUS it reports, or None if the
+    result couldn't be parsed
+    '''
+    with span(os.path.basename(status_cmd[0]), category="lxd", container=c.name):
+        (retcode, stdout, stderr) = c.execute(status_cmd)
+
+    # remove whitespace to be a little forgiving
+    result_json = stdout.strip()
+
+    # try to parse the result
+    try:
+        result = json.loads(result_json)
+        return result["STATUS"]
 
-        destination = container.name+os.path.join(RADIO_API_PATH, "colosseum_config.ini")
+    except ValueError:
+        print("Could not parse result from {} as valid JSON: {}".format(c.name, result_json))
 
-        push_cmd = ["lxc", "file", "push", config_file, destination]
-        print("Deploying Colosseum Config file {} to {}".format(config_file, destination))
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
+    except KeyError as err:
+        print("Key 'STATUS' not found in JSON dict returned by container {}".format(c.name))
+        print(err)
+
+    return None
 
 def poll_radio_api_for_start_with_timeout(bot_containers, comp_containers, boot_timeout):
     '''
-    loop over bot and competitor containers until either all containers report they are
-    ready or the timeout hits, whichever happens first
+    poll bot and competitor containers, all at the same time, until either all containers
+    report they are ready or the timeout hits, whichever happens first. The time between polls
+    starts short and backs off while containers are still booting.
     '''
     boot_start_time = time.time()
     elapsed_time = time.time() - boot_start_time
@@ -171,50 +226,43 @@ def poll_radio_api_for_start_with_timeout(bot_containers, comp_containers, boot_
 
     status_cmd = [os.path.join(RADIO_API_PATH,"status.sh")]
 
+    poll_interval = BOOT_POLL_INTERVAL_MIN
 
     # loop until all containers have booted, or until the timeout hits, whichever happens first
     while(len(booting_containers) > 0 and elapsed_time<boot_timeout):
 
-        # temp list to keep track of which containers still haven't booted to avoid
-        # changing the booting_container list while we iterate over it
-        containers_still_booting = []
-
-        # check all the containers
-        for c in booting_containers:
-            container_ready = False
-
-            print("Checking {} status by calling {}".format(c.name, status_cmd))
-            (retcode, stdout, stderr) = c.execute(status_cmd)
+        print("Checking status of {} by calling {}".format([c.name for c in booting_containers], status_cmd))
 
-            # remove whitespace to be a little forgiving
-            result_json = stdout.strip()
+        # check all the containers at once, giving up on any that don't answer before the timeout
+        results = fan_out(lambda c: get_radio_api_status(c, status_cmd), booting_containers,
+                          timeout=boot_timeout-elapsed_time)
 
-            # try to parse the result
-            try:
-                result = json.loads(result_json)
-                if (result["STATUS"] == "READY") or (result["STATUS"] == "ACTIVE"):
-                    container_ready = True
-
-                print("container {} reports status: {}".format(c.name, result["STATUS"]))
-
-            except ValueError:
-                print("Could not parse result as valid JSON: {}".format(result_json))
+        # keep track of which containers still haven't booted
+        containers_still_booting = []
 
-            except KeyError as err:
-                print("Key 'STATUS' not found in JSON dict returned by container")
-                print(err)
+        for result in results:
+            c = result.item
+            if result.error is not None:
+                print("status call on {} threw error: {}".format(c.name, result.error))
+            else:
+                print("container {} reports status: {}".format(c.name, result.value))
 
-            if container_ready:
+            if result.value in ("READY", "ACTIVE"):
                 print("Container {} has booted".format(c.name))
-                pass
             else:
                 containers_still_booting.append(c)
 
         # update conainer booting list
         booting_containers = containers_still_booting
 
-        # sleep until next poll
-        time.sleep(10.0)
+        elapsed_time = time.time() - boot_start_time
+
+        if len(booting_containers) == 0:
+            break
+
+        # sleep until next poll, backing off while we wait for slow containers
+        time.sleep(min(poll_interval, max(0.0, boot_timeout-elapsed_time)))
+        poll_interval = min(poll_interval*BOOT_POLL_BACKOFF, BOOT_POLL_INTERVAL_MAX)
         elapsed_time = time.time() - boot_start_time
 
         print("{} seconds left before timeout reached".format(int(boot_timeout-elapsed_time)))
@@ -222,21 +270,39 @@ def poll_radio_api_for_start_with_timeout(bot_containers, comp_containers, boot_
         if elapsed_time > boot_timeout:
             print("Boot timeout expired after {} seconds. Continuing anyway.".format(elapsed_time))
 
-def run_radio_api_on_nodes(container_list, script):
+def run_radio_api_on_nodes(container_list, script, timeout=RADIO_API_TIMEOUT):
     '''
-    Run the specified radio_api script on every container in the container list
+    Run the specified radio_api script on every container in the container list at the same
+    time, waiting up to timeout seconds for the calls to return. Returns a list of
+    parallel_exec.CallResults holding the (retcode, stdout, stderr) of each call.
     '''
 
-    for c in reversed(container_list):
-        print("calling {} on {}".format(script, c.name))
-        try:
-            (retcode, stdout, stderr) = c.execute([script,])
-            print("return code: {}".format(retcode))
-            print("stdout: {}".format(stdout))
-            print("stderr: {}".format(stderr))
+    print("calling {} on {}".format(script, [c.name for c in container_list]))
+    def execute(c):
+        with span(os.path.basename(script), category="lxd", container=c.name):
+            return c.execute([script,])
+
+    results = fan_out(execute, container_list, timeout=timeout)
+
+    num_failed = 0
+    for result in results:
+        if result.error is not None:
+            num_failed += 1
+            print("{} on {} threw error: {}".format(script, result.item.name, result.error))
+            continue
+
+        (retcode, stdout, stderr) = result.value
+        if retcode != 0:
+            num_failed += 1
+
+        print("{} on {} return code: {} ({:.2f} s)".format(script, result.item.name, retcode, result.elapsed))
+        print("stdout: {}".format(stdout))
+        print("stderr: {}".format(stderr))
 
-        except pylxd.exceptions.LXDAPIException as err:
-            print("call threw error: {}".format(err))
+    print("{} finished on {} of {} nodes, calls started within {:.3f} s of each other".format(
+        script, len(results)-num_failed, len(results), start_skew(results)))
+
+    return results
 
 def run_subproc_and_print_output(cmd):
     '''
@@ -244,10 +310,10 @@ def run_subproc_and_print_output(cmd):
     stderr, and check the return code
     '''
 
-    subproc = subprocess.run(cmd,
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT,
-                            universal_newlines=True)
+    subproc = traced_run(cmd,
+                         stdout=subprocess.PIPE,
+                         stderr=subprocess.STDOUT,
+                         universal_newlines=True)
 
     print(subproc.stdout)
 
@@ -267,268 +333,552 @@ def cleanup_bots(bot_containers):
 
         cleanup_cmd = ["lxc", "exec", container.name, "rm", BOT_STATE_FILE_PATH]
         print("running {}".format(" ".join(cleanup_cmd)))
-        subprocess.run(cleanup_cmd)
-
-def main():
-
-    # set up command line args
-    parser = argparse.ArgumentParser(prog="run_hurdle",
-                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-
-    parser.add_argument("--bot-mode", choices=["practice", "scoring", "dummy"], default="practice",
-                        help="Practice or Scoring mode")
-
-    parser.add_argument('--duration', type=float, default=300.0,
-                        help="How long to run hurdle, not including bootup, in seconds")
-
-    parser.add_argument('--sample-rate', type=float, default=1e6, choices=[200e3, 500e3, 1e6, 2e6],
-                        help="Sample rate to run the hurdle")
-
-    parser.add_argument('--image-file', default="competitor-image.tar.gz",
-                        help="Name of the container stored in /share/nas/competitor/images/ to use for this run")
-
-    parser.add_argument('--disable-competitor-containers', action="store_true", default=False,
-                        help="When specified, the run script will not use the competitor containers")
-
-    parser.add_argument('--clean-competitor-containers', action="store_true", default=False,
-                        help="When specified, this flag will make the run script remove the competitor containers at the end of a run")
-
-    parser.add_argument('--packet-rate', type=float, default=15.0,
-                        help="Packet rate for bots and competitors")
-
-    parser.add_argument('--noise-amp', type=float, default=0.0001,
-                        help="Amplitude of gaussian background noise")
+        traced_run(cleanup_cmd)
 
-    parser.add_argument('--chan-gain-linear', type=float, default=0.1,
-                        help="Channel gain as a linear scalar applied to each channel")
-
-    parser.add_argument('--enable-debug-output', action="store_true", default=False,
-                        help="When specified, this flag will run the envsim with a ZMQ push socket that outputs the samples sent to competitor containers")
-
-
-    # parse args and store to dictionary
-    args = vars(parser.parse_args())
+def get_bot_name_base(bot_mode):
+    '''
+    get the container name base for practice, scoring or dummy bots
+    '''
+    if bot_mode == "practice":
+        return "darpa-practice-srn"
 
-    # initialize pylxd client
-    lxd_client = pylxd.Client()
+    elif bot_mode == "scoring":
+        return "darpa-scoring-srn"
 
+    # used only for internal debug
+    elif bot_mode == "dummy":
+        return "dummy-tx-srn"
+    else:
+        raise ValueError("Uknown bot mode {} specified".format(bot_mode))
 
-    # set up whether we're using practice or scoring bot mode.
-    if args["bot_mode"] == "practice":
-        bot_name_base = "darpa-practice-srn"
+def configure_competitor_containers(lxd_client, image_file, comp_container_names, num_bot_nodes,
+                                    clone_from_template=False):
+    '''
+    initialize and configure copies of the competitor container from image_file and return
+    references to them
+    '''
+    cmd = [os.path.join(COMMAND_PATH_BASE, "configure_competitor_containers.py"),
+        "--image-file", image_file,
+        "--num-bot-nodes={}".format(num_bot_nodes),
+        "--num-competitor-nodes={}".format(len(comp_container_names))]
+
+    if clone_from_template:
+        cmd.append("--clone-from-template")
+    print("Initializing competitor containers based on {}. This may take several minutes".format(image_file))
+    print("Running {}".format(" ".join(cmd)))
+    ret_code = run_subproc_and_print_output(cmd)
 
-    elif args["bot_mode"] == "scoring":
-        bot_name_base = "darpa-scoring-srn"
+    if ret_code != 0:
+        raise StepFailed("Could not load competitor container")
+
+    # get references to competitor containers
+    comp_containers = [lxd_client.containers.get(name) for name in comp_container_names]
+    if len(comp_containers) != len(comp_container_names):
+        print("Expecting {} competitor containers, found {}".format(len(comp_container_names), len(comp_containers)))
+        if len(comp_containers) > len(comp_container_names):
+            print("Please remove extra containers with lxc rm <name>. Current list is: {}".format(comp_container_names))
+        else:
+            print("Competitor containers not found. List is: {}".format(lxd_client.containers.all()))
+        raise ValueError
 
-    # used only for internal debug
-    elif args["bot_mode"] == "dummy":
-        bot_name_base = "dummy-tx-srn"
-    else:
-        raise ValueError("Uknown bot mode {} specified".format(args["bot_mode"]))
+    return comp_containers
 
-    if args["disable_competitor_containers"]:
-        comp_containers = []
-        comp_container_names = []
-        # put envsim into a 3 channel mode instead of the full six channel mode
-        envsim_mode = "bot-debug"
-    else:
-        # run envsim in its normal 6 channel mode
-        envsim_mode = "hurdle"
+def container_names(containers):
+    '''
+    convert a list of containers to the list of their names, for saving to the run journal
+    '''
+    return [c.name for c in containers]
 
-        # initialize and configure 3 copies of competitor container
-        cmd = [os.path.join(COMMAND_PATH_BASE, "configure_competitor_containers.py"),
-            "--image-file", args["image_file"]]
-        print("Initializing competitor containers based on {}. This may take several minutes".format(args["image_file"]))
-        print("Running {}".format(" ".join(cmd)))
-        ret_code = run_subproc_and_print_output(cmd)
-
-        if ret_code != 0:
-            print("Could not load competitor container. Exiting")
-            sys.exit(1)
-
-        comp_container_names = [COMPETITOR_NAME_BASE+"{}".format(i+1) for i in range(NUM_BOT_CONTAINERS, NUM_BOT_CONTAINERS+NUM_COMPETITOR_CONTAINERS)]
-
-        # get references to competitor containers
-        comp_containers = [lxd_client.containers.get(name) for name in comp_container_names]
-        if len(comp_containers) != NUM_COMPETITOR_CONTAINERS:
-            print("Expecting {} competitor containers, found {}".format(NUM_COMPETITOR_CONTAINERS, len(comp_containers)))
-            if len(comp_containers) > NUM_COMPETITOR_CONTAINERS:
-                print("Please remove extra containers with lxc rm <name>. Current list is: {}".format(comp_container_names))
-            else:
-                print("Competitor containers not found. List is: {}".format(my_containers))
-            raise ValueError
+def existing_config_files(config_filenames):
+    '''
+    check config files saved in the run journal are still there before reusing them
+    '''
+    missing_files = [name for name in config_filenames if not os.path.exists(name)]
+    if len(missing_files) > 0:
+        raise FileNotFoundError("Config files {} are missing".format(missing_files))
 
-    # get list of all containers currently loaded
-    my_containers = lxd_client.containers.all()
+    return config_filenames
 
-    # build list of expected bot container names
-    bot_container_names = [bot_name_base+"{}".format(i+1) for i in range(NUM_BOT_CONTAINERS)]
+def open_run_journal(args, journal_filename=RUN_JOURNAL_FILENAME):
+    '''
+    start a new run journal, or pick up the one from the last run if --resume was given
+    '''
+    return RunJournal(journal_filename, {param:args[param] for param in JOURNAL_PARAMS},
+                      resume=args["resume"])
 
-    # get references to bot containers
+def get_bot_containers(lxd_client, bot_container_names):
+    '''
+    get references to bot containers
+    '''
     bot_containers = [lxd_client.containers.get(name) for name in bot_container_names]
-    if len(bot_containers) != NUM_BOT_CONTAINERS:
-        print("Expecting {} bot containers, found {}".format(NUM_BOT_CONTAINERS, len(bot_containers)))
-        if len(bot_containers) > NUM_BOT_CONTAINERS:
+    if len(bot_containers) != len(bot_container_names):
+        print("Expecting {} bot containers, found {}".format(len(bot_container_names), len(bot_containers)))
+        if len(bot_containers) > len(bot_container_names):
             print("Please remove extra containers with lxc rm <name>. Current list is: {}".format(bot_containers))
         else:
-            print("Bot containers not found. List is: {}".format(my_containers))
+            print("Bot containers not found. List is: {}".format(lxd_client.containers.all()))
             print("Consider removing all bot containers and re-running the hurdle container initialization script")
         raise ValueError
 
+    return bot_containers
 
-    # Set up and deploy Colosseum Config files to nodes
-    config_filenames = write_colosseum_config_ini_files(num_nodes=len(comp_containers)+len(bot_containers),
-                                                        envsim_port_base=ENVSIM_PORT_NUM_BASE,
-                                                        collab_server_ip=COLLAB_SERVER_IP,
-                                                        collab_server_port=COLLAB_SERVER_PORT,
-                                                        collab_client_port=COLLAB_CLIENT_PORT,
-                                                        collab_peer_port=COLLAB_PEER_PORT,
-                                                        samp_rate=args["sample_rate"],
-                                                        center_freq=1e9)
-
-    # Push ColosseumConfig.ini into bot and competitor containers
-    install_colosseum_config_files(bot_containers, comp_containers, config_filenames)
-
-    # start all containers
+def control_containers(action, bot_name_base):
+    '''
+    start or stop all bot, competitor and traffic generator containers
+    '''
     cmd = [os.path.join(COMMAND_PATH_BASE, "container_control.py"),
-            "--bot-container-name-base={}".format(bot_name_base),
-            "--competitor-container-name-base={}".format(COMPETITOR_NAME_BASE),
-            "--tgen-container-name-base={}".format(TGEN_NAME_BASE),
-            "start"]
+           "--bot-container-name-base={}".format(bot_name_base),
+           "--competitor-container-name-base={}".format(COMPETITOR_NAME_BASE),
+           "--tgen-container-name-base={}".format(TGEN_NAME_BASE),
+           action]
 
-    print("Starting containers by running {}".format(" ".join(cmd)))
+    print("{} containers by running {}".format("Starting" if action == "start" else "Stopping", " ".join(cmd)))
     ret_code = run_subproc_and_print_output(cmd)
 
-    if ret_code != 0:
-        print("All necessary containers did not start. Exiting")
-        sys.exit(1)
-
+    if ret_code != 0 and action == "start":
+        raise StepFailed("All necessary containers did not start")
 
-
-    # start envsim
+def start_envsim(envsim_mode, sample_rate, chan_gain_linear, noise_amp, enable_debug_output,
+                 num_bot_nodes=DEFAULT_NODES_PER_NETWORK, num_competitor_nodes=DEFAULT_NODES_PER_NETWORK):
+    '''
+    start the environment simulator with channels for num_bot_nodes bots and
+    num_competitor_nodes competitor nodes
+    '''
     cmd = [os.path.join(COMMAND_PATH_BASE, "envsim_control.py"),
            "--mode={}".format(envsim_mode)]
 
-    if args["enable_debug_output"]:
+    if enable_debug_output:
         cmd.append("--enable-debug-output")
 
     cmd.extend(["start",
                 "--port-num-base={}".format(ENVSIM_PORT_NUM_BASE),
-                "--samp-rate={}".format(args["sample_rate"]),
+                "--samp-rate={}".format(sample_rate),
                 "--usrp-ip-prefix={}".format(USRP_IP_PREFIX),
                 "--usrp-ip-base={}".format(USRP_IP_BASE),
-                "--channel-gain-linear={}".format(args["chan_gain_linear"]),
-                "--noise-amp={}".format(args["noise_amp"]),
+                "--channel-gain-linear={}".format(chan_gain_linear),
+                "--noise-amp={}".format(noise_amp),
+                "--num-bot-nodes={}".format(num_bot_nodes),
+                "--num-competitor-nodes={}".format(num_competitor_nodes),
                 "--envsim-config-file={}".format(ENVSIM_CONFIG_PATH)])
 
     print("Starting envsim by running {}".format(" ".join(cmd)))
     ret_code = run_subproc_and_print_output(cmd)
 
     if ret_code != 0:
-        print("Environment simulator did not start. Exiting")
-        sys.exit(1)
+        raise StepFailed("Environment simulator did not start")
 
-    # Start collaboration server
-    handle_collab_server(action="start")
+def stop_envsim(envsim_mode, enable_debug_output):
+    '''
+    stop the environment simulator
+    '''
+    cmd = [os.path.join(COMMAND_PATH_BASE, "envsim_control.py"),
+           "--mode={}".format(envsim_mode)]
 
-    # poll containers for ready state in radio_api loop
-    poll_radio_api_for_start_with_timeout(bot_containers, comp_containers, CONTAINER_BOOT_TIMEOUT)
+    if enable_debug_output:
+        cmd.append("--enable-debug-output")
+
+    cmd.append("stop")
 
-    print("all containers booted")
+    print("Stopping envsim by running {}".format(" ".join(cmd)))
+    ret_code = run_subproc_and_print_output(cmd)
 
-    # when all containers ready:
-    # setup top level container routing
-    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_routing_setup.sh")]
+def setup_routing(nodes_per_network=DEFAULT_NODES_PER_NETWORK):
+    '''
+    setup top level container routing to the traffic generators of both networks
+    '''
+    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_routing_setup.sh"), str(2*nodes_per_network)]
     print("Setting up routing by running {}".format(" ".join(cmd)))
     ret_code = run_subproc_and_print_output(cmd)
 
     if ret_code != 0:
-        print("Routing table setup unsuccessful. Consider running traffic_routing_teardown.sh and trying again")
-        sys.exit(1)
+        raise StepFailed("Routing table setup unsuccessful. Consider running traffic_routing_teardown.sh and trying again")
 
-    #   call start on each node
-    run_radio_api_on_nodes(bot_containers+comp_containers, script=os.path.join(RADIO_API_PATH,"start.sh"))
+def teardown_routing(nodes_per_network=DEFAULT_NODES_PER_NETWORK):
+    '''
+    teardown top level container routing
+    '''
+    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_routing_teardown.sh"), str(2*nodes_per_network)]
+    print("Tearing down routing by running {}".format(" ".join(cmd)))
+    ret_code = run_subproc_and_print_output(cmd)
 
-    #   start traffic
+def start_traffic(duration, packet_rate, nodes_per_network=DEFAULT_NODES_PER_NETWORK):
+    '''
+    start MGEN traffic on every traffic generator
+    '''
     cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_control.py"),
+           "--num-bot-nodes={}".format(nodes_per_network),
+           "--num-competitor-nodes={}".format(nodes_per_network),
            "start",
-           "--traffic-duration", str(args["duration"]),
-           "--bot-peak-msg-rate={}".format(args["packet_rate"]),
-           "--comp-peak-msg-rate={}".format(args["packet_rate"])]
+           "--traffic-duration", str(duration),
+           "--bot-peak-msg-rate={}".format(packet_rate),
+           "--comp-peak-msg-rate={}".format(packet_rate)]
 
     print("Starting traffic by running {}".format(" ".join(cmd)))
     ret_code = run_subproc_and_print_output(cmd)
 
-    #   wait around for traffic duration, periodically calling radio_api status
+def stop_traffic(nodes_per_network=DEFAULT_NODES_PER_NETWORK):
+    '''
+    stop MGEN traffic on every traffic generator
+    '''
+    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_control.py"),
+           "--num-bot-nodes={}".format(nodes_per_network),
+           "--num-competitor-nodes={}".format(nodes_per_network),
+           "stop"]
+
+    print("Stopping traffic by running {}".format(" ".join(cmd)))
+    ret_code = run_subproc_and_print_output(cmd)
+
+def wait_for_hurdle(bot_containers, comp_containers, args, live_scorer=None,
+                    live_result_filename=LIVE_RESULT_FILENAME,
+                    timeline_filename=STATUS_TIMELINE_FILENAME):
+    '''
+    wait until the traffic end deadline while calling radio_api status on every node in the
+    background every status_interval seconds, saving what each node reported to
+    timeline_filename. If a live_scorer is given, the traffic so far is scored after each status
+    call, and the wait can end early if the live abort threshold is hit.
+    '''
     start_time = time.time()
-    elapsed_time = time.time()-start_time
     hurdle_time = args["duration"] + HURDLE_TIMING_SLOP
-    while(elapsed_time < hurdle_time):
-        print("waiting {} more seconds for hurdle to complete".format(hurdle_time-elapsed_time))
-        run_radio_api_on_nodes(bot_containers+comp_containers, script=os.path.join(RADIO_API_PATH,"status.sh"))
-        time.sleep(10)
+    deadline = start_time + hurdle_time
+
+    end_early = threading.Event()
+    timeline = []
+    timeline_lock = threading.Lock()
+
+    def sample_status():
         elapsed_time = time.time()-start_time
+        print("{:.1f} seconds left before hurdle completes".format(hurdle_time-elapsed_time))
 
+        results = run_radio_api_on_nodes(bot_containers+comp_containers, script=os.path.join(RADIO_API_PATH,"status.sh"),
+                                         timeout=RADIO_API_STATUS_TIMEOUT)
 
+        sample = {"time":elapsed_time, "nodes":{}}
+        for result in results:
+            node = {"start_time":result.start_time-start_time, "elapsed":result.elapsed}
+            if result.error is not None:
+                node["error"] = str(result.error)
+            else:
+                (retcode, stdout, stderr) = result.value
+                node["retcode"] = retcode
+                node["stdout"] = stdout.strip()
+            sample["nodes"][result.item.name] = node
+
+        with timeline_lock:
+            timeline.append(sample)
+
+        if live_scorer is not None:
+            live_scorer.update()
+
+            # only score once we expect traffic to be flowing
+            traffic_time = min(elapsed_time, args["duration"]) - BOOTUP_SLOP_TIME
+            num_packets_so_far = expected_packets_per_network(args["packet_rate"], traffic_time, args["nodes_per_network"])
+            if num_packets_so_far > 0:
+                live_score = live_scorer.score(num_packets_so_far, live_result_filename)
+                rates = live_scorer.packet_success_rates(live_score)
+                print("live packet success rates after {} seconds: {}".format(int(elapsed_time), rates))
+
+                # give up on runs that are clearly failing
+                if (args["live_abort_threshold"] is not None and
+                        elapsed_time > args["live_abort_grace_period"]):
+                    failing_networks = [network for network, rate in rates.items()
+                                        if rate < args["live_abort_threshold"]]
+
+                    if len(failing_networks) > 0:
+                        print("Packet success rate for {} below {}. Ending hurdle early".format(failing_networks, args["live_abort_threshold"]))
+                        end_early.set()
+
+    sampler = PeriodicThread(sample_status, args["status_interval"], name="status sampler")
+    sampler.start()
+
+    # sleep right up to the deadline, unless live scoring ends the run first
+    print("waiting {} seconds for hurdle to complete".format(hurdle_time))
+    end_early.wait(max(0.0, deadline-time.time()))
+
+    # a status call may still be in flight. Let it finish in the background rather than holding
+    # up the teardown
+    sampler.stop(timeout=0)
+    end_time = time.time()
+    print("hurdle wait finished {:.3f} s after the deadline".format(end_time-deadline))
+
+    with timeline_lock:
+        samples = list(timeline)
+
+    with open(timeline_filename, "w") as f:
+        json.dump({"start_time":start_time,
+                   "deadline":deadline,
+                   "end_time":end_time,
+                   "ended_early":end_early.is_set(),
+                   "status_interval":args["status_interval"],
+                   "samples":samples}, f, indent=2)
+
+def score_traffic_logs(bot_logfiles, comp_logfiles, args, output_dir="."):
+    '''
+    score bot and competitor traffic logs and save packet counts, flow metrics and bucketed
+    counts to output_dir
+    '''
+    # compute expected number of packets per network
+    num_packets = expected_packets_per_network(args["packet_rate"], args["duration"]-BOOTUP_SLOP_TIME, args["nodes_per_network"])
+
+    # parse and score bot and competitor log files, one worker process per log
+    score_traffic_parallel(bot_logfiles, comp_logfiles, num_packets,
+                           os.path.join(output_dir, RESULT_FILENAME),
+                           num_workers=args["scoring_workers"])
+
+    # compute per flow latency, jitter, goodput and loss metrics alongside the packet counts
+    compute_traffic_metrics(bot_logfiles, comp_logfiles, os.path.join(output_dir, METRICS_FILENAME),
+                            window_secs=args["metrics_window"],
+                            num_workers=args["scoring_workers"])
+
+    # count offered and delivered packets over time to show when each network was delivering
+    compute_bucketed_score(bot_logfiles, comp_logfiles, os.path.join(output_dir, BUCKETED_RESULT_FILENAME),
+                           bucket_secs=args["score_bucket_secs"],
+                           traffic_duration=args["duration"],
+                           packet_rate=args["packet_rate"],
+                           num_workers=args["scoring_workers"])
+
+def add_hurdle_arguments(parser):
+    '''
+    add the command line args shared by run_hurdle and run_hurdle_batch to parser
+    '''
+    parser.add_argument("--bot-mode", choices=["practice", "scoring", "dummy"], default="practice",
+                        help="Practice or Scoring mode")
 
-    # when time is up:
-    #   stop traffic
-    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_control.py"),
-           "stop"]
+    parser.add_argument('--duration', type=float, default=300.0,
+                        help="How long to run hurdle, not including bootup, in seconds")
 
-    print("Stopping traffic by running {}".format(" ".join(cmd)))
-    ret_code = run_subproc_and_print_output(cmd)
+    parser.add_argument('--nodes-per-network', type=int, default=DEFAULT_NODES_PER_NETWORK,
+                        help="Number of bot nodes, and of competitor nodes. Bot containers, traffic generators and the LXD bridges they attach to must already exist for every node")
 
-    #   teardown routing
-    cmd = [os.path.join(COMMAND_PATH_BASE, "traffic_routing_teardown.sh")]
-    print("Tearing down routing by running {}".format(" ".join(cmd)))
-    ret_code = run_subproc_and_print_output(cmd)
+    parser.add_argument('--sample-rate', type=float, default=1e6, choices=[200e3, 500e3, 1e6, 2e6],
+                        help="Sample rate to run the hurdle")
 
+    parser.add_argument('--image-file', default="competitor-image.tar.gz",
+                        help="Name of the container stored in /share/nas/competitor/images/ to use for this run")
 
-    #   call stop on each node
-    run_radio_api_on_nodes(bot_containers+comp_containers, script=os.path.join(RADIO_API_PATH,"stop.sh"))
+    parser.add_argument('--clone-containers', action="store_true", default=False,
+                        help="Create the first competitor container from the image and copy it for the rest, which is much faster on copy-on-write storage")
 
-    # stop collaboration server
-    handle_collab_server(action="stop")
+    parser.add_argument('--disable-competitor-containers', action="store_true", default=False,
+                        help="When specified, the run script will not use the competitor containers")
 
-    #   stop envsim
-    cmd = [os.path.join(COMMAND_PATH_BASE, "envsim_control.py"),
-           "--mode={}".format(envsim_mode)]
+    parser.add_argument('--clean-competitor-containers', action="store_true", default=False,
+                        help="When specified, this flag will make the run script remove the competitor containers at the end of a run")
 
-    if args["enable_debug_output"]:
-        cmd.append("--enable-debug-output")
+    parser.add_argument('--enable-debug-output', action="store_true", default=False,
+                        help="When specified, this flag will run the envsim with a ZMQ push socket that outputs the samples sent to competitor containers")
 
-    cmd.append("stop")
+    parser.add_argument('--scoring-workers', type=int, default=None,
+                        help="Number of worker processes used to parse and score traffic logs. Defaults to the number of CPUs")
 
-    print("Stopping envsim by running {}".format(" ".join(cmd)))
-    ret_code = run_subproc_and_print_output(cmd)
+    parser.add_argument('--metrics-window', type=float, default=1.0,
+                        help="Window size in seconds used when computing goodput for {}".format(METRICS_FILENAME))
 
-    # remove status files from bots so they boot cleanly next run
-    cleanup_bots(bot_containers)
+    parser.add_argument('--score-bucket-secs', type=float, default=1.0,
+                        help="Bucket size in seconds used when counting offered and delivered packets over time for {}".format(BUCKETED_RESULT_FILENAME))
 
-    #   stop all containers
-    cmd = [os.path.join(COMMAND_PATH_BASE, "container_control.py"),
-           "--bot-container-name-base={}".format(bot_name_base),
-           "--competitor-container-name-base={}".format(COMPETITOR_NAME_BASE),
-           "--tgen-container-name-base={}".format(TGEN_NAME_BASE),
-           "stop"]
-    print("Stopping containers by running {}".format(" ".join(cmd)))
-    ret_code = run_subproc_and_print_output(cmd)
+    parser.add_argument('--status-interval', type=float, default=10.0,
+                        help="Seconds between radio_api status calls on every node while the hurdle runs. Results are saved to {}".format(STATUS_TIMELINE_FILENAME))
 
+    parser.add_argument('--live-scoring', action="store_true", default=False,
+                        help="When specified, tail the traffic logs during the run and keep {} updated with the score so far".format(LIVE_RESULT_FILENAME))
 
-    #   TODO: consider what other logs we should grab
-    bot_logfiles, comp_logfiles = retrieve_traffic_logs(bot_container_names,
-                                                        comp_container_names,
-                                                        TGEN_NAME_BASE)
+    parser.add_argument('--live-abort-threshold', type=float, default=None,
+                        help="With --live-scoring, end the run early if either network's packet success rate so far drops below this value")
 
-    # parse bot and competitor log files
-    bot_traffic_logs = [mgen_parser(bot_log) for bot_log in bot_logfiles]
-    comp_traffic_logs = [mgen_parser(comp_log) for comp_log in comp_logfiles]
+    parser.add_argument('--live-abort-grace-period', type=float, default=60.0,
+                        help="Seconds after traffic starts before --live-abort-threshold is checked")
 
-    # compute expected number of packets per network
-    bootup_slop_time = 8.0
-    num_packets = math.floor(args["packet_rate"]*NUM_BOT_CONTAINERS*(args["duration"]-bootup_slop_time)*(NUM_BOT_CONTAINERS-1))
-    score_traffic(bot_traffic_logs, comp_traffic_logs, num_packets, RESULT_FILENAME)
+    parser.add_argument('--compress-logs', action="store_true", default=False,
+                        help="When specified, stream traffic logs out of the traffic generators gzip compressed and save them as *_mgen_traffic_log.drc{}".format(COMPRESSED_LOG_SUFFIX))
+
+    parser.add_argument('--resume', action="store_true", default=False,
+                        help="When specified, skip setup steps that finished in the last run with the same parameters, as recorded in {}, such as loading the competitor image and creating competitor containers".format(RUN_JOURNAL_FILENAME))
+
+    parser.add_argument('--trace-dir', default=None,
+                        help="When specified, record how long every step, subprocess and LXD call takes in this and the scripts it runs, and save a combined Chrome trace to {}".format(TRACE_FILENAME))
+
+def main():
+
+    # set up command line args
+    parser = argparse.ArgumentParser(prog="run_hurdle",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    add_hurdle_arguments(parser)
+
+    parser.add_argument('--packet-rate', type=float, default=15.0,
+                        help="Packet rate for bots and competitors")
+
+    parser.add_argument('--noise-amp', type=float, default=0.0001,
+                        help="Amplitude of gaussian background noise")
+
+    parser.add_argument('--chan-gain-linear', type=float, default=0.1,
+                        help="Channel gain as a linear scalar applied to each channel")
+
+
+    # parse args and store to dictionary
+    args = vars(parser.parse_args())
+
+    if args["trace_dir"] is not None:
+        enable_tracing(args["trace_dir"], "run_hurdle")
+
+    # initialize pylxd client
+    lxd_client = pylxd.Client()
+
+
+    # set up whether we're using practice or scoring bot mode.
+    bot_name_base = get_bot_name_base(args["bot_mode"])
+    nodes_per_network = args["nodes_per_network"]
+
+    if args["disable_competitor_containers"]:
+        comp_container_names = []
+        # put envsim into a bot only mode instead of the full mode with both networks
+        envsim_mode = "bot-debug"
+    else:
+        # run envsim in its normal mode with channels for both networks
+        envsim_mode = "hurdle"
+
+        comp_container_names = [COMPETITOR_NAME_BASE+"{}".format(i+1) for i in range(nodes_per_network, 2*nodes_per_network)]
+
+    # build list of expected bot container names
+    bot_container_names = [bot_name_base+"{}".format(i+1) for i in range(nodes_per_network)]
+
+    # Setup steps. Each step starts as soon as the steps it depends on are done, so independent
+    # steps like starting envsim and the collaboration server run at the same time as the
+    # container setup
+    journal = open_run_journal(args)
+    setup = StepScheduler("setup", journal)
+
+    def get_competitor_containers():
+        if args["disable_competitor_containers"]:
+            return []
+
+        return configure_competitor_containers(lxd_client, args["image_file"], comp_container_names,
+                                               nodes_per_network, args["clone_containers"])
+
+    def write_config_files():
+        # Set up Colosseum Config files for nodes
+        return write_colosseum_config_ini_files(num_nodes=len(comp_container_names)+len(bot_container_names),
+                                                envsim_port_base=ENVSIM_PORT_NUM_BASE,
+                                                collab_server_ip=COLLAB_SERVER_IP,
+                                                collab_server_port=COLLAB_SERVER_PORT,
+                                                collab_client_port=COLLAB_CLIENT_PORT,
+                                                collab_peer_port=COLLAB_PEER_PORT,
+                                                samp_rate=args["sample_rate"],
+                                                center_freq=1e9)
+
+    def poll_containers():
+        # poll containers for ready state in radio_api loop
+        poll_radio_api_for_start_with_timeout(setup.results["bot_containers"],
+                                              setup.results["competitor_containers"],
+                                              CONTAINER_BOOT_TIMEOUT)
+
+        print("all containers booted")
+
+    setup.add_step("competitor_containers", get_competitor_containers, checkpoint=True,
+                   save=container_names,
+                   restore=lambda names: [lxd_client.containers.get(name) for name in names])
+    setup.add_step("bot_containers", lambda: get_bot_containers(lxd_client, bot_container_names))
+    setup.add_step("write_config_files", write_config_files, checkpoint=True,
+                   restore=existing_config_files)
+
+    # Push ColosseumConfig.ini into bot and competitor containers
+    setup.add_step("install_config_files",
+                   lambda: install_colosseum_config_files(setup.results["bot_containers"],
+                                                          setup.results["competitor_containers"],
+                                                          setup.results["write_config_files"]),
+                   depends_on=["competitor_containers", "bot_containers", "write_config_files"],
+                   checkpoint=True)
+    setup.add_step("start_containers", lambda: control_containers("start", bot_name_base),
+                   depends_on=["install_config_files"])
+    setup.add_step("start_envsim",
+                   lambda: start_envsim(envsim_mode, args["sample_rate"], args["chan_gain_linear"],
+                                        args["noise_amp"], args["enable_debug_output"],
+                                        len(bot_container_names), len(comp_container_names)))
+    setup.add_step("start_collab_server", lambda: handle_collab_server(action="start"))
+    setup.add_step("poll_containers", poll_containers,
+                   depends_on=["start_containers", "start_envsim", "start_collab_server"])
+    setup.add_step("setup_routing", lambda: setup_routing(nodes_per_network), depends_on=["start_containers"])
+
+    #   call start on each node
+    setup.add_step("start_radios",
+                   lambda: run_radio_api_on_nodes(setup.results["bot_containers"]+setup.results["competitor_containers"],
+                                                  script=os.path.join(RADIO_API_PATH,"start.sh")),
+                   depends_on=["poll_containers", "setup_routing"])
+    setup.add_step("start_traffic", lambda: start_traffic(args["duration"], args["packet_rate"], nodes_per_network),
+                   depends_on=["start_radios"])
+
+    try:
+        setup.run()
+    except StepFailed as err:
+        print("{}. Exiting".format(err))
+        setup.print_timings()
+        sys.exit(1)
+
+    bot_containers = setup.results["bot_containers"]
+    comp_containers = setup.results["competitor_containers"]
+
+    # optionally follow the traffic logs while the hurdle runs
+    live_scorer = None
+    if args["live_scoring"]:
+        bot_tgen_names = [TGEN_NAME_BASE+"{}".format(i+1) for i in range(len(bot_container_names))]
+        comp_tgen_names = [TGEN_NAME_BASE+"{}".format(i+1+len(bot_container_names)) for i in range(len(comp_container_names))]
+        live_scorer = LiveScorer([lxd_client.containers.get(name) for name in bot_tgen_names],
+                                 [lxd_client.containers.get(name) for name in comp_tgen_names],
+                                 MGEN_LOG_PATH)
+
+    #   wait around for traffic duration, periodically calling radio_api status
+    with span("wait_for_hurdle"):
+        wait_for_hurdle(bot_containers, comp_containers, args, live_scorer)
+
+
+    # when time is up, tear everything down. Traffic logs are pulled as soon as traffic stops,
+    # alongside the rest of the teardown, and scored once they're in
+    teardown = StepScheduler("teardown")
+
+    teardown.add_step("stop_traffic", lambda: stop_traffic(nodes_per_network))
+    teardown.add_step("teardown_routing", lambda: teardown_routing(nodes_per_network),
+                      depends_on=["stop_traffic"])
+
+    #   call stop on each node
+    teardown.add_step("stop_radios",
+                      lambda: run_radio_api_on_nodes(bot_containers+comp_containers,
+                                                     script=os.path.join(RADIO_API_PATH,"stop.sh")),
+                      depends_on=["stop_traffic"])
+    teardown.add_step("stop_collab_server", lambda: handle_collab_server(action="stop"),
+                      depends_on=["stop_radios"])
+    teardown.add_step("stop_envsim", lambda: stop_envsim(envsim_mode, args["enable_debug_output"]),
+                      depends_on=["stop_radios"])
+
+    # remove status files from bots so they boot cleanly next run
+    teardown.add_step("cleanup_bots", lambda: cleanup_bots(bot_containers), depends_on=["stop_radios"])
+
+    #   TODO: consider what other logs we should grab
+    teardown.add_step("retrieve_traffic_logs",
+                      lambda: retrieve_traffic_logs(lxd_client, bot_container_names, comp_container_names,
+                                                    TGEN_NAME_BASE, compress=args["compress_logs"]),
+                      depends_on=["stop_traffic"])
+
+    # the traffic generators have to keep running until their logs are out
+    teardown.add_step("stop_containers", lambda: control_containers("stop", bot_name_base),
+                      depends_on=["teardown_routing", "stop_envsim", "cleanup_bots", "retrieve_traffic_logs"])
+    teardown.add_step("score",
+                      lambda: score_traffic_logs(*teardown.results["retrieve_traffic_logs"], args=args),
+                      depends_on=["retrieve_traffic_logs"])
+
+    try:
+        teardown.run()
+    except StepFailed as err:
+        print("{}. Continuing anyway".format(err))
+
+    setup.print_timings()
+    teardown.print_timings()
+    with open(STEP_TIMING_FILENAME, "w") as f:
+        json.dump({"setup":setup.timing_report(), "teardown":teardown.timing_report()}, f, indent=2)
+
+    # combine the traces of this script and every script it ran
+    if args["trace_dir"] is not None:
+        write_trace()
+        print("Saved trace to {}".format(merge_traces(args["trace_dir"], TRACE_FILENAME)))
 
     # optionally clear out competitor containers at the end of the run
     # One one hand, it may be useful to leave them in to be able to poke at logs. On the other
@@ -540,6 +890,9 @@ def main():
         cmd = ["lxc", "rm",] + comp_container_names
         run_subproc_and_print_output(cmd)
 
+        # the containers are gone, so the next run has to create them again
+        journal.forget("competitor_containers")
+
 
 if __name__ == "__main__":
     main()
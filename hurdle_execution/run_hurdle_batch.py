@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import json
+import os
+import sys
+
+import pylxd
+
+from constants import COMPETITOR_NAME_BASE
+from constants import LIVE_RESULT_FILENAME
+from constants import RESULT_FILENAME
+from constants import RUN_JOURNAL_FILENAME
+from constants import STATUS_TIMELINE_FILENAME
+from constants import STEP_TIMING_FILENAME
+from constants import TRACE_FILENAME
+
+from container_control import control_containers as control_named_containers
+
+from live_scoring import LiveScorer
+from parallel_exec import fan_out
+from run_hurdle import COLLAB_CLIENT_PORT
+from run_hurdle import COLLAB_PEER_PORT
+from run_hurdle import COLLAB_SERVER_IP
+from run_hurdle import COLLAB_SERVER_PORT
+from run_hurdle import CONTAINER_BOOT_TIMEOUT
+from run_hurdle import ENVSIM_PORT_NUM_BASE
+from run_hurdle import MGEN_LOG_PATH
+from run_hurdle import RADIO_API_PATH
+from run_hurdle import RADIO_API_TIMEOUT
+from run_hurdle import TGEN_NAME_BASE
+from run_hurdle import add_hurdle_arguments
+from run_hurdle import cleanup_bots
+from run_hurdle import configure_competitor_containers
+from run_hurdle import container_names
+from run_hurdle import control_containers
+from run_hurdle import get_bot_containers
+from run_hurdle import existing_config_files
+from run_hurdle import get_bot_name_base
+from run_hurdle import get_radio_api_status
+from run_hurdle import handle_collab_server
+from run_hurdle import install_colosseum_config_files
+from run_hurdle import open_run_journal
+from run_hurdle import poll_radio_api_for_start_with_timeout
+from run_hurdle import retrieve_traffic_logs
+from run_hurdle import run_radio_api_on_nodes
+from run_hurdle import run_subproc_and_print_output
+from run_hurdle import score_traffic_logs
+from run_hurdle import setup_routing
+from run_hurdle import start_envsim
+from run_hurdle import start_traffic
+from run_hurdle import stop_envsim
+from run_hurdle import stop_traffic
+from run_hurdle import teardown_routing
+from run_hurdle import wait_for_hurdle
+from run_hurdle import write_colosseum_config_ini_files
+from run_trace import enable_tracing
+from run_trace import merge_traces
+from run_trace import span
+from run_trace import traced_run
+from run_trace import write_trace
+from step_scheduler import StepFailed
+from step_scheduler import StepScheduler
+from traffic_scoring import packet_success_rate
+
+
+BATCH_SUMMARY_FILENAME = "hurdle_batch_summary.json"
+
+# worker processes used to score a run while the next one is running. Kept small so scoring
+# doesn't take CPU away from the next run's envsim and radios
+DEFAULT_BACKGROUND_SCORING_WORKERS = 1
+
+# run parameters that can be swept over in a batch
+MATRIX_PARAMS = ["packet_rate", "noise_amp", "chan_gain_linear"]
+
+# radio states that never lead back to READY without rebooting the container, such as the
+# FINISHED state stop.sh leaves radios in at the end of a run
+RESTART_RADIO_STATES = ["ACTIVE", "STOPPING", "FINISHED", "ERROR"]
+
+
+def build_run_matrix(args):
+    '''
+    Get the list of run parameter dictionaries to run. Either read from the JSON matrix file, a
+    list of dictionaries with any of the MATRIX_PARAMS as keys, or every combination of the
+    values given on the command line. Parameters missing from a matrix file entry fall back to
+    the first value given on the command line.
+    '''
+    if args["matrix_file"] is not None:
+        with open(args["matrix_file"], "r") as f:
+            matrix = json.load(f)
+
+        defaults = {"packet_rate":args["packet_rates"][0],
+                    "noise_amp":args["noise_amps"][0],
+                    "chan_gain_linear":args["chan_gains_linear"][0]}
+
+        runs = []
+        for entry in matrix:
+            unknown_params = set(entry) - set(MATRIX_PARAMS)
+            if len(unknown_params) > 0:
+                raise ValueError("Unknown run parameters {} in {}".format(sorted(unknown_params), args["matrix_file"]))
+
+            run_params = dict(defaults)
+            run_params.update(entry)
+            runs.append(run_params)
+    else:
+        runs = [{"packet_rate":packet_rate, "noise_amp":noise_amp, "chan_gain_linear":chan_gain}
+                for packet_rate, noise_amp, chan_gain in itertools.product(args["packet_rates"],
+                                                                          args["noise_amps"],
+                                                                          args["chan_gains_linear"])]
+
+    return [run_params for run_params in runs for _ in range(args["repeats"])]
+
+
+def run_dir_name(run_num, run_params):
+    '''
+    Name the output directory of a run after its position in the batch and its parameters
+    '''
+    return "run_{:03d}_rate_{}_noise_{}_gain_{}".format(run_num, run_params["packet_rate"],
+                                                        run_params["noise_amp"],
+                                                        run_params["chan_gain_linear"])
+
+
+def clear_traffic_logs(tgen_names):
+    '''
+    Remove the MGEN log from every traffic generator so each run starts with a fresh log
+    '''
+    def clear_log(tgen_name):
+        cmd = ["lxc", "exec", tgen_name, "--", "rm", "-f", MGEN_LOG_PATH]
+        print("running {}".format(" ".join(cmd)))
+        return traced_run(cmd).returncode
+
+    fan_out(clear_log, tgen_names)
+
+
+def restart_finished_radios(lxd_client, containers):
+    '''
+    Reboot the containers whose radios were left in a state they can't get back to READY from,
+    so the next run doesn't wait out the boot timeout for them. Containers still booting are left
+    alone. Returns the names of the restarted containers.
+    '''
+    status_cmd = [os.path.join(RADIO_API_PATH,"status.sh")]
+    results = fan_out(lambda c: get_radio_api_status(c, status_cmd), containers, timeout=RADIO_API_TIMEOUT)
+
+    restart_names = [result.item.name for result in results if result.value in RESTART_RADIO_STATES]
+    if len(restart_names) == 0:
+        return restart_names
+
+    print("Restarting containers whose radios need a reboot to get back to READY: {}".format(restart_names))
+    for action in ("stop", "start"):
+        failed_names = [result.item for result in control_named_containers(lxd_client, restart_names, action)
+                        if result.error is not None]
+        if len(failed_names) > 0:
+            raise StepFailed("Could not {} containers {}".format(action, failed_names))
+
+    return restart_names
+
+
+def summarize_run(run_dir, run_params):
+    '''
+    Get the parameters and packet success rates of a scored run
+    '''
+    summary = {"run_dir":run_dir}
+    summary.update(run_params)
+
+    try:
+        with open(os.path.join(run_dir, RESULT_FILENAME), "r") as f:
+            total_score = json.load(f)
+    except (OSError, ValueError) as err:
+        print("Could not read score for {}: {}".format(run_dir, err))
+        return summary
+
+    # runs that weren't expected to send any packets get a success rate of None
+    for network in ("bots", "competitors"):
+        summary[network + "_packet_success_rate"] = packet_success_rate(total_score[network]["total"],
+                                                                        total_score["input_packets_per_network"])
+
+    return summary
+
+
+def main():
+
+    # set up command line args
+    parser = argparse.ArgumentParser(prog="run_hurdle_batch",
+                                     description="Run the hurdle once for every set of run parameters, keeping containers, routing and the collaboration server up between runs",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+
+    add_hurdle_arguments(parser)
+
+    parser.add_argument('--packet-rates', type=float, nargs='+', default=[15.0],
+                        help="Packet rates for bots and competitors to sweep over")
+
+    parser.add_argument('--noise-amps', type=float, nargs='+', default=[0.0001],
+                        help="Amplitudes of gaussian background noise to sweep over")
+
+    parser.add_argument('--chan-gains-linear', type=float, nargs='+', default=[0.1],
+                        help="Channel gains as a linear scalar applied to each channel to sweep over")
+
+    parser.add_argument('--matrix-file', default=None,
+                        help="JSON file holding a list of run parameter dictionaries with keys from {}. Overrides the sweep args".format(MATRIX_PARAMS))
+
+    parser.add_argument('--repeats', type=int, default=1,
+                        help="Number of times to run each set of run parameters")
+
+    parser.add_argument('--output-dir', default="hurdle_batch_results",
+                        help="Directory to save logs and scores of each run under")
+
+    parser.add_argument('--background-scoring-workers', type=int, default=DEFAULT_BACKGROUND_SCORING_WORKERS,
+                        help="Number of worker processes used to score each run while the next run is going. Used instead of --scoring-workers in batch mode")
+
+    # parse args and store to dictionary
+    args = vars(parser.parse_args())
+
+    runs = build_run_matrix(args)
+    print("Running batch of {} hurdle runs".format(len(runs)))
+
+    if args["trace_dir"] is not None:
+        enable_tracing(args["trace_dir"], "run_hurdle_batch")
+
+    # initialize pylxd client
+    lxd_client = pylxd.Client()
+
+    # set up whether we're using practice or scoring bot mode.
+    bot_name_base = get_bot_name_base(args["bot_mode"])
+    nodes_per_network = args["nodes_per_network"]
+
+    if args["disable_competitor_containers"]:
+        comp_container_names = []
+        # put envsim into a bot only mode instead of the full mode with both networks
+        envsim_mode = "bot-debug"
+    else:
+        # run envsim in its normal mode with channels for both networks
+        envsim_mode = "hurdle"
+
+        comp_container_names = [COMPETITOR_NAME_BASE+"{}".format(i+1) for i in range(nodes_per_network, 2*nodes_per_network)]
+
+    # build list of expected bot container names
+    bot_container_names = [bot_name_base+"{}".format(i+1) for i in range(nodes_per_network)]
+
+    bot_tgen_names = [TGEN_NAME_BASE+"{}".format(i+1) for i in range(len(bot_container_names))]
+    comp_tgen_names = [TGEN_NAME_BASE+"{}".format(i+1+len(bot_container_names)) for i in range(len(comp_container_names))]
+
+    os.makedirs(args["output_dir"], exist_ok=True)
+
+    # Batch setup. Everything that doesn't depend on the run parameters is done once here
+    journal = open_run_journal(args, os.path.join(args["output_dir"], RUN_JOURNAL_FILENAME))
+    setup = StepScheduler("batch setup", journal)
+
+    setup.add_step("competitor_containers",
+                   lambda: configure_competitor_containers(lxd_client, args["image_file"], comp_container_names,
+                                                           nodes_per_network, args["clone_containers"])
+                   if not args["disable_competitor_containers"] else [],
+                   checkpoint=True, save=container_names,
+                   restore=lambda names: [lxd_client.containers.get(name) for name in names])
+    setup.add_step("bot_containers", lambda: get_bot_containers(lxd_client, bot_container_names))
+    setup.add_step("write_config_files",
+                   lambda: write_colosseum_config_ini_files(num_nodes=len(comp_container_names)+len(bot_container_names),
+                                                            envsim_port_base=ENVSIM_PORT_NUM_BASE,
+                                                            collab_server_ip=COLLAB_SERVER_IP,
+                                                            collab_server_port=COLLAB_SERVER_PORT,
+                                                            collab_client_port=COLLAB_CLIENT_PORT,
+                                                            collab_peer_port=COLLAB_PEER_PORT,
+                                                            samp_rate=args["sample_rate"],
+                                                            center_freq=1e9),
+                   checkpoint=True, restore=existing_config_files)
+    setup.add_step("install_config_files",
+                   lambda: install_colosseum_config_files(setup.results["bot_containers"],
+                                                          setup.results["competitor_containers"],
+                                                          setup.results["write_config_files"]),
+                   depends_on=["competitor_containers", "bot_containers", "write_config_files"],
+                   checkpoint=True)
+    setup.add_step("start_containers", lambda: control_containers("start", bot_name_base),
+                   depends_on=["install_config_files"])
+    setup.add_step("start_collab_server", lambda: handle_collab_server(action="start"))
+    setup.add_step("setup_routing", lambda: setup_routing(nodes_per_network), depends_on=["start_containers"])
+
+    try:
+        setup.run()
+    except StepFailed as err:
+        print("{}. Exiting".format(err))
+        setup.print_timings()
+        sys.exit(1)
+
+    bot_containers = setup.results["bot_containers"]
+    comp_containers = setup.results["competitor_containers"]
+
+    # score each run in the background while the next one is running
+    scoring_executor = ThreadPoolExecutor(max_workers=1)
+    scoring_jobs = []
+
+    for run_num, run_params in enumerate(runs):
+        run_dir = os.path.join(args["output_dir"], run_dir_name(run_num, run_params))
+        os.makedirs(run_dir, exist_ok=True)
+
+        run_args = dict(args)
+        run_args.update(run_params)
+
+        print("Starting run {} of {} with {}. Saving results to {}".format(run_num+1, len(runs), run_params, run_dir))
+
+        # start from a clean slate without restarting any containers
+        run_setup = StepScheduler("run {} setup".format(run_num))
+        run_setup.add_step("restart_finished_radios",
+                           lambda: restart_finished_radios(lxd_client, bot_containers+comp_containers))
+        run_setup.add_step("cleanup_bots", lambda: cleanup_bots(bot_containers),
+                           depends_on=["restart_finished_radios"])
+        run_setup.add_step("clear_traffic_logs", lambda: clear_traffic_logs(bot_tgen_names+comp_tgen_names))
+        run_setup.add_step("start_envsim",
+                           lambda: start_envsim(envsim_mode, run_args["sample_rate"], run_args["chan_gain_linear"],
+                                                run_args["noise_amp"], run_args["enable_debug_output"],
+                                                len(bot_container_names), len(comp_container_names)))
+        run_setup.add_step("poll_containers",
+                           lambda: poll_radio_api_for_start_with_timeout(bot_containers, comp_containers,
+                                                                         CONTAINER_BOOT_TIMEOUT),
+                           depends_on=["cleanup_bots", "start_envsim"])
+        run_setup.add_step("start_radios",
+                           lambda: run_radio_api_on_nodes(bot_containers+comp_containers,
+                                                          script=os.path.join(RADIO_API_PATH,"start.sh")),
+                           depends_on=["poll_containers"])
+        run_setup.add_step("start_traffic", lambda: start_traffic(run_args["duration"], run_args["packet_rate"],
+                                                                  nodes_per_network),
+                           depends_on=["start_radios", "clear_traffic_logs"])
+
+        try:
+            run_setup.run()
+        except StepFailed as err:
+            print("{}. Skipping run".format(err))
+            run_setup.print_timings()
+            stop_traffic(nodes_per_network)
+            run_radio_api_on_nodes(bot_containers+comp_containers, script=os.path.join(RADIO_API_PATH,"stop.sh"))
+            stop_envsim(envsim_mode, args["enable_debug_output"])
+            continue
+
+        # optionally follow the traffic logs while the hurdle runs
+        live_scorer = None
+        if args["live_scoring"]:
+            live_scorer = LiveScorer([lxd_client.containers.get(name) for name in bot_tgen_names],
+                                     [lxd_client.containers.get(name) for name in comp_tgen_names],
+                                     MGEN_LOG_PATH)
+
+        with span("wait_for_hurdle", run=run_num):
+            wait_for_hurdle(bot_containers, comp_containers, run_args, live_scorer,
+                            live_result_filename=os.path.join(run_dir, LIVE_RESULT_FILENAME),
+                            timeline_filename=os.path.join(run_dir, STATUS_TIMELINE_FILENAME))
+
+        # stop this run, leaving containers, routing and the collaboration server up
+        run_teardown = StepScheduler("run {} teardown".format(run_num))
+        run_teardown.add_step("stop_traffic", lambda: stop_traffic(nodes_per_network))
+        run_teardown.add_step("stop_radios",
+                              lambda: run_radio_api_on_nodes(bot_containers+comp_containers,
+                                                             script=os.path.join(RADIO_API_PATH,"stop.sh")),
+                              depends_on=["stop_traffic"])
+        run_teardown.add_step("stop_envsim", lambda: stop_envsim(envsim_mode, args["enable_debug_output"]),
+                              depends_on=["stop_radios"])
+        run_teardown.add_step("retrieve_traffic_logs",
+                              lambda: retrieve_traffic_logs(lxd_client, bot_container_names,
+                                                            comp_container_names, TGEN_NAME_BASE,
+                                                            run_dir, args["compress_logs"]),
+                              depends_on=["stop_traffic"])
+
+        try:
+            run_teardown.run()
+        except StepFailed as err:
+            print("{}. Continuing anyway".format(err))
+
+        with open(os.path.join(run_dir, STEP_TIMING_FILENAME), "w") as f:
+            json.dump({"setup":run_setup.timing_report(), "teardown":run_teardown.timing_report()}, f, indent=2)
+
+        if "retrieve_traffic_logs" in run_teardown.results:
+            bot_logfiles, comp_logfiles = run_teardown.results["retrieve_traffic_logs"]
+            scoring_args = dict(run_args, scoring_workers=args["background_scoring_workers"])
+            scoring_jobs.append((run_dir, run_params,
+                                 scoring_executor.submit(score_traffic_logs, bot_logfiles, comp_logfiles,
+                                                         scoring_args, run_dir)))
+
+    # Batch teardown
+    teardown = StepScheduler("batch teardown")
+    teardown.add_step("teardown_routing", lambda: teardown_routing(nodes_per_network))
+    teardown.add_step("stop_collab_server", lambda: handle_collab_server(action="stop"))
+
+    # remove status files from bots so they boot cleanly next time
+    teardown.add_step("cleanup_bots", lambda: cleanup_bots(bot_containers))
+    teardown.add_step("stop_containers", lambda: control_containers("stop", bot_name_base),
+                      depends_on=["teardown_routing", "cleanup_bots"])
+
+    try:
+        teardown.run()
+    except StepFailed as err:
+        print("{}. Continuing anyway".format(err))
+
+    # wait for the last runs to be scored
+    batch_summary = []
+    for run_dir, run_params, job in scoring_jobs:
+        try:
+            job.result()
+        except Exception as err:
+            print("Scoring {} failed: {}".format(run_dir, err))
+
+        batch_summary.append(summarize_run(run_dir, run_params))
+
+    scoring_executor.shutdown()
+
+    summary_filename = os.path.join(args["output_dir"], BATCH_SUMMARY_FILENAME)
+    with open(summary_filename, "w") as f:
+        json.dump(batch_summary, f, indent=2)
+
+    setup.print_timings()
+    teardown.print_timings()
+    print("Finished {} of {} runs. Summary saved to {}".format(len(batch_summary), len(runs), summary_filename))
+
+    # combine the traces of this script and every script it ran
+    if args["trace_dir"] is not None:
+        write_trace()
+        print("Saved trace to {}".format(merge_traces(args["trace_dir"],
+                                                      os.path.join(args["output_dir"], TRACE_FILENAME))))
+
+    # optionally clear out competitor containers at the end of the batch
+    if args["clean_competitor_containers"]:
+        cmd = ["lxc", "rm",] + comp_container_names
+        run_subproc_and_print_output(cmd)
+
+        # the containers are gone, so the next batch has to create them again
+        journal.forget("competitor_containers")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from collections import OrderedDict
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class RunJournal(object):
+    '''
+    Record of which steps of a run have finished and what they returned, saved to a JSON file
+    every time a step finishes, so a later run with the same parameters can skip them.
+
+    The journal remembers the run parameters it was written with. Loading a journal written
+    with different parameters, or one that can't be read, starts from an empty journal.
+    '''
+    def __init__(self, file_name, params, resume=False):
+        self.file_name = file_name
+
+        # round trip through JSON so params compare equal to what is loaded back from disk
+        self.params = json.loads(json.dumps(params))
+
+        # {"result":saved result, "time":completion time} of each finished step, by step name
+        self.steps = OrderedDict()
+        self.lock = threading.Lock()
+
+        if resume:
+            self.load()
+
+        self.save()
+
+    def load(self):
+        '''
+        Read back the finished steps of an earlier run
+        '''
+        try:
+            with open(self.file_name, "r") as f:
+                journal = json.load(f)
+        except (OSError, ValueError) as err:
+            print("No usable run journal in {}, starting from scratch: {}".format(self.file_name, err))
+            return
+
+        if journal.get("params") != self.params:
+            print("Run journal {} was written for different run parameters, starting from scratch".format(self.file_name))
+            return
+
+        self.steps = OrderedDict(journal.get("steps", []))
+        print("Resuming from run journal {}. Finished steps: {}".format(self.file_name, list(self.steps)))
+
+    def save(self):
+        '''
+        Write the journal out, replacing the old file in one step so a crash part way through
+        can't leave a corrupt journal behind
+        '''
+        with self.lock:
+            journal = {"params":self.params, "steps":list(self.steps.items())}
+
+            fd, temp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.file_name)),
+                                             prefix=".", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(journal, f, indent=2)
+                os.replace(temp_name, self.file_name)
+            except BaseException:
+                os.unlink(temp_name)
+                raise
+
+    def completed(self, name):
+        return name in self.steps
+
+    def result(self, name):
+        return self.steps[name]["result"]
+
+    def record(self, name, result):
+        '''
+        Mark a step as finished. result must be JSON serializable
+        '''
+        with self.lock:
+            self.steps[name] = {"result":result, "time":time.time()}
+        self.save()
+
+    def forget(self, name):
+        '''
+        Mark a step as not finished, so it runs again on the next resume
+        '''
+        with self.lock:
+            removed = self.steps.pop(name, None) is not None
+        if removed:
+            self.save()
@@ -0,0 +1,149 @@
+import atexit
+from contextlib import contextmanager
+import glob
+import json
+import os
+import subprocess
+import threading
+import time
+
+
+# when set, every script that calls enable_tracing_from_env records a trace into this directory.
+# enable_tracing sets it so scripts started as subprocesses trace into the same place.
+TRACE_DIR_ENV_VAR = "HURDLE_TRACE_DIR"
+
+# identifies the traces written by one run of a script and its subprocesses, so traces left in
+# the trace directory by earlier runs aren't merged in with them
+TRACE_RUN_ID_ENV_VAR = "HURDLE_TRACE_RUN_ID"
+
+# per process traces are written as trace_<run id>_<process name>_<pid>.json
+TRACE_FILE_PATTERN = "trace_{}_{}_{}.json"
+
+US_PER_SEC = 1000000
+
+_trace_dir = None
+_run_id = None
+_process_name = None
+_events = []
+_events_lock = threading.Lock()
+
+
+def new_run_id():
+    '''
+    Make a run id from the current time and process ID. Run ids never contain underscores, so
+    they can't be confused with the rest of a trace file name.
+    '''
+    return "{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid())
+
+
+def enable_tracing(trace_dir, process_name, run_id=None):
+    '''
+    Start recording spans for this process, to be written to trace_dir on exit, and have any
+    subprocesses started from here on trace into trace_dir too, under the same run id. A new run
+    id is made if none is given.
+    '''
+    global _trace_dir, _run_id, _process_name
+
+    if run_id is None:
+        run_id = new_run_id()
+
+    os.makedirs(trace_dir, exist_ok=True)
+    os.environ[TRACE_DIR_ENV_VAR] = os.path.abspath(trace_dir)
+    os.environ[TRACE_RUN_ID_ENV_VAR] = run_id
+
+    if _trace_dir is None:
+        atexit.register(write_trace)
+
+    _trace_dir = os.path.abspath(trace_dir)
+    _run_id = run_id
+    _process_name = process_name
+
+
+def enable_tracing_from_env(process_name):
+    '''
+    Start recording spans if a parent process asked for a trace
+    '''
+    trace_dir = os.environ.get(TRACE_DIR_ENV_VAR)
+    if trace_dir:
+        enable_tracing(trace_dir, process_name, os.environ.get(TRACE_RUN_ID_ENV_VAR))
+
+
+def tracing_enabled():
+    return _trace_dir is not None
+
+
+@contextmanager
+def span(name, category="phase", **args):
+    '''
+    Record the time spent in the body of the with statement as a Chrome trace complete event.
+    Extra keyword args are saved with the event. Does nothing unless tracing is enabled.
+    '''
+    if _trace_dir is None:
+        yield
+        return
+
+    start_time = time.time()
+    try:
+        yield
+    finally:
+        event = {"name":name,
+                 "cat":category,
+                 "ph":"X",
+                 "ts":int(start_time*US_PER_SEC),
+                 "dur":int((time.time() - start_time)*US_PER_SEC),
+                 "pid":os.getpid(),
+                 "tid":threading.get_ident(),
+                 "args":args}
+
+        with _events_lock:
+            _events.append(event)
+
+
+def traced_run(cmd, **kwargs):
+    '''
+    subprocess.run, recorded as a span named after the command
+    '''
+    with span(os.path.basename(cmd[0]) if cmd[0] != "lxc" else " ".join(cmd[:2]),
+              category="subprocess", cmd=" ".join(cmd)):
+        return subprocess.run(cmd, **kwargs)
+
+
+def write_trace():
+    '''
+    Write out the spans recorded so far by this process
+    '''
+    if _trace_dir is None:
+        return
+
+    with _events_lock:
+        events = list(_events)
+
+    metadata = [{"name":"process_name", "ph":"M", "pid":os.getpid(),
+                 "args":{"name":"{} ({})".format(_process_name, os.getpid())}}]
+
+    file_name = os.path.join(_trace_dir, TRACE_FILE_PATTERN.format(_run_id, _process_name, os.getpid()))
+    with open(file_name, "w") as f:
+        json.dump({"traceEvents":metadata + events}, f)
+
+
+def merge_traces(trace_dir, output_file, run_id=None):
+    '''
+    Combine the per process traces of one run in trace_dir into a single Chrome trace in
+    output_file, which can be opened in chrome://tracing or Perfetto. Defaults to the run this
+    process is tracing.
+    '''
+    if run_id is None:
+        run_id = _run_id
+
+    all_events = []
+    for file_name in sorted(glob.glob(os.path.join(trace_dir, TRACE_FILE_PATTERN.format(run_id, "*", "*")))):
+        try:
+            with open(file_name, "r") as f:
+                all_events.extend(json.load(f)["traceEvents"])
+        except (OSError, ValueError, KeyError) as err:
+            print("Could not read trace {}: {}".format(file_name, err))
+
+    with open(output_file, "w") as f:
+        json.dump({"traceEvents":all_events, "displayTimeUnit":"ms"}, f)
+
+    return output_file
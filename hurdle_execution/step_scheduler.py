@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+import concurrent.futures
+import logging
+import time
+
+from run_trace import span
+
+
+logger = logging.getLogger(__name__)
+
+
+class StepFailed(Exception):
+    '''
+    Raised by a step to stop the run, or by StepScheduler.run when a step failed
+    '''
+    pass
+
+
+class StepScheduler(object):
+    '''
+    Run a set of named steps, each starting as soon as every step it depends on has finished,
+    so steps that don't depend on each other run at the same time. The start and end time of
+    every step are recorded.
+
+    If a run_journal.RunJournal is given, the results of checkpointed steps are saved to it, and
+    checkpointed steps that finished in an earlier run are skipped with their saved result
+    restored instead, unless a checkpointed step they depend on had to run again.
+    '''
+    def __init__(self, name="run", journal=None):
+        self.name = name
+        self.journal = journal
+        self.steps = OrderedDict()
+
+        # (save, restore) functions of each checkpointed step, indexed by step name
+        self.checkpoints = {}
+
+        # checkpointed steps that ran this time, along with every step depending on one of them
+        self.rerun = set()
+
+        # return value of each step that has finished, indexed by step name
+        self.results = {}
+
+        # (start time, end time) of each step that has run, indexed by step name
+        self.timings = OrderedDict()
+
+    def add_step(self, name, func, depends_on=(), checkpoint=False, save=None, restore=None):
+        '''
+        Add a step that calls func with no arguments once all of the steps named in depends_on
+        have finished.
+
+        Set checkpoint for steps worth skipping when resuming. save converts the step's result to
+        something JSON serializable for the journal, and restore converts it back, raising if
+        whatever the step set up is gone. Both default to passing the result through unchanged.
+        '''
+        if name in self.steps:
+            raise ValueError("Step {} already added".format(name))
+
+        for dependency in depends_on:
+            if dependency not in self.steps:
+                raise ValueError("Step {} depends on unknown step {}".format(name, dependency))
+
+        self.steps[name] = (func, tuple(depends_on))
+
+        if checkpoint:
+            self.checkpoints[name] = (save or (lambda result: result),
+                                      restore or (lambda result: result))
+
+    def timed_call(self, name, func):
+        '''
+        Call func, recording when it started and ended under name
+        '''
+        start_time = time.time()
+        try:
+            with span(name, category="step", scheduler=self.name):
+                return self.call_step(name, func)
+        finally:
+            self.timings[name] = (start_time, time.time())
+
+    def call_step(self, name, func):
+        '''
+        Call func for the step, unless it is checkpointed and its result can be restored from the
+        journal
+        '''
+        depends_on = self.steps[name][1]
+        dependency_rerun = any(dependency in self.rerun for dependency in depends_on)
+
+        if self.journal is None or name not in self.checkpoints:
+            if dependency_rerun:
+                self.rerun.add(name)
+            return func()
+
+        save, restore = self.checkpoints[name]
+        if self.journal.completed(name) and not dependency_rerun:
+            try:
+                result = restore(self.journal.result(name))
+                print("[{}] step {} finished in an earlier run, skipping".format(self.name, name))
+                return result
+            except Exception as err:
+                print("[{}] could not restore step {} from the journal, running it again: {}".format(self.name, name, err))
+
+        self.rerun.add(name)
+        self.journal.forget(name)
+        result = func()
+        self.journal.record(name, save(result))
+        return result
+
+    def run(self, max_workers=None):
+        '''
+        Run every step that hasn't run yet. If a step raises, steps that are already running are
+        allowed to finish but no new steps are started, and StepFailed is raised.
+        '''
+        pending = OrderedDict((name, step) for name, step in self.steps.items()
+                              if name not in self.results)
+        running = {}
+        failures = []
+
+        with ThreadPoolExecutor(max_workers=max_workers or max(1, len(pending))) as executor:
+            while True:
+                # start everything whose dependencies are done
+                if len(failures) == 0:
+                    for name, (func, depends_on) in list(pending.items()):
+                        if all(dependency in self.results for dependency in depends_on):
+                            print("[{}] starting step {}".format(self.name, name))
+                            running[executor.submit(self.timed_call, name, func)] = name
+                            del pending[name]
+
+                if len(running) == 0:
+                    break
+
+                done, _ = concurrent.futures.wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    start_time, end_time = self.timings[name]
+                    try:
+                        self.results[name] = future.result()
+                        print("[{}] finished step {} in {:.2f} s".format(self.name, name, end_time-start_time))
+                    except BaseException as err:
+                        print("[{}] step {} failed after {:.2f} s: {}".format(self.name, name, end_time-start_time, err))
+                        failures.append((name, err))
+
+        if len(failures) > 0:
+            raise StepFailed("{} step(s) failed: {}".format(len(failures), [name for name, _ in failures]))
+
+        if len(pending) > 0:
+            raise StepFailed("Steps {} could never start".format(list(pending)))
+
+    def timing_report(self):
+        '''
+        Get the timing of every step that has run, in the order they started, as a list of
+        dictionaries with the step name and its start time, end time and duration in seconds
+        '''
+        report = [{"step":name, "start":start_time, "end":end_time, "duration":end_time-start_time}
+                  for name, (start_time, end_time) in self.timings.items()]
+        return sorted(report, key=lambda step: step["start"])
+
+    def print_timings(self):
+        '''
+        Print how long each step took, relative to when the first step started
+        '''
+        report = self.timing_report()
+        if len(report) == 0:
+            return
+
+        first_start = report[0]["start"]
+        last_end = max(step["end"] for step in report)
+        print("[{}] step timings:".format(self.name))
+        for step in report:
+            print("  {:<28} start {:>8.2f} s  duration {:>8.2f} s".format(step["step"],
+                                                                         step["start"]-first_start,
+                                                                         step["duration"]))
+        print("  {:<28} {:>8.2f} s wall time".format("total", last_end-first_start))
@@ -0,0 +1,91 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from container_files import pull_file
+
+
+class FakeResponse(object):
+    '''
+    Stands in for a streamed requests response from the LXD files endpoint
+    '''
+    def __init__(self, status_code, chunks, fail_after=None):
+        self.status_code = status_code
+        self.chunks = chunks
+        self.fail_after = fail_after
+        self.text = "not found\n"
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise IOError("connection reset")
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeNode(object):
+    '''
+    Stands in for the pylxd API nodes of a container, down to its files endpoint
+    '''
+    def __init__(self, response):
+        self.response = response
+        self.files = self
+
+    def get(self, params, stream):
+        self.params = params
+        self.stream = stream
+        return self.response
+
+
+class FakeContainer(object):
+
+    def __init__(self, response):
+        self.name = "tgen1"
+        self.api = FakeNode(response)
+
+
+class PullFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.destination = os.path.join(self.temp_dir, "mgen_traffic_log.drc")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_streamed(self):
+        '''
+        Test the file is written out chunk by chunk from a streamed response
+        '''
+        container = FakeContainer(FakeResponse(200, [b"abc", b"def", b"g"]))
+
+        size = pull_file(container, "/home/mgen/mgen_traffic_log.drc", self.destination)
+
+        self.assertEqual(size, 7)
+        self.assertTrue(container.api.stream)
+        self.assertEqual(container.api.params, {"path":"/home/mgen/mgen_traffic_log.drc"})
+        self.assertTrue(container.api.response.closed)
+        with open(self.destination, "rb") as f:
+            self.assertEqual(f.read(), b"abcdefg")
+
+    def test_errors(self):
+        '''
+        Test a missing file raises, and a transfer cut off partway leaves no partial copy behind
+        '''
+        with self.assertRaises(RuntimeError):
+            pull_file(FakeContainer(FakeResponse(404, [])), "/missing", self.destination)
+
+        container = FakeContainer(FakeResponse(200, [b"abc", b"def"], fail_after=1))
+        with self.assertRaises(IOError):
+            pull_file(container, "/home/mgen/mgen_traffic_log.drc", self.destination)
+
+        self.assertFalse(os.path.exists(self.destination))
+        self.assertTrue(container.api.response.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from live_scoring import LiveScorer
+from mgen_benchmark import write_synthetic_mgen_log
+
+
+class FakeContainer(object):
+    '''
+    Stands in for a pylxd container, answering tail commands from a local file
+    '''
+    def __init__(self, name, local_path):
+        self.name = name
+        self.local_path = local_path
+
+    def execute(self, cmd):
+        if not os.path.exists(self.local_path):
+            return 1, "", "tail: cannot open '{}'".format(cmd[-1])
+
+        with open(self.local_path, "rb") as f:
+            f.seek(int(cmd[2]) - 1)
+            return 0, f.read().decode("utf-8"), ""
+
+
+class HungContainer(object):
+    '''
+    Stands in for a pylxd container that never answers
+    '''
+    def __init__(self, name):
+        self.name = name
+        self.release = threading.Event()
+
+    def execute(self, cmd):
+        self.release.wait()
+        return 0, "", ""
+
+
+class LiveScorerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_incremental_update(self):
+        '''
+        Test logs are picked up as they grow, holding on to lines MGEN hasn't finished writing
+        '''
+        full_log = os.path.join(self.temp_dir, "full.drc")
+        write_synthetic_mgen_log(full_log, 100)
+        with open(full_log, "rb") as f:
+            data = f.read()
+
+        log = os.path.join(self.temp_dir, "mgen_traffic_log.drc")
+        scorer = LiveScorer([FakeContainer("tgen1", log)], [], "/home/mgen/mgen_traffic_log.drc")
+
+        # nothing to read before MGEN starts
+        scorer.update()
+        self.assertEqual(scorer.score(100)["bots"]["total"], 0)
+
+        # stop partway through a line, then finish the log
+        with open(log, "wb") as f:
+            f.write(data[:len(data)//2])
+        scorer.update()
+        first_total = scorer.score(100)["bots"]["total"]
+
+        with open(log, "wb") as f:
+            f.write(data)
+        scorer.update()
+        total_score = scorer.score(100)
+
+        self.assertTrue(0 < first_total < 100)
+        self.assertEqual(total_score["bots"]["total"], 100)
+        self.assertEqual(total_score["parse_stats"]["tgen1"]["num_malformed_lines"], 0)
+
+    def test_hung_container(self):
+        '''
+        Test a traffic generator that doesn't answer can't hold up reading the others
+        '''
+        log = os.path.join(self.temp_dir, "mgen_traffic_log.drc")
+        write_synthetic_mgen_log(log, 100)
+
+        hung = HungContainer("tgen2")
+        scorer = LiveScorer([FakeContainer("tgen1", log)], [hung], "/home/mgen/mgen_traffic_log.drc",
+                            timeout=0.2)
+        try:
+            scorer.update()
+        finally:
+            hung.release.set()
+
+        total_score = scorer.score(100)
+        self.assertEqual(total_score["bots"]["total"], 100)
+        self.assertEqual(total_score["competitors"]["total"], 0)
+        self.assertEqual(scorer.comp_tails[0].offset, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import mgen_cache
+from file_hash import file_sha256
+from mgen_benchmark import write_synthetic_mgen_log
+from mgen_cache import CACHE_DATA_SUFFIX
+from mgen_cache import CACHE_KEY_SUFFIX
+from mgen_cache import cached_parse_mgen_columns
+from mgen_cache import read_cache_key
+
+
+class CachedParseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, "mgen_traffic_log.drc")
+        write_synthetic_mgen_log(self.file_name, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def parse(self, **kwargs):
+        '''
+        Parse the log through the cache, returning the records and whether the log was parsed
+        rather than loaded from the cache
+        '''
+        with mock.patch.object(mgen_cache, "parse_mgen_columns",
+                               wraps=mgen_cache.parse_mgen_columns) as parse:
+            records, _ = cached_parse_mgen_columns(self.file_name, **kwargs)
+
+        return records, parse.called
+
+    def rewrite(self, old, new):
+        '''
+        Replace old with new in the log, moving its modification time on
+        '''
+        stat = os.stat(self.file_name)
+        with open(self.file_name, "r") as f:
+            data = f.read()
+        with open(self.file_name, "w") as f:
+            f.write(data.replace(old, new, 1))
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_reused(self):
+        '''
+        Test an unchanged log is loaded from the cache, read-only, with the same contents
+        '''
+        records, parsed = self.parse()
+        self.assertTrue(parsed)
+
+        cached_records, parsed = self.parse()
+        self.assertFalse(parsed)
+        self.assertFalse(cached_records.flags.writeable)
+        self.assertEqual(cached_records.tolist(), records.tolist())
+        self.assertEqual(read_cache_key(self.file_name)["sha256"], file_sha256(self.file_name))
+
+    def test_appended(self):
+        '''
+        Test a log that grew is parsed again
+        '''
+        self.parse()
+        write_synthetic_mgen_log(self.file_name, 120)
+
+        records, parsed = self.parse()
+        self.assertTrue(parsed)
+        self.assertEqual(len(records), 120)
+
+    def test_same_size_edit(self):
+        '''
+        Test a log changed in place without changing size is caught by its hash
+        '''
+        self.parse()
+        self.rewrite("seq>1 ", "seq>9 ")
+
+        records, parsed = self.parse()
+        self.assertTrue(parsed)
+        self.assertEqual(int(records[2]["seq_num"]), 9)
+
+    def test_touched(self):
+        '''
+        Test a log with a new modification time but the same contents, for example because it
+        was copied, is still loaded from the cache and the stored modification time is refreshed
+        '''
+        self.parse()
+        self.rewrite("seq>1 ", "seq>1 ")
+
+        _, parsed = self.parse()
+        self.assertFalse(parsed)
+        self.assertEqual(read_cache_key(self.file_name)["mtime_ns"], os.stat(self.file_name).st_mtime_ns)
+
+        _, parsed = self.parse()
+        self.assertFalse(parsed)
+
+    def test_format_changed(self):
+        '''
+        Test caches written by another cache format version are ignored
+        '''
+        self.parse()
+
+        with mock.patch.object(mgen_cache, "CACHE_FORMAT_VERSION", mgen_cache.CACHE_FORMAT_VERSION + 1):
+            _, parsed = self.parse()
+
+        self.assertTrue(parsed)
+
+    def test_corrupt_key(self):
+        '''
+        Test an unreadable cache key is treated as no cache at all
+        '''
+        self.parse()
+        with open(self.file_name + CACHE_KEY_SUFFIX, "w") as f:
+            f.write("{")
+
+        _, parsed = self.parse()
+        self.assertTrue(parsed)
+
+        with open(self.file_name + CACHE_KEY_SUFFIX, "r") as f:
+            self.assertIn("sha256", json.load(f))
+
+    def test_disabled(self):
+        '''
+        Test nothing is read from or written to the cache when it is disabled
+        '''
+        _, parsed = self.parse(use_cache=False)
+
+        self.assertTrue(parsed)
+        self.assertFalse(os.path.exists(self.file_name + CACHE_DATA_SUFFIX))
+        self.assertFalse(os.path.exists(self.file_name + CACHE_KEY_SUFFIX))
+
+
+class FileSha256Test(unittest.TestCase):
+
+    def test_matches_hashlib(self):
+        '''
+        Test hashing a file in blocks gives the same digest as hashing it all at once
+        '''
+        data = os.urandom(3*1000*1000)
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+
+            self.assertEqual(file_sha256(f.name), hashlib.sha256(data).hexdigest())
+
+
+if __name__ == "__main__":
+    unittest.main()
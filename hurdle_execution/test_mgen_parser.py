@@ -0,0 +1,164 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import mgen_parser
+from mgen_benchmark import write_synthetic_mgen_log
+from mgen_parser import NS_PER_SEC
+from mgen_parser import format_packed_ip
+from mgen_parser import iter_mgen_records
+from mgen_parser import new_parse_stats
+from mgen_parser import parse_mgen_columns
+
+
+HEADER = "MGEN log version 5.02\n00:00:00.000000 START Mgen Version 5.02c\n"
+
+RECV_LINE = ("00:00:01.{micros:06d} RECV proto>UDP flow>{flow} seq>{seq} src>192.168.102.2/5001 "
+             "dst>192.168.101.2/5001 sent>00:00:01.000000 size>{size} gps>INVALID,999.000000,999.000000,-999")
+
+
+def recv_line(seq, flow=1, size=200):
+    return RECV_LINE.format(micros=seq % 1000000, flow=flow, seq=seq, size=size)
+
+
+class MgenParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_log(self, contents, name="mgen_traffic_log.drc"):
+        file_name = os.path.join(self.temp_dir, name)
+        with open(file_name, "wb") as f:
+            f.write(contents.encode())
+        return file_name
+
+    def assertParsersAgree(self, file_name):
+        '''
+        Check the streaming and columnar parsers return the same records and parse statistics
+        '''
+        serial_stats = new_parse_stats()
+        serial_records = list(iter_mgen_records(file_name, serial_stats))
+        records, stats = parse_mgen_columns(file_name)
+
+        self.assertEqual(stats, serial_stats)
+        self.assertEqual(len(records), len(serial_records))
+        for record, serial_record in zip(records, serial_records):
+            self.assertEqual(record["time_recv"], round(serial_record.time_recv*NS_PER_SEC))
+            self.assertEqual(record["time_sent"], round(serial_record.time_sent*NS_PER_SEC))
+            self.assertEqual(record["flowid"], serial_record.flowid)
+            self.assertEqual(record["seq_num"], serial_record.seq_num)
+            self.assertEqual(format_packed_ip(record["ip_src"]), serial_record.ip_src.split("/")[0])
+            self.assertEqual(format_packed_ip(record["ip_dst"]), serial_record.ip_dst.split("/")[0])
+            self.assertEqual(record["size"], serial_record.size)
+
+        return records, stats
+
+    def test_synthetic_log(self):
+        '''
+        Test both parsers agree on a well formed log whose timestamps wrap around midnight
+        '''
+        file_name = os.path.join(self.temp_dir, "synthetic.drc")
+        write_synthetic_mgen_log(file_name, 30000)
+
+        records, stats = self.assertParsersAgree(file_name)
+        self.assertEqual(len(records), 30000)
+        self.assertEqual(stats["num_malformed_lines"], 0)
+        self.assertTrue((records["time_sent"][1:] >= records["time_sent"][:-1]).all())
+
+    def test_crlf_line_endings(self):
+        '''
+        Test RECV lines ending in CRLF are parsed by both parsers
+        '''
+        file_name = self.write_log((HEADER + recv_line(3) + "\n" + recv_line(4) + "\n").replace("\n", "\r\n"))
+
+        records, stats = self.assertParsersAgree(file_name)
+        self.assertEqual(list(records["seq_num"]), [3, 4])
+        self.assertEqual(stats["num_malformed_lines"], 0)
+
+    def test_out_of_range_values(self):
+        '''
+        Test integers too big for the record fields are counted as malformed rather than wrapping
+        '''
+        lines = [recv_line(1),
+                 recv_line(4294967295),
+                 recv_line(4294967296),
+                 recv_line(2, flow=2147483648),
+                 recv_line(3, size=9999999999)]
+        file_name = self.write_log(HEADER + "\n".join(lines) + "\n")
+
+        records, stats = self.assertParsersAgree(file_name)
+        self.assertEqual(list(records["seq_num"]), [1, 4294967295])
+        self.assertEqual(stats["num_malformed_lines"], 3)
+        self.assertEqual([line_number for line_number, _ in stats["malformed_samples"]], [4, 5, 6])
+
+    def test_malformed_and_truncated_lines(self):
+        '''
+        Test malformed lines are skipped and counted, and a log cut off mid line is flagged
+        '''
+        lines = [recv_line(1),
+                 "12:3 RECV proto>UDP flow>1 seq>x",
+                 "garbage line",
+                 recv_line(2),
+                 recv_line(3)[:60]]
+        file_name = self.write_log(HEADER + "\n".join(lines))
+
+        records, stats = self.assertParsersAgree(file_name)
+        self.assertEqual(list(records["seq_num"]), [1, 2])
+        self.assertEqual(stats["num_lines"], 5)
+        self.assertEqual(stats["num_malformed_lines"], 2)
+        self.assertTrue(stats["truncated_last_line"])
+
+    def test_empty_and_header_only_logs(self):
+        '''
+        Test logs without any RECV lines parse to no records
+        '''
+        for contents in ("", "MGEN log version 5.02\n", HEADER):
+            records, stats = self.assertParsersAgree(self.write_log(contents))
+            self.assertEqual(len(records), 0)
+            self.assertEqual(stats["num_lines"], 0)
+
+    def test_chunk_boundaries(self):
+        '''
+        Test the columnar parser gives the same result however the log is split into blocks,
+        including blocks shorter than a line
+        '''
+        lines = []
+        for i in range(300):
+            lines.append(recv_line(i) if i % 37 else "junk RECV line {}".format(i))
+        file_name = self.write_log(HEADER + "\r\n".join(lines) + "\r\n" + recv_line(300)[:80])
+
+        expected_records, expected_stats = parse_mgen_columns(file_name)
+        self.assertEqual(expected_stats["num_malformed_lines"], 10)
+        self.assertTrue(expected_stats["truncated_last_line"])
+
+        for chunk_bytes in (1, 7, 100, 151, 4096):
+            with mock.patch.object(mgen_parser, "PARSE_CHUNK_BYTES", chunk_bytes):
+                records, stats = parse_mgen_columns(file_name)
+
+            self.assertEqual(records.tobytes(), expected_records.tobytes(), msg=chunk_bytes)
+            self.assertEqual(stats, expected_stats, msg=chunk_bytes)
+
+    def test_compressed_log(self):
+        '''
+        Test gzip compressed logs parse to the same records as uncompressed ones
+        '''
+        file_name = os.path.join(self.temp_dir, "synthetic.drc")
+        write_synthetic_mgen_log(file_name, 1000)
+        with open(file_name, "rb") as f, gzip.open(file_name + ".gz", "wb") as compressed:
+            compressed.write(f.read())
+
+        records, stats = parse_mgen_columns(file_name)
+        compressed_records, compressed_stats = self.assertParsersAgree(file_name + ".gz")
+
+        self.assertEqual(compressed_records.tobytes(), records.tobytes())
+        self.assertEqual(compressed_stats, stats)
+
+
+if __name__ == "__main__":
+    unittest.main()
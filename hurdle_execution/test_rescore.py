@@ -0,0 +1,102 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+from constants import PACKET_SUCCESS_THRESHOLD
+from mgen_benchmark import write_synthetic_mgen_log
+from rescore import TRAFFIC_LOG_SUFFIX
+from rescore import score_runs
+from rescore import score_table_row
+
+
+def total_score(num_packets, bot_packets, comp_packets):
+    return {"input_packets_per_network":num_packets,
+            "bots":{"total":bot_packets},
+            "competitors":{"total":comp_packets},
+            "parse_stats":{"a.drc":{"num_malformed_lines":2},
+                           "b.drc":{"num_malformed_lines":1}}}
+
+
+class ScoreTableRowTest(unittest.TestCase):
+
+    def test_row(self):
+        '''
+        Test a scored run is flattened into packet counts, success rates and pass/fail
+        '''
+        row = score_table_row("run1", total_score(1000, 1000, 0))
+
+        self.assertEqual(row["run"], "run1")
+        self.assertEqual(row["num_packets"], 1000)
+        self.assertEqual(row["bot_packets"], 1000)
+        self.assertEqual(row["bot_success_rate"], 1.0)
+        self.assertEqual(row["bot_pass"], 1.0 >= PACKET_SUCCESS_THRESHOLD)
+        self.assertEqual(row["competitor_success_rate"], 0.0)
+        self.assertFalse(row["competitor_pass"])
+        self.assertEqual(row["num_malformed_lines"], 3)
+
+    def test_no_packets_expected(self):
+        '''
+        Test runs that weren't expected to send any packets get empty success rates
+        '''
+        row = score_table_row("run1", total_score(0, 10, 0))
+
+        self.assertEqual(row["bot_packets"], 10)
+        self.assertIsNone(row["bot_success_rate"])
+        self.assertIsNone(row["bot_pass"])
+        self.assertIsNone(row["competitor_success_rate"])
+        self.assertIsNone(row["competitor_pass"])
+
+    def test_failed_run(self):
+        '''
+        Test runs that couldn't be scored only report their errors
+        '''
+        row = score_table_row("run1", {"failed_logs":{"/a/b/tgen1.drc.gz":"EOFError: truncated"}})
+
+        self.assertEqual(row, {"run":"run1", "error":"tgen1.drc.gz: EOFError: truncated"})
+
+
+class ScoreRunsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_log(self, run_name, node_name, num_lines=100, truncate_gz=False):
+        run_dir = os.path.join(self.temp_dir, run_name)
+        os.makedirs(run_dir, exist_ok=True)
+
+        log_name = os.path.join(run_dir, node_name + TRAFFIC_LOG_SUFFIX)
+        write_synthetic_mgen_log(log_name, num_lines)
+
+        if truncate_gz:
+            with open(log_name, "rb") as f:
+                compressed = gzip.compress(f.read())
+            os.remove(log_name)
+            log_name += ".gz"
+            with open(log_name, "wb") as f:
+                f.write(compressed[:len(compressed)//2])
+
+        return run_dir, log_name
+
+    def test_bad_log_fails_only_its_run(self):
+        '''
+        Test a log that can't be read marks its run as failed without stopping the other runs
+        from being scored
+        '''
+        good_dir, good_log = self.write_log("good", "darpa-practice-srn1", num_lines=100)
+        bad_dir, bad_log = self.write_log("bad", "darpa-practice-srn1", num_lines=10000, truncate_gz=True)
+
+        scores = score_runs({good_dir:([good_log], []), bad_dir:([bad_log], [])},
+                            default_num_packets=200, use_cache=False, num_workers=1)
+
+        self.assertEqual(scores[good_dir]["bots"]["total"], 100)
+        self.assertEqual(list(scores[bad_dir]["failed_logs"]), [bad_log])
+        self.assertIn("EOFError", scores[bad_dir]["failed_logs"][bad_log])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import json
+import os
+import tempfile
+import unittest
+
+from constants import RESULT_FILENAME
+
+try:
+    import run_hurdle_batch
+except ImportError:
+    # needs pylxd, which is only installed on hurdle hosts
+    run_hurdle_batch = None
+
+
+@unittest.skipIf(run_hurdle_batch is None, "pylxd is not installed")
+class SummarizeRunTest(unittest.TestCase):
+
+    def summarize(self, total_score):
+        with tempfile.TemporaryDirectory() as run_dir:
+            with open(os.path.join(run_dir, RESULT_FILENAME), "w") as f:
+                json.dump(total_score, f)
+
+            return run_hurdle_batch.summarize_run(run_dir, {"packet_rate":15.0})
+
+    def test_success_rates(self):
+        '''
+        Test the summary holds the run parameters and the success rate of each network
+        '''
+        summary = self.summarize({"input_packets_per_network":200,
+                                  "bots":{"total":50},
+                                  "competitors":{"total":200}})
+
+        self.assertEqual(summary["packet_rate"], 15.0)
+        self.assertEqual(summary["bots_packet_success_rate"], 0.25)
+        self.assertEqual(summary["competitors_packet_success_rate"], 1.0)
+
+    def test_no_packets_expected(self):
+        '''
+        Test runs that weren't expected to send any packets have no success rates
+        '''
+        summary = self.summarize({"input_packets_per_network":0,
+                                  "bots":{"total":50},
+                                  "competitors":{"total":0}})
+
+        self.assertIsNone(summary["bots_packet_success_rate"])
+        self.assertIsNone(summary["competitors_packet_success_rate"])
+
+
+if __name__ == "__main__":
+    unittest.main()
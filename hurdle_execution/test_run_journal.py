@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from run_journal import RunJournal
+from step_scheduler import StepScheduler
+
+
+PARAMS = {"bot_mode":"practice", "image_file":"competitor.tar.gz", "nodes_per_network":3}
+
+
+class RunJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, "run_journal.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_resume(self):
+        '''
+        Test finished steps and their results are read back when resuming
+        '''
+        journal = RunJournal(self.file_name, PARAMS)
+        journal.record("containers", ["comp1", "comp2"])
+        journal.record("routing", None)
+
+        resumed = RunJournal(self.file_name, dict(PARAMS), resume=True)
+
+        self.assertTrue(resumed.completed("containers"))
+        self.assertTrue(resumed.completed("routing"))
+        self.assertEqual(resumed.result("containers"), ["comp1", "comp2"])
+        self.assertEqual(list(resumed.steps), ["containers", "routing"])
+
+    def test_no_resume(self):
+        '''
+        Test a journal that isn't resumed starts empty and replaces the old one on disk
+        '''
+        RunJournal(self.file_name, PARAMS).record("containers", ["comp1"])
+
+        journal = RunJournal(self.file_name, PARAMS)
+        self.assertFalse(journal.completed("containers"))
+
+        with open(self.file_name, "r") as f:
+            self.assertEqual(json.load(f)["steps"], [])
+
+    def test_different_params(self):
+        '''
+        Test a journal written for different run parameters isn't resumed from
+        '''
+        RunJournal(self.file_name, PARAMS).record("containers", ["comp1"])
+
+        journal = RunJournal(self.file_name, dict(PARAMS, nodes_per_network=4), resume=True)
+        self.assertFalse(journal.completed("containers"))
+
+    def test_unreadable(self):
+        '''
+        Test a missing or corrupt journal is treated as an empty one
+        '''
+        journal = RunJournal(self.file_name, PARAMS, resume=True)
+        self.assertEqual(len(journal.steps), 0)
+
+        with open(self.file_name, "w") as f:
+            f.write('{"params":')
+
+        journal = RunJournal(self.file_name, PARAMS, resume=True)
+        self.assertEqual(len(journal.steps), 0)
+
+    def test_forget(self):
+        '''
+        Test forgotten steps stay forgotten on the next resume
+        '''
+        journal = RunJournal(self.file_name, PARAMS)
+        journal.record("containers", ["comp1"])
+        journal.forget("containers")
+        journal.forget("never_recorded")
+
+        self.assertFalse(RunJournal(self.file_name, PARAMS, resume=True).completed("containers"))
+
+
+class JournaledSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.temp_dir, "run_journal.json")
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_steps(self, resume, fail_restore=False):
+        '''
+        Run containers -> routing -> radios, with containers and routing checkpointed, returning
+        the scheduler results
+        '''
+        def step(name, result=None):
+            def func():
+                self.calls.append(name)
+                return result
+            return func
+
+        def restore(names):
+            if fail_restore:
+                raise RuntimeError("containers are gone")
+            return tuple(names)
+
+        scheduler = StepScheduler("test", RunJournal(self.file_name, PARAMS, resume=resume))
+        scheduler.add_step("containers", step("containers", ("comp1", "comp2")), checkpoint=True,
+                           save=list, restore=restore)
+        scheduler.add_step("routing", step("routing"), depends_on=["containers"], checkpoint=True)
+        scheduler.add_step("radios", step("radios"), depends_on=["routing"])
+        scheduler.run()
+
+        return scheduler.results
+
+    def test_resume_skips_checkpoints(self):
+        '''
+        Test checkpointed steps that finished before are restored instead of run, while steps
+        that aren't checkpointed always run
+        '''
+        self.run_steps(resume=False)
+        self.calls = []
+
+        results = self.run_steps(resume=True)
+
+        self.assertEqual(self.calls, ["radios"])
+        self.assertEqual(results["containers"], ("comp1", "comp2"))
+
+    def test_failed_restore_reruns_dependents(self):
+        '''
+        Test a checkpoint that can't be restored is run again, along with every checkpointed
+        step depending on it
+        '''
+        self.run_steps(resume=False)
+        self.calls = []
+
+        results = self.run_steps(resume=True, fail_restore=True)
+
+        self.assertEqual(self.calls, ["containers", "routing", "radios"])
+        self.assertEqual(results["containers"], ("comp1", "comp2"))
+
+    def test_without_resume(self):
+        '''
+        Test every step runs when not resuming
+        '''
+        self.run_steps(resume=False)
+        self.calls = []
+
+        self.run_steps(resume=False)
+
+        self.assertEqual(self.calls, ["containers", "routing", "radios"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import threading
+import time
+import unittest
+
+from step_scheduler import StepFailed
+from step_scheduler import StepScheduler
+
+
+class StepSchedulerTest(unittest.TestCase):
+
+    def test_dependency_order(self):
+        '''
+        Test every step starts only after the steps it depends on have finished, and results
+        are kept by step name
+        '''
+        scheduler = StepScheduler("test")
+        finished = []
+
+        def step(name, delay=0.0):
+            def func():
+                time.sleep(delay)
+                finished.append(name)
+                return name.upper()
+            return func
+
+        scheduler.add_step("a", step("a", 0.05))
+        scheduler.add_step("b", step("b"))
+        scheduler.add_step("c", step("c"), depends_on=["a", "b"])
+        scheduler.add_step("d", step("d"), depends_on=["c"])
+        scheduler.run()
+
+        self.assertEqual(finished[-2:], ["c", "d"])
+        self.assertEqual(scheduler.results, {"a":"A", "b":"B", "c":"C", "d":"D"})
+        for name, dependency in (("c", "a"), ("c", "b"), ("d", "c")):
+            self.assertGreaterEqual(scheduler.timings[name][0], scheduler.timings[dependency][1])
+
+    def test_independent_steps_overlap(self):
+        '''
+        Test steps that don't depend on each other run at the same time
+        '''
+        scheduler = StepScheduler("test")
+        both_started = threading.Barrier(2, timeout=5.0)
+
+        # each step waits for the other, so this only finishes if they run together
+        scheduler.add_step("a", both_started.wait)
+        scheduler.add_step("b", both_started.wait)
+        scheduler.run()
+
+        self.assertEqual(set(scheduler.results), {"a", "b"})
+
+    def test_failure(self):
+        '''
+        Test a failing step stops its dependents from starting, lets steps already running
+        finish, and is reported with StepFailed
+        '''
+        scheduler = StepScheduler("test")
+        ran = []
+
+        def fail():
+            raise StepFailed("broken")
+
+        def slow():
+            time.sleep(0.1)
+            ran.append("slow")
+
+        scheduler.add_step("fail", fail)
+        scheduler.add_step("slow", slow)
+        scheduler.add_step("after", lambda: ran.append("after"), depends_on=["fail"])
+
+        with self.assertRaises(StepFailed) as context:
+            scheduler.run()
+
+        self.assertIn("fail", str(context.exception))
+        self.assertEqual(ran, ["slow"])
+        self.assertIn("slow", scheduler.results)
+        self.assertNotIn("fail", scheduler.results)
+        self.assertNotIn("after", scheduler.timings)
+
+    def test_rerun_after_failure(self):
+        '''
+        Test running again only runs the steps that haven't finished yet
+        '''
+        scheduler = StepScheduler("test")
+        calls = {"setup":0, "flaky":0}
+
+        def setup():
+            calls["setup"] += 1
+
+        def flaky():
+            calls["flaky"] += 1
+            if calls["flaky"] == 1:
+                raise RuntimeError("try again")
+
+        scheduler.add_step("setup", setup)
+        scheduler.add_step("flaky", flaky, depends_on=["setup"])
+
+        with self.assertRaises(StepFailed):
+            scheduler.run()
+        scheduler.run()
+
+        self.assertEqual(calls, {"setup":1, "flaky":2})
+
+    def test_bad_steps(self):
+        '''
+        Test duplicate steps and dependencies on unknown steps are rejected when added
+        '''
+        scheduler = StepScheduler("test")
+        scheduler.add_step("a", lambda: None)
+
+        with self.assertRaises(ValueError):
+            scheduler.add_step("a", lambda: None)
+
+        with self.assertRaises(ValueError):
+            scheduler.add_step("b", lambda: None, depends_on=["missing"])
+
+    def test_timing_report(self):
+        '''
+        Test the timing report lists steps in the order they started
+        '''
+        scheduler = StepScheduler("test")
+        scheduler.add_step("a", lambda: None)
+        scheduler.add_step("b", lambda: None, depends_on=["a"])
+        scheduler.run()
+
+        report = scheduler.timing_report()
+        self.assertEqual([step["step"] for step in report], ["a", "b"])
+        self.assertTrue(all(step["duration"] >= 0 for step in report))
+
+
+if __name__ == "__main__":
+    unittest.main()
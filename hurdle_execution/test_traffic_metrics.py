@@ -0,0 +1,125 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from mgen_benchmark import write_synthetic_mgen_log
+from mgen_parser import MGEN_RECORD_DTYPE
+from mgen_parser import NS_PER_SEC
+from mgen_parser import mgen_columns
+from traffic_metrics import bucketed_flow_counts
+from traffic_metrics import max_offered_packets
+from traffic_metrics import offered_send_times
+from traffic_metrics import unique_packets
+from traffic_scoring import summarize_log
+
+
+def flow_records(seq_nums, send_interval=NS_PER_SEC//10, start_time=10*NS_PER_SEC):
+    '''
+    Build records for packets of a single flow received with the given sequence numbers, sent
+    every send_interval nanoseconds starting at start_time
+    '''
+    records = np.zeros(len(seq_nums), dtype=MGEN_RECORD_DTYPE)
+    records["seq_num"] = seq_nums
+    records["time_sent"] = start_time + records["seq_num"].astype(np.int64)*send_interval
+    records["time_recv"] = records["time_sent"] + NS_PER_SEC//100
+    records["flowid"] = 1
+    records["ip_src"] = 0x0a000001
+    records["ip_dst"] = 0x0a000002
+    records["size"] = 100
+    return records
+
+
+class UniquePacketsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_matches_scoring(self):
+        '''
+        Test duplicates are dropped on the same key scoring uses, keeping the first copy received,
+        so metrics and score count the same delivered packets
+        '''
+        file_name = os.path.join(self.temp_dir, "mgen_traffic_log.drc")
+        write_synthetic_mgen_log(file_name, 200)
+
+        # append a late duplicate of one packet, and the same source and sequence number on a
+        # different flow
+        with open(file_name, "r") as f:
+            lines = f.readlines()
+        with open(file_name, "a") as f:
+            f.write(lines[2].replace(lines[2][:15], "23:59:59.999999"))
+            f.write(lines[3].replace("flow>2 ", "flow>7 "))
+
+        records = unique_packets(mgen_columns(file_name))
+        _, packets_by_source, _ = summarize_log(file_name, use_cache=False)
+
+        self.assertEqual(len(records), 200)
+        self.assertEqual(len(records), sum(packets_by_source.values()))
+        self.assertEqual(int(records[0]["time_recv"]), int(mgen_columns(file_name)[0]["time_recv"]))
+
+
+class BucketedFlowCountsTest(unittest.TestCase):
+
+    def test_buckets(self):
+        '''
+        Test lost packets are counted as offered in the bucket they would have been sent in, and
+        buckets are aligned to multiples of the bucket size
+        '''
+        records = flow_records([0, 1, 2, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19])
+
+        first_bucket, flows, offered, delivered = bucketed_flow_counts(records, NS_PER_SEC)
+
+        self.assertEqual(first_bucket, 10)
+        self.assertEqual(len(flows), 1)
+        self.assertEqual(offered.tolist(), [[10, 10]])
+        self.assertEqual(delivered.tolist(), [[8, 10]])
+
+    def test_stalled_flow(self):
+        '''
+        Test a flow is counted as offering packets up to the end time even when nothing it sent
+        near the end got through
+        '''
+        records = flow_records(np.arange(10))
+
+        _, _, offered, delivered = bucketed_flow_counts(records, NS_PER_SEC, end_time=13*NS_PER_SEC)
+
+        self.assertEqual(offered.tolist(), [[10, 10, 10, 1]])
+        self.assertEqual(delivered.tolist(), [[10, 0, 0, 0]])
+
+    def test_corrupt_seq_num(self):
+        '''
+        Test a corrupt sequence number near the top of the range is left out of the offered
+        estimate rather than allocating a send time for every sequence number below it
+        '''
+        records = flow_records(np.arange(10))
+        records[-1]["seq_num"] = np.iinfo(np.uint32).max
+
+        send_times = offered_send_times(records, end_time=12*NS_PER_SEC, max_packets=100)
+
+        self.assertEqual(len(send_times), 21)
+        self.assertEqual(len(offered_send_times(records, end_time=10**20, max_packets=100)), 100)
+
+    def test_all_seq_nums_corrupt(self):
+        '''
+        Test only the packets received are counted when none has a plausible sequence number
+        '''
+        records = flow_records([4000000000, 4000000001])
+
+        self.assertEqual(len(offered_send_times(records, max_packets=100)), 2)
+
+    def test_max_offered_packets(self):
+        '''
+        Test the offered estimate cap follows the packet rate and traffic duration when known
+        '''
+        self.assertEqual(max_offered_packets(10, 30.0), 601)
+        self.assertEqual(max_offered_packets(), max_offered_packets(10))
+
+
+if __name__ == "__main__":
+    unittest.main()
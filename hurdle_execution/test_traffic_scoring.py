@@ -0,0 +1,184 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from mgen_benchmark import write_synthetic_mgen_log
+from mgen_parser import iter_mgen_records
+from mgen_parser import new_parse_stats
+from traffic_scoring import SeqNumSet
+from traffic_scoring import compute_score
+from traffic_scoring import packet_success_rate
+from traffic_scoring import score_traffic
+from traffic_scoring import score_traffic_parallel
+
+
+class SeqNumSetTest(unittest.TestCase):
+
+    def test_add(self):
+        '''
+        Test packets are counted once each, with their sizes, no matter how often they arrive
+        '''
+        seq_nums = SeqNumSet()
+
+        self.assertTrue(seq_nums.add(5, 100))
+        self.assertTrue(seq_nums.add(6, 50))
+        self.assertFalse(seq_nums.add(5, 100))
+
+        self.assertEqual(len(seq_nums), 2)
+        self.assertEqual(seq_nums.num_bytes, 150)
+        self.assertIn(5, seq_nums)
+        self.assertNotIn(7, seq_nums)
+
+    def test_grow_below_base(self):
+        '''
+        Test sequence numbers below the first one seen, including ones in a lower byte, are
+        recorded without losing what was already there
+        '''
+        seq_nums = SeqNumSet()
+        for seq_num in [1000, 1001, 1017]:
+            seq_nums.add(seq_num)
+
+        base = seq_nums.base
+        self.assertTrue(seq_nums.add(999))
+        self.assertTrue(seq_nums.add(3))
+        self.assertTrue(seq_nums.add(0))
+        self.assertFalse(seq_nums.add(1000))
+
+        self.assertLess(seq_nums.base, base)
+        self.assertEqual(seq_nums.base, 0)
+        self.assertEqual(len(seq_nums), 6)
+        self.assertEqual([seq_num for seq_num in range(1100) if seq_num in seq_nums],
+                         [0, 3, 999, 1000, 1001, 1017])
+
+    def test_grow_above(self):
+        '''
+        Test sequence numbers far above everything seen so far grow the set
+        '''
+        seq_nums = SeqNumSet()
+        seq_nums.add(8)
+        seq_nums.add(100000)
+
+        self.assertEqual(len(seq_nums), 2)
+        self.assertIn(100000, seq_nums)
+        self.assertNotIn(99999, seq_nums)
+        self.assertNotIn(100001, seq_nums)
+
+    def test_empty(self):
+        '''
+        Test an empty set contains nothing
+        '''
+        seq_nums = SeqNumSet()
+
+        self.assertEqual(len(seq_nums), 0)
+        self.assertNotIn(0, seq_nums)
+
+
+class PacketSuccessRateTest(unittest.TestCase):
+
+    def test_rate(self):
+        '''
+        Test the success rate is the fraction of expected packets received
+        '''
+        self.assertEqual(packet_success_rate(50, 200), 0.25)
+
+    def test_no_packets_expected(self):
+        '''
+        Test runs that weren't expected to send any packets have no success rate
+        '''
+        self.assertIsNone(packet_success_rate(10, 0))
+        self.assertIsNone(packet_success_rate(0, -5))
+
+
+class ComputeScoreTest(unittest.TestCase):
+
+    def test_no_packets_expected(self):
+        '''
+        Test scoring a run with zero expected packets, such as one no longer than the bootup slop
+        time, doesn't divide by zero while logging success rates
+        '''
+        bot_summaries = [("192.168.101.2", {"192.168.102.2":10, "192.168.103.2":5})]
+        total_score = compute_score(bot_summaries, [], 0, log_results=True)
+
+        self.assertEqual(total_score["input_packets_per_network"], 0)
+        self.assertEqual(total_score["bots"]["total"], 15)
+        self.assertEqual(total_score["competitors"]["total"], 0)
+
+
+class ScoreTrafficTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_parse_stats(self):
+        '''
+        Test the serial path writes out parse statistics filled in while streaming the logs, and
+        agrees with the parallel path
+        '''
+        bot_logfile = os.path.join(self.temp_dir, "bot_mgen_traffic_log.drc")
+        comp_logfile = os.path.join(self.temp_dir, "comp_mgen_traffic_log.drc")
+        write_synthetic_mgen_log(bot_logfile, 200)
+        write_synthetic_mgen_log(comp_logfile, 100)
+
+        # one malformed line, and a log cut off partway through its last line
+        with open(comp_logfile, "a") as f:
+            f.write("23:59:59.000000 RECV proto>UDP flow>1 seq>oops\n")
+            f.write("23:59:59.000000 RECV proto>UDP flo")
+
+        parse_stats = {logfile:new_parse_stats() for logfile in [bot_logfile, comp_logfile]}
+        serial_json = os.path.join(self.temp_dir, "serial.json")
+        score_traffic([iter_mgen_records(bot_logfile, parse_stats[bot_logfile])],
+                      [iter_mgen_records(comp_logfile, parse_stats[comp_logfile])],
+                      1000, serial_json, parse_stats)
+
+        parallel_json = os.path.join(self.temp_dir, "parallel.json")
+        score_traffic_parallel([bot_logfile], [comp_logfile], 1000, parallel_json, num_workers=1)
+
+        with open(serial_json, "r") as f:
+            serial_score = json.load(f)
+        with open(parallel_json, "r") as f:
+            parallel_score = json.load(f)
+
+        comp_stats = serial_score["parse_stats"][comp_logfile]
+        self.assertEqual(serial_score["parse_stats"][bot_logfile]["num_recv_lines"], 200)
+        self.assertEqual(comp_stats["num_recv_lines"], 100)
+        self.assertEqual(comp_stats["num_malformed_lines"], 2)
+        self.assertTrue(comp_stats["truncated_last_line"])
+        self.assertEqual(serial_score, parallel_score)
+
+
+class ScoreTrafficParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_generator_logfiles(self):
+        '''
+        Test log file names can be passed as generators and still end up on the right network
+        '''
+        bot_logfile = os.path.join(self.temp_dir, "bot_mgen_traffic_log.drc")
+        comp_logfile = os.path.join(self.temp_dir, "comp_mgen_traffic_log.drc")
+        write_synthetic_mgen_log(bot_logfile, 200)
+        write_synthetic_mgen_log(comp_logfile, 100)
+
+        json_log_name = os.path.join(self.temp_dir, "score.json")
+        score_traffic_parallel((f for f in [bot_logfile]), (f for f in [comp_logfile]), 1000,
+                               json_log_name, num_workers=1)
+
+        with open(json_log_name, "r") as f:
+            total_score = json.load(f)
+
+        self.assertEqual(total_score["bots"]["total"], 200)
+        self.assertEqual(total_score["competitors"]["total"], 100)
+        self.assertEqual(sorted(total_score["parse_stats"]), sorted([bot_logfile, comp_logfile]))
+
+
+if __name__ == "__main__":
+    unittest.main()
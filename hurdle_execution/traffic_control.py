@@ -2,12 +2,15 @@
 
 import argparse
 import os
-import subprocess
 import sys
 import time
 
 import pylxd
 
+from container_files import push_files
+from run_trace import enable_tracing_from_env
+from run_trace import span
+
 NUM_BOT_CONTAINERS = 3
 NUM_COMPETITOR_CONTAINERS = 3
 CONTAINER_NAME_PATTERN="competitor-hurdle-srn"
@@ -197,10 +200,10 @@ def main():
     parser.add_argument('--tgen-container-name-base', default="tgen", dest="tgen_base",
                         help="Traffic generator container name prefix, no container number")
 
-    parser.add_argument('--num-bot-nodes', default=3, type=int, dest="num_bots",
+    parser.add_argument('--num-bot-nodes', default=NUM_BOT_CONTAINERS, type=int, dest="num_bots",
                         help="Number of bot nodes")
 
-    parser.add_argument('--num-competitor-nodes', default=3, type=int, dest="num_comps",
+    parser.add_argument('--num-competitor-nodes', default=NUM_COMPETITOR_CONTAINERS, type=int, dest="num_comps",
                         help="Number of competitor nodes")
 
     subparsers = parser.add_subparsers(dest='action')
@@ -239,6 +242,8 @@ def main():
     # parse args and store to dictionary
     args = vars(parser.parse_args())
 
+    enable_tracing_from_env("traffic_control")
+
     # initialize lxd_client
     lxd_client = pylxd.Client()
 
@@ -269,14 +274,16 @@ def main():
         print("stopping MGEN flows and services")
         for cont in bot_tgens + comp_tgens:
             # check if service is running
-            (ret_code, cmd_stdout, cmd_stderr) = cont.execute(["systemctl", "is-active", "mgen.service"])
+            with span("mgen is-active", category="lxd", container=cont.name):
+                (ret_code, cmd_stdout, cmd_stderr) = cont.execute(["systemctl", "is-active", "mgen.service"])
             #print("systemd says mgen state is {}".format(cmd_stdout))
             if ret_code == 0:
                 # service is running so shut it down
                 print("Stopping MGEN service")
                 exec_cmd = ["systemctl", "stop", "mgen"]
                 print("running on {}: {}".format(cont.name, " ".join(exec_cmd)))
-                cont.execute(exec_cmd)
+                with span("mgen stop", category="lxd", container=cont.name):
+                    cont.execute(exec_cmd)
             else:
                 # service not running. Do nothing
                 print("MGEN service already stopped on {}".format(cont.name))
@@ -302,22 +309,21 @@ def main():
     # check if mgen is already running. If so, stop it
     for cont in bot_tgens + comp_tgens:
         # check if service is running
-        (ret_code, cmd_stdout, cmd_stderr) = cont.execute(["systemctl", "is-active", "mgen.service"])
+        with span("mgen is-active", category="lxd", container=cont.name):
+            (ret_code, cmd_stdout, cmd_stderr) = cont.execute(["systemctl", "is-active", "mgen.service"])
         #print("systemd says mgen state is {}".format(cmd_stdout))
         if ret_code == 0:
             # service already running. stop to ensure clean state.
             print("Stopping running MGEN service")
             exec_cmd = ["systemctl", "stop", "mgen"]
             print("running on {}: {}".format(cont.name, " ".join(exec_cmd)))
-            cont.execute(exec_cmd)
-
-    # copy scripts to appropriate nodes
-    for tgen_name, source_file in file_map.items():
+            with span("mgen stop", category="lxd", container=cont.name):
+                cont.execute(exec_cmd)
 
-        push_cmd = ["lxc", "file", "push", source_file, tgen_name+MGEN_SCRIPT_PATH]
-        print("Deploying MGEN script {} to {}".format(source_file, tgen_name+MGEN_SCRIPT_PATH))
-        print("running {}".format(" ".join(push_cmd)))
-        subprocess.run(push_cmd)
+    # copy scripts to appropriate nodes, all at once
+    tgens_by_name = {cont.name:cont for cont in bot_tgens + comp_tgens}
+    push_files([(tgens_by_name[tgen_name], source_file, MGEN_SCRIPT_PATH)
+                for tgen_name, source_file in file_map.items() if tgen_name in tgens_by_name])
 
     # now start mgen
     for cont in bot_tgens + comp_tgens:
@@ -325,7 +331,8 @@ def main():
         # start mgen instance on MGEN service and start new log file
         exec_cmd = ["systemctl", "start", "mgen"]
         print("running on {}: {}".format(cont.name, " ".join(exec_cmd)))
-        cont.execute(exec_cmd)
+        with span("mgen start", category="lxd", container=cont.name):
+            cont.execute(exec_cmd)
 
     # exit this script
     sys.exit(0)
@@ -0,0 +1,432 @@
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import json
+import logging
+import math
+
+import numpy as np
+
+from mgen_cache import cached_mgen_columns
+from mgen_parser import NS_PER_SEC
+from mgen_parser import format_packed_ip
+
+
+logger = logging.getLogger(__name__)
+
+NS_PER_MS = 1000000
+BITS_PER_BYTE = 8
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+
+# most packets a single flow is estimated to have offered. Offered send times are held one per
+# packet, so a corrupt sequence number mustn't be able to make the estimate arbitrarily big
+MAX_OFFERED_PACKETS_PER_FLOW = 10000000
+
+# when the packet rate and traffic duration are known, flows are estimated to have offered at
+# most this many times the packets they should have sent
+OFFERED_PACKETS_SLACK = 2
+
+
+def unique_packets(records):
+    '''
+    Drop duplicate packets from a structured array returned by mgen_columns, keeping the first
+    copy received of each source IP and sequence number. This is the same key scoring
+    deduplicates on, so the metrics count the same delivered packets as the score.
+    '''
+    order = np.argsort(records["time_recv"], kind="stable")
+    records = records[order]
+
+    _, first_index = np.unique(records[["ip_src", "seq_num"]], return_index=True)
+
+    return records[np.sort(first_index)]
+
+
+def windowed_goodput(time_recv, size, window_ns, step_ns):
+    '''
+    Compute goodput in bits per second over windows of window_ns nanoseconds, sliding by step_ns,
+    from receive times and packet sizes sorted by receive time
+    '''
+    # sum bits into step sized bins, then add up consecutive bins to get each window
+    bins = (time_recv - time_recv[0]) // step_ns
+    bits_per_step = np.bincount(bins, weights=size.astype(np.float64)*BITS_PER_BYTE)
+
+    steps_per_window = max(1, int(window_ns // step_ns))
+    if len(bits_per_step) < steps_per_window:
+        bits_per_window = np.array([bits_per_step.sum()])
+    else:
+        bits_per_window = np.convolve(bits_per_step, np.ones(steps_per_window), mode="valid")
+
+    return bits_per_window/(float(steps_per_window*step_ns)/NS_PER_SEC)
+
+
+def loss_bursts(seq_nums):
+    '''
+    Find runs of consecutive missing sequence numbers between the first and last packet received.
+    Returns an array with the length of each burst.
+    '''
+    gaps = np.diff(np.sort(seq_nums).astype(np.int64)) - 1
+    return gaps[gaps > 0]
+
+
+def flow_metrics(flow_records, window_ns, step_ns):
+    '''
+    Compute latency, jitter, goodput and loss metrics for the unique packets of a single flow
+    '''
+    # one-way latency in receive order
+    latency_ms = (flow_records["time_recv"] - flow_records["time_sent"]).astype(np.float64)/NS_PER_MS
+
+    # jitter as the mean difference in latency between packets adjacent in sequence number
+    # order, following the IP packet delay variation definition of RFC 5481
+    seq_order = np.argsort(flow_records["seq_num"], kind="stable")
+    if len(seq_order) > 1:
+        jitter_ms = float(np.mean(np.abs(np.diff(latency_ms[seq_order]))))
+    else:
+        jitter_ms = 0.0
+
+    goodput_bps = windowed_goodput(flow_records["time_recv"], flow_records["size"], window_ns, step_ns)
+
+    bursts = loss_bursts(flow_records["seq_num"])
+
+    duration_secs = float(flow_records["time_recv"][-1] - flow_records["time_recv"][0])/NS_PER_SEC
+
+    metrics = {"num_packets":len(flow_records),
+               "num_bytes":int(flow_records["size"].sum()),
+               "duration_secs":duration_secs,
+               "latency_ms":{"min":float(latency_ms.min()),
+                             "mean":float(latency_ms.mean()),
+                             "max":float(latency_ms.max())},
+               "jitter_ms":jitter_ms,
+               "goodput_bps":{"mean":float(goodput_bps.mean()),
+                              "min":float(goodput_bps.min()),
+                              "max":float(goodput_bps.max())},
+               "loss":{"first_seq_num":int(flow_records["seq_num"].min()),
+                       "last_seq_num":int(flow_records["seq_num"].max()),
+                       "num_lost":int(bursts.sum()),
+                       "num_bursts":len(bursts),
+                       "max_burst_length":int(bursts.max()) if len(bursts) > 0 else 0,
+                       "mean_burst_length":float(bursts.mean()) if len(bursts) > 0 else 0.0}}
+
+    for percentile, value in zip(LATENCY_PERCENTILES, np.percentile(latency_ms, LATENCY_PERCENTILES)):
+        metrics["latency_ms"]["p{}".format(percentile)] = float(value)
+
+    return metrics
+
+
+def summarize_log_metrics(log_filename, window_secs=1.0, step_secs=None, use_cache=True):
+    '''
+    Parse the MGEN log at log_filename and compute metrics for every flow it received:
+
+    ("X.X.X.X", {"X.X.X.Y/1":{...metrics...},
+                 "X.X.X.Z/2":{...metrics...},
+                 ...
+                })
+
+    The first element is the destination IP of the log, or None if the log is empty. Flows are
+    keyed by source IP and MGEN flow ID. Goodput is computed over windows of window_secs seconds
+    sliding by step_secs, which defaults to a tenth of the window. The on-disk parse cache is
+    reused unless use_cache is False.
+    '''
+    records = unique_packets(cached_mgen_columns(log_filename, use_cache))
+
+    if len(records) == 0:
+        return None, {}
+
+    if step_secs is None:
+        step_secs = window_secs/10.0
+
+    window_ns = int(window_secs*NS_PER_SEC)
+    step_ns = max(1, int(step_secs*NS_PER_SEC))
+
+    all_ip_dsts = np.unique(records["ip_dst"])
+    if len(all_ip_dsts) > 1:
+        logger.warn("Found more than one destination IP: %s. MGEN logs may be corrupt",
+                    [format_packed_ip(ip) for ip in all_ip_dsts])
+
+    # grab (what should be the only) IP from all_ip_dsts
+    ip_dst = format_packed_ip(all_ip_dsts[-1])
+
+    # group packets by flow, keeping them in receive order within each flow
+    flows, flow_index = np.unique(records[["ip_src", "flowid"]], return_inverse=True)
+    order = np.argsort(flow_index.ravel(), kind="stable")
+    flow_starts = np.searchsorted(flow_index.ravel()[order], np.arange(len(flows)+1))
+
+    metrics_by_flow = {}
+    for i, flow in enumerate(flows):
+        flow_records = records[order[flow_starts[i]:flow_starts[i+1]]]
+        flow_name = "{}/{}".format(format_packed_ip(flow["ip_src"]), flow["flowid"])
+        metrics_by_flow[flow_name] = flow_metrics(flow_records, window_ns, step_ns)
+
+    return ip_dst, metrics_by_flow
+
+
+def max_offered_packets(packet_rate=None, traffic_duration=None):
+    '''
+    Most packets a single flow sending packet_rate packets per second for traffic_duration
+    seconds can plausibly be estimated to have offered
+    '''
+    if packet_rate is None or traffic_duration is None:
+        return MAX_OFFERED_PACKETS_PER_FLOW
+
+    return min(MAX_OFFERED_PACKETS_PER_FLOW,
+               int(math.ceil(packet_rate*traffic_duration*OFFERED_PACKETS_SLACK)) + 1)
+
+
+def offered_send_times(flow_records, end_time=None, max_packets=MAX_OFFERED_PACKETS_PER_FLOW):
+    '''
+    Estimate the send time of every packet a single flow offered, from sequence number 0 up to
+    the last one received, or up to end_time nanoseconds if given. Send times of lost packets are
+    interpolated between the packets received either side of them, and extrapolated at the flow's
+    mean send interval for packets lost before the first or after the last one received. With
+    only one sequence number received there is no interval to go on, so only that packet is
+    counted.
+
+    At most max_packets packets are estimated. Packets received with sequence numbers of
+    max_packets or more, which are most likely corrupt, are left out of the estimate.
+    '''
+    seq_order = np.argsort(flow_records["seq_num"], kind="stable")
+    seq_nums = flow_records["seq_num"][seq_order].astype(np.int64)
+    time_sent = flow_records["time_sent"][seq_order].astype(np.float64)
+
+    plausible = seq_nums < max_packets
+    if not plausible.all():
+        logger.warning("Leaving %i packets with sequence numbers of %i or more out of the offered packet estimate",
+                       np.count_nonzero(~plausible), max_packets)
+
+        # with nothing to go on, only count what was received
+        if not plausible.any():
+            return np.sort(flow_records["time_sent"]).astype(np.int64)
+
+        seq_nums = seq_nums[plausible]
+        time_sent = time_sent[plausible]
+
+    all_seq_nums = np.arange(seq_nums[-1]+1)
+    send_times = np.interp(all_seq_nums, seq_nums, time_sent)
+
+    # np.interp holds the first value constant below the first sequence number received, so
+    # step back from it at the mean send interval instead
+    if seq_nums[-1] > seq_nums[0]:
+        send_interval = (time_sent[-1] - time_sent[0])/(seq_nums[-1] - seq_nums[0])
+        missed = all_seq_nums < seq_nums[0]
+        send_times[missed] = time_sent[0] - (seq_nums[0] - all_seq_nums[missed])*send_interval
+
+        # keep counting packets the flow kept sending after the last one that got through
+        if end_time is not None and send_interval > 0 and end_time > time_sent[-1]:
+            num_after = min(int((end_time - time_sent[-1])//send_interval), max_packets - len(send_times))
+            send_times = np.concatenate((send_times,
+                                         time_sent[-1] + np.arange(1, num_after+1)*send_interval))
+    else:
+        send_times = send_times[seq_nums[0]:]
+
+    return send_times.astype(np.int64)
+
+
+def bucketed_flow_counts(records, bucket_ns, end_time=None, max_packets=MAX_OFFERED_PACKETS_PER_FLOW):
+    '''
+    Count the packets offered and delivered by each flow in a structured array of unique packets,
+    in buckets of bucket_ns nanoseconds by send time. Offered packets are counted up to end_time
+    nanoseconds if given, and up to max_packets per flow, see offered_send_times. Buckets are
+    aligned to multiples of bucket_ns since midnight so counts from different logs line up.
+    Returns the index of the first bucket, the flows as a structured array of source IP and flow
+    ID, and offered and delivered count arrays with one row per flow and one column per bucket.
+    '''
+    flows, flow_index = np.unique(records[["ip_src", "flowid"]], return_inverse=True)
+    flow_index = flow_index.ravel()
+
+    # estimate send times of everything offered, one flow at a time
+    offered_times = []
+    offered_flows = []
+    order = np.argsort(flow_index, kind="stable")
+    flow_starts = np.searchsorted(flow_index[order], np.arange(len(flows)+1))
+    for i in range(len(flows)):
+        send_times = offered_send_times(records[order[flow_starts[i]:flow_starts[i+1]]], end_time, max_packets)
+        offered_times.append(send_times)
+        offered_flows.append(np.full(len(send_times), i))
+
+    offered_times = np.concatenate(offered_times)
+    offered_flows = np.concatenate(offered_flows)
+
+    offered_buckets = offered_times // bucket_ns
+    delivered_buckets = records["time_sent"] // bucket_ns
+
+    first_bucket = int(min(offered_buckets.min(), delivered_buckets.min()))
+    num_buckets = int(max(offered_buckets.max(), delivered_buckets.max())) - first_bucket + 1
+
+    # count every (flow, bucket) pair in one pass
+    def count(flow_ids, buckets):
+        return np.bincount(flow_ids*num_buckets + (buckets - first_bucket),
+                           minlength=len(flows)*num_buckets).reshape(len(flows), num_buckets)
+
+    return (first_bucket, flows,
+            count(offered_flows, offered_buckets), count(flow_index, delivered_buckets))
+
+
+def log_send_time_span(log_filename, use_cache=True, max_packets=MAX_OFFERED_PACKETS_PER_FLOW):
+    '''
+    Parse the MGEN log at log_filename and estimate when its flows started sending and the latest
+    send time of any packet it received, both in nanoseconds. Returns None if the log is empty.
+    max_packets bounds the offered packets estimated per flow, see offered_send_times.
+    '''
+    records = unique_packets(cached_mgen_columns(log_filename, use_cache))
+
+    if len(records) == 0:
+        return None
+
+    flows, flow_index = np.unique(records[["ip_src", "flowid"]], return_inverse=True)
+    flow_index = flow_index.ravel()
+
+    order = np.argsort(flow_index, kind="stable")
+    flow_starts = np.searchsorted(flow_index[order], np.arange(len(flows)+1))
+    first_send_time = min(offered_send_times(records[order[flow_starts[i]:flow_starts[i+1]]],
+                                             max_packets=max_packets)[0]
+                          for i in range(len(flows)))
+
+    return int(first_send_time), int(records["time_sent"].max())
+
+
+def summarize_log_buckets(log_filename, bucket_secs=1.0, use_cache=True, end_time=None,
+                          max_packets=MAX_OFFERED_PACKETS_PER_FLOW):
+    '''
+    Parse the MGEN log at log_filename and count offered and delivered packets per flow in
+    buckets of bucket_secs seconds by send time, counting offered packets up to end_time
+    nanoseconds if given and up to max_packets per flow:
+
+    ("X.X.X.X", first bucket index, {"X.X.X.Y/1":{"offered":[...], "delivered":[...]},
+                                     ...
+                                    })
+
+    The first element is the destination IP of the log, or None if the log is empty.
+    '''
+    records = unique_packets(cached_mgen_columns(log_filename, use_cache))
+
+    if len(records) == 0:
+        return None, 0, {}
+
+    all_ip_dsts = np.unique(records["ip_dst"])
+    if len(all_ip_dsts) > 1:
+        logger.warn("Found more than one destination IP: %s. MGEN logs may be corrupt",
+                    [format_packed_ip(ip) for ip in all_ip_dsts])
+
+    # grab (what should be the only) IP from all_ip_dsts
+    ip_dst = format_packed_ip(all_ip_dsts[-1])
+
+    first_bucket, flows, offered, delivered = bucketed_flow_counts(records, int(bucket_secs*NS_PER_SEC),
+                                                                   end_time, max_packets)
+
+    counts_by_flow = {}
+    for i, flow in enumerate(flows):
+        flow_name = "{}/{}".format(format_packed_ip(flow["ip_src"]), flow["flowid"])
+        counts_by_flow[flow_name] = {"offered":offered[i], "delivered":delivered[i]}
+
+    return ip_dst, first_bucket, counts_by_flow
+
+
+def compute_bucketed_score(bot_logfiles, competitor_logfiles, json_log_name, bucket_secs=1.0,
+                           traffic_duration=None, packet_rate=None, num_workers=None):
+    '''
+    Count packets offered and delivered per flow in buckets of bucket_secs seconds for every bot
+    and competitor log, one worker process per log, and save them to json_log_name along with
+    per network totals. All counts share one set of buckets, starting at the earliest packet
+    offered in any log, so a network stalling shows up as a run of buckets where delivered falls
+    behind offered.
+
+    Every flow is counted as offering packets until the end of traffic, even if nothing it sent
+    near the end got through. Traffic ends at the latest send time seen in any log, or
+    traffic_duration seconds after the earliest flow started if that is later. When the per flow
+    packet_rate is given too, flows are estimated to have offered no more than a small multiple
+    of the packets they should have sent, which keeps a corrupt sequence number from blowing up
+    the estimate.
+    '''
+    logfiles = list(bot_logfiles) + list(competitor_logfiles)
+    max_packets = max_offered_packets(packet_rate, traffic_duration)
+
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        send_time_span = functools.partial(log_send_time_span, max_packets=max_packets)
+        send_time_spans = [span for span in executor.map(send_time_span, logfiles) if span is not None]
+
+        end_time = None
+        if len(send_time_spans) > 0:
+            end_time = max(last_send_time for _, last_send_time in send_time_spans)
+            if traffic_duration is not None:
+                traffic_start_time = min(first_send_time for first_send_time, _ in send_time_spans)
+                end_time = max(end_time, traffic_start_time + int(traffic_duration*NS_PER_SEC))
+
+        summarize = functools.partial(summarize_log_buckets, bucket_secs=bucket_secs, end_time=end_time,
+                                      max_packets=max_packets)
+        summaries = list(executor.map(summarize, logfiles))
+
+    # line every log up on buckets covering the whole run
+    spans = [(first_bucket, first_bucket + len(counts["offered"]))
+             for _, first_bucket, counts_by_flow in summaries
+             for counts in counts_by_flow.values()]
+    if len(spans) > 0:
+        run_first_bucket = min(start for start, _ in spans)
+        num_buckets = max(end for _, end in spans) - run_first_bucket
+    else:
+        run_first_bucket, num_buckets = 0, 0
+
+    def pad(counts, first_bucket):
+        padded = np.zeros(num_buckets, dtype=np.int64)
+        start = first_bucket - run_first_bucket
+        padded[start:start+len(counts)] = counts
+        return padded
+
+    bucketed_score = {"bucket_secs":bucket_secs,
+                      "bucket_start_secs":[(run_first_bucket + i)*bucket_secs for i in range(num_buckets)]}
+
+    for network, network_summaries in (("bots", summaries[:len(bot_logfiles)]),
+                                       ("competitors", summaries[len(bot_logfiles):])):
+        bucketed_score[network] = {}
+        total_offered = np.zeros(num_buckets, dtype=np.int64)
+        total_delivered = np.zeros(num_buckets, dtype=np.int64)
+
+        for dst_ip, first_bucket, counts_by_flow in network_summaries:
+            if dst_ip is None:
+                continue
+
+            bucketed_score[network][dst_ip] = {"flows":{}}
+            for flow_name, counts in counts_by_flow.items():
+                offered = pad(counts["offered"], first_bucket)
+                delivered = pad(counts["delivered"], first_bucket)
+                total_offered += offered
+                total_delivered += delivered
+                bucketed_score[network][dst_ip]["flows"][flow_name] = {"offered":offered.tolist(),
+                                                                       "delivered":delivered.tolist()}
+
+        bucketed_score[network]["total"] = {"offered":total_offered.tolist(),
+                                            "delivered":total_delivered.tolist()}
+
+    # save results to file
+    with open(json_log_name, "w") as f:
+        json.dump(bucketed_score, f)
+
+    return bucketed_score
+
+
+def compute_traffic_metrics(bot_logfiles, competitor_logfiles, json_log_name, window_secs=1.0,
+                            step_secs=None, num_workers=None):
+    '''
+    Compute per flow latency, jitter, goodput and loss metrics for every bot and competitor log,
+    one worker process per log, and save them to json_log_name indexed by network and
+    destination IP.
+    '''
+    logfiles = list(bot_logfiles) + list(competitor_logfiles)
+
+    summarize = functools.partial(summarize_log_metrics, window_secs=window_secs, step_secs=step_secs)
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        summaries = list(executor.map(summarize, logfiles))
+
+    all_metrics = {"goodput_window_secs":window_secs,
+                   "goodput_step_secs":step_secs if step_secs is not None else window_secs/10.0}
+
+    for network, network_summaries in (("bots", summaries[:len(bot_logfiles)]),
+                                       ("competitors", summaries[len(bot_logfiles):])):
+        all_metrics[network] = {}
+        for dst_ip, metrics_by_flow in network_summaries:
+            if dst_ip is not None:
+                all_metrics[network][dst_ip] = {"flows":metrics_by_flow}
+
+    # save results to file
+    with open(json_log_name, "w") as f:
+        json.dump(all_metrics, f, indent=2)
+
+    return all_metrics
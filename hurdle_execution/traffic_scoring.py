@@ -1,31 +1,98 @@
-import copy
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 
 import json
 
 import logging
+import math
+
+import numpy as np
+
+from mgen_cache import cached_parse_mgen_columns
+from mgen_parser import format_packed_ip
 
 
 logger = logging.getLogger(__name__)
 
 
+class SeqNumSet(object):
+    """
+    Growable bitset of the sequence numbers received on a flow, along with the number and total
+    size of unique packets. Adding a sequence number is O(1) and costs one bit rather than a
+    Python object per packet.
+
+    Bits are stored relative to the first sequence number seen so flows that don't start at 0
+    don't pay for the unused low range.
+    """
+    def __init__(self):
+        self.bits = bytearray()
+        self.base = None
+        self.num_packets = 0
+        self.num_bytes = 0
+
+    def _grow(self, seq_num):
+        """
+        Make sure seq_num falls within the bitset, doubling its size when growing up
+        """
+        if self.base is None:
+            self.base = seq_num & ~7
+
+        # sequence numbers below the base are rare, so just prepend exactly what is needed
+        if seq_num < self.base:
+            new_base = seq_num & ~7
+            self.bits[0:0] = bytes((self.base - new_base) >> 3)
+            self.base = new_base
+
+        index = (seq_num - self.base) >> 3
+        if index >= len(self.bits):
+            self.bits.extend(bytes(max(index + 1 - len(self.bits), len(self.bits))))
+
+    def add(self, seq_num, size=0):
+        """
+        Record a received sequence number and return True if it hadn't been seen before
+        """
+        offset = seq_num - self.base if self.base is not None else -1
+        if offset < 0 or (offset >> 3) >= len(self.bits):
+            self._grow(seq_num)
+            offset = seq_num - self.base
+
+        index = offset >> 3
+        mask = 1 << (offset & 7)
+        current = self.bits[index]
+
+        # don't double count duplicates
+        if current & mask:
+            return False
+
+        self.bits[index] = current | mask
+        self.num_packets += 1
+        self.num_bytes += size
+        return True
+
+    def __contains__(self, seq_num):
+        if self.base is None or seq_num < self.base:
+            return False
+
+        index = (seq_num - self.base) >> 3
+        return index < len(self.bits) and bool(self.bits[index] & (1 << ((seq_num - self.base) & 7)))
+
+    def __len__(self):
+        return self.num_packets
 
 
 def process_log(traffic_log):
     """
-    Process a traffic log into a dictionary indexed by source IP with structure:
+    Process a traffic log, given as an iterable of MgenRecord entries such as the generator
+    returned by mgen_parser.iter_mgen_records, into a dictionary indexed by source IP with structure:
 
-    {"X.X.X.X":{1:200,
-                2:200,
-                ...
-                },
-     "X.X.X.Y":{1:200,
-                2:200,
-                ...
-                }
+    {"X.X.X.X":SeqNumSet(...),
+     "X.X.X.Y":SeqNumSet(...),
     }
     Top level keys are source IP addresses.
-    Inner keys are sequence numbers and values are the packet sizes
+    Values are SeqNumSets of the unique sequence numbers received from that source, so len()
+    gives the number of packets received
+
+    Records are consumed one at a time, so the log never needs to be fully loaded into memory
     """
 
     # indexed by source IP
@@ -34,18 +101,18 @@ def process_log(traffic_log):
     all_ip_dsts = set()
 
     for mgen_entry in traffic_log:
-        ip_dst = mgen_entry["ip_dst"].split("/")[0]
+        ip_dst = mgen_entry.ip_dst.split("/")[0]
 
         # keep track of destination IPs. There should be only one.
         all_ip_dsts.add(ip_dst)
 
-        ip_src = mgen_entry["ip_src"].split("/")[0]
+        ip_src = mgen_entry.ip_src.split("/")[0]
 
         if ip_src not in scoring_log:
-            scoring_log[ip_src] = {}
+            scoring_log[ip_src] = SeqNumSet()
 
-        # store off packet size by sequence number to prevent double counting
-        scoring_log[ip_src][mgen_entry["seq_num"]] = mgen_entry["size"]
+        # store off sequence numbers to prevent double counting
+        scoring_log[ip_src].add(mgen_entry.seq_num, mgen_entry.size)
 
     if len(all_ip_dsts) > 1:
         logger.warn("Found more than one destination IP: %s. MGEN logs may be corrupt",
@@ -59,81 +126,181 @@ def process_log(traffic_log):
 
     return ip_dst, scoring_log
 
-def score_traffic(bot_traffic_logs, competitor_traffic_logs, num_packets, json_log_name):
+def summarize_log(log_filename, use_cache=True):
     """
-    accepts two lists of dictionaries.
+    Parse the MGEN log at log_filename and reduce it to the counts needed for scoring:
 
-    Each is a list of traffic log dictionaries of the format:
+    ("X.X.X.X", {"X.X.X.Y":1234,
+                 "X.X.X.Z":1200,
+                 ...
+                },
+     {...parse statistics...})
+
+    The first element is the destination IP of the log, or None if the log is empty. The
+    dictionary holds the number of unique packets received from each source IP. The last element
+    holds the parse statistics described in mgen_parser.new_parse_stats. The log is parsed
+    in bulk with mgen_columns, reusing the on-disk parse cache unless use_cache is False, and
+    deduplicated by source IP and sequence number, matching process_log. The result is small, so
+    this is suitable for running in a worker process.
+    """
+    records, stats = cached_parse_mgen_columns(log_filename, use_cache)
 
-    [{"time_recv":time_recv,
-                  "time_sent":time_sent,
-                  "flowid":flow_id,
-                  "seq_num":seq_num,
-                  "ip_src":ip_src,
-                  "ip_dst":ip_dst,
-                  "size":size},
-                  ....
-    ]
+    all_ip_dsts = np.unique(records["ip_dst"])
+    if len(all_ip_dsts) > 1:
+        logger.warn("Found more than one destination IP: %s. MGEN logs may be corrupt",
+                    [format_packed_ip(ip) for ip in all_ip_dsts])
 
+    if len(all_ip_dsts) == 0:
+        return None, {}, stats
 
-    This function will sort the mgen_logs of each dict by valid source
-    and destination addresses and count the number of valid packets received.
+    # grab (what should be the only) IP from all_ip_dsts
+    ip_dst = format_packed_ip(all_ip_dsts[-1])
+
+    # count each source IP and sequence number pair once to prevent double counting
+    packet_keys = np.unique((records["ip_src"].astype(np.uint64) << np.uint64(32)) |
+                            records["seq_num"].astype(np.uint64))
+    src_ips, num_packets = np.unique(packet_keys >> np.uint64(32), return_counts=True)
+
+    return (ip_dst,
+            {format_packed_ip(src_ip): int(count) for src_ip, count in zip(src_ips, num_packets)},
+            stats)
+
+
+def expected_packets_per_network(packet_rate, traffic_secs, num_nodes):
+    """
+    Number of packets a network should deliver when each of its num_nodes nodes sends
+    packet_rate packets per second to every other node for traffic_secs seconds
     """
+    return math.floor(packet_rate*num_nodes*traffic_secs*(num_nodes-1))
+
 
-    bot_scoring = {}
-    comp_scoring = {}
+def packet_success_rate(num_packets_received, num_packets):
+    """
+    Fraction of the num_packets expected packets that were received, or None if no packets were
+    expected, for example because the run was no longer than the bootup slop time
+    """
+    if num_packets <= 0:
+        return None
+
+    return float(num_packets_received)/float(num_packets)
+
+
+def compute_score(bot_summaries, competitor_summaries, num_packets, log_results=True,
+                  parse_stats=None):
+    """
+    Combine per log summaries, as returned by summarize_log without the parse statistics, into
+    the total score dictionary written out by score_traffic. Set log_results to False to skip
+    logging the per source counts and packet success rates. parse_stats, a dictionary of parse
+    statistics indexed by log file name, is included in the score when given.
+    """
 
     total_score = {"input_packets_per_network":num_packets}
 
-    for traffic_log in bot_traffic_logs:
-        # process each log and store results by destination address
-        dst_ip, scoring_log = process_log(traffic_log)
-        if dst_ip is not None:
-            bot_scoring[dst_ip] = copy.deepcopy(scoring_log)
+    if parse_stats is not None:
+        total_score["parse_stats"] = parse_stats
+
+    for network, summaries, label in (("bots", bot_summaries, "Bot"),
+                                      ("competitors", competitor_summaries, "Competitor")):
+
+        # store results by destination address
+        packets_by_dst = {}
+        for dst_ip, packets_by_source in summaries:
+            if dst_ip is not None:
+                packets_by_dst[dst_ip] = packets_by_source
+
+        total_packets = 0
+        total_score[network] = {}
+        for dst_ip, packets_by_source in packets_by_dst.items():
+            total_score[network][dst_ip] = {"packets_by_source":{}}
+            for src_ip, num_packets_received in packets_by_source.items():
+
+                if log_results:
+                    logger.info("%s at IP: %s received %i packets from %s",
+                                label, dst_ip, num_packets_received, src_ip)
+
+                total_score[network][dst_ip]["packets_by_source"][src_ip] = num_packets_received
+                total_packets += num_packets_received
+
+        total_score[network]["total"] = total_packets
+
+        if log_results:
+            success_rate = packet_success_rate(total_packets, num_packets)
+            logger.info("%s network transfered a total of %i packets out of %i, %s packet success rate",
+                        label, total_packets, num_packets,
+                        "n/a" if success_rate is None else "{:f}".format(success_rate))
+
+    return total_score
+
+
+def score_traffic(bot_traffic_logs, competitor_traffic_logs, num_packets, json_log_name,
+                  parse_stats=None):
+    """
+    accepts two lists of traffic logs.
+
+    Each traffic log is an iterable of MgenRecord entries, typically the generator returned by
+    mgen_parser.iter_mgen_records, with the fields:
 
-    for traffic_log in competitor_traffic_logs:
-        # process each log and store results by destination address
-        dst_ip, scoring_log = process_log(traffic_log)
-        if dst_ip is not None:
-            comp_scoring[dst_ip] = copy.deepcopy(scoring_log)
+    MgenRecord(time_recv, time_sent, flowid, seq_num, ip_src, ip_dst, size)
 
-    # now compute score
-    total_bot_packets = 0
-    total_score["bots"] = {}
-    for dst_ip, scoring_log in bot_scoring.items():
-        total_score["bots"][dst_ip] = {"packets_by_source":{}}
-        for src_ip, pkt_dict in scoring_log.items():
+    Logs are processed one at a time as they are iterated, so passing generators keeps memory
+    use independent of the size of the log files.
 
-            num_packets_received = len(pkt_dict)
-            logger.info("Bot at IP: %s received %i packets from %s",
-                        dst_ip, num_packets_received, src_ip)
+    This function will sort the mgen_logs of each dict by valid source
+    and destination addresses and count the number of valid packets received.
 
-            total_score["bots"][dst_ip]["packets_by_source"][src_ip] = num_packets_received
-            total_bot_packets += num_packets_received
+    parse_stats is a dictionary indexed by log file name of the statistics dictionaries passed to
+    iter_mgen_records for each log, as in score_traffic_parallel. Every log has been read by the
+    time the score is computed, so the statistics are complete when they are written out with it:
+
+    parse_stats = {logfile:new_parse_stats() for logfile in bot_logfiles + comp_logfiles}
+    score_traffic([iter_mgen_records(logfile, parse_stats[logfile]) for logfile in bot_logfiles],
+                  [iter_mgen_records(logfile, parse_stats[logfile]) for logfile in comp_logfiles],
+                  num_packets, json_log_name, parse_stats)
+    """
 
-    total_score["bots"]["total"] = total_bot_packets
+    bot_summaries = []
+    comp_summaries = []
 
-    # now compute score for competitors
-    total_comp_packets = 0
-    total_score["competitors"] = {}
-    for dst_ip, scoring_log in comp_scoring.items():
-        total_score["competitors"][dst_ip] = {"packets_by_source":{}}
-        for src_ip, pkt_dict in scoring_log.items():
+    for summaries, traffic_logs in ((bot_summaries, bot_traffic_logs),
+                                    (comp_summaries, competitor_traffic_logs)):
+        for traffic_log in traffic_logs:
+            # process each log and reduce it to packet counts by source address
+            dst_ip, scoring_log = process_log(traffic_log)
+            summaries.append((dst_ip, {src_ip:len(seq_nums) for src_ip, seq_nums in scoring_log.items()}))
 
-            num_packets_received = len(pkt_dict)
-            logger.info("Competitor at IP: %s received %i packets from %s",
-                        dst_ip, num_packets_received, src_ip)
+    total_score = compute_score(bot_summaries, comp_summaries, num_packets, parse_stats=parse_stats)
+
+    # save results to file
+    with open(json_log_name, "w") as f:
+        json.dump(total_score, f)
+
+
+def score_traffic_parallel(bot_logfiles, competitor_logfiles, num_packets, json_log_name,
+                           num_workers=None):
+    """
+    Same as score_traffic, but takes iterables of log file names and parses and summarizes each
+    log in its own worker process. Only the small per source packet counts are sent back and
+    merged here, so scoring time scales with the number of cores rather than the number of nodes.
+
+    num_workers defaults to the number of CPUs on the machine.
+    """
 
-            total_score["competitors"][dst_ip]["packets_by_source"][src_ip] = num_packets_received
-            total_comp_packets += num_packets_received
+    # the file names are needed twice, so generators must be read into lists first
+    bot_logfiles = list(bot_logfiles)
+    competitor_logfiles = list(competitor_logfiles)
+    logfiles = bot_logfiles + competitor_logfiles
 
-    total_score["competitors"]["total"] = total_comp_packets
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        summaries = list(executor.map(summarize_log, logfiles))
 
-    logger.info("Bot network transfered a total of %i packets out of %i, %f packet success rate",
-                total_bot_packets, num_packets, float(total_bot_packets)/float(num_packets))
-    logger.info("Competitor network transfered a total of %i packets out of %i, %f packet success rate",
-                total_comp_packets, num_packets, float(total_comp_packets)/float(num_packets))
+    # malformed lines are skipped while parsing, so report how many there were with the score
+    parse_stats = {logfile:stats for logfile, (_, _, stats) in zip(logfiles, summaries)}
+    summaries = [(dst_ip, packets_by_source) for dst_ip, packets_by_source, _ in summaries]
 
+    total_score = compute_score(summaries[:len(bot_logfiles)],
+                                summaries[len(bot_logfiles):],
+                                num_packets,
+                                parse_stats=parse_stats)
 
     # save results to file
     with open(json_log_name, "w") as f: